@@ -0,0 +1,121 @@
+"""
+Benchmark the pandas to_sql and COPY FROM STDIN load paths of DatabaseLoader.
+
+Each CSV is loaded into a scratch table (prefixed with ``bench_``) once per
+method and the scratch tables are dropped afterwards, so the real tables are
+left untouched. Use --scale to replicate the data rows of every file and
+approximate the size of the production SAP/SharePoint dumps.
+
+Usage:
+    python benchmark_loader.py --scale 20
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from sqlalchemy import text
+from config import Config
+from db_loader import DatabaseLoader, quote_ident
+
+
+def scale_csv_files(data_dir, target_dir, scale):
+    """
+    Write copies of every CSV in data_dir with the data rows repeated.
+
+    Args:
+        data_dir (str): Directory containing the source CSV files
+        target_dir (str): Directory to write the scaled files into
+        scale (int): Number of times the data rows are repeated
+
+    Returns:
+        list: Names of the CSV files written
+    """
+    csv_files = sorted(f for f in os.listdir(data_dir) if f.endswith('.csv'))
+    for filename in csv_files:
+        with open(os.path.join(data_dir, filename), 'rb') as source:
+            header = source.readline()
+            body = source.read()
+        if body and not body.endswith(b'\n'):
+            body += b'\n'
+        with open(os.path.join(target_dir, filename), 'wb') as target:
+            target.write(header)
+            for _ in range(scale):
+                target.write(body)
+    return csv_files
+
+
+def run_benchmark(data_dir, scale=1):
+    """
+    Time both load methods for every CSV file.
+
+    Args:
+        data_dir (str): Directory containing CSV files
+        scale (int): Row replication factor applied before loading
+
+    Returns:
+        list: One dict per file with rows and seconds per method
+    """
+    loader = DatabaseLoader()
+    if not loader.connect():
+        return []
+
+    work_dir = tempfile.mkdtemp(prefix='loader_bench_')
+    results = []
+    try:
+        csv_files = scale_csv_files(data_dir, work_dir, scale)
+
+        for filename in csv_files:
+            table_name = 'bench_' + filename.replace('.csv', '').replace('-', '_')
+            file_path = os.path.join(work_dir, filename)
+            row = {'file': filename}
+
+            for method, load_table in (
+                ('insert', loader.load_csv_to_table),
+                ('copy', loader.load_csv_to_table_copy),
+            ):
+                start = time.perf_counter()
+                row[f'{method}_rows'] = load_table(file_path, table_name)
+                row[f'{method}_seconds'] = time.perf_counter() - start
+
+            with loader.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(table_name)}"))
+
+            results.append(row)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        loader.close()
+
+    return results
+
+
+def print_report(results, scale):
+    """Print a per-file comparison of both load methods."""
+    print("\n" + "=" * 78)
+    print(f"Loader benchmark (scale x{scale})")
+    print("=" * 78)
+    print(f"{'file':<48}{'rows':>10}{'insert s':>10}{'copy s':>10}")
+
+    total_insert = total_copy = 0.0
+    for row in results:
+        total_insert += row['insert_seconds']
+        total_copy += row['copy_seconds']
+        print(
+            f"{row['file']:<48}{row['copy_rows']:>10}"
+            f"{row['insert_seconds']:>10.3f}{row['copy_seconds']:>10.3f}"
+        )
+
+    print("-" * 78)
+    print(f"{'total':<58}{total_insert:>10.3f}{total_copy:>10.3f}")
+    if total_copy > 0:
+        print(f"\nCOPY speedup: {total_insert / total_copy:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseLoader load methods")
+    parser.add_argument('--data-dir', default=Config.DATA_DIR, help="Directory containing CSV files")
+    parser.add_argument('--scale', type=int, default=1, help="Replicate data rows this many times")
+    args = parser.parse_args()
+
+    print_report(run_benchmark(args.data_dir, args.scale), args.scale)
+    Config.dispose_engines()
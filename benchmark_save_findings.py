@@ -0,0 +1,168 @@
+"""
+Micro-benchmark for SupplyWatchdog.save_findings.
+
+Compares the COPY and multi-row INSERT write paths against the previous
+one-INSERT-per-alert loop on synthetic alerts (10k and 100k by default).
+Rows written by the benchmark are deleted again afterwards.
+
+Usage:
+    python benchmark_save_findings.py --sizes 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, text
+from watchdog_core import SupplyWatchdog
+
+
+def make_alerts(count, seed=42):
+    """Build a list of synthetic expiry and shortfall alerts."""
+    rng = random.Random(seed)
+    today = date.today()
+    alerts = []
+
+    for i in range(count):
+        severity = rng.choice(['CRITICAL', 'HIGH', 'MEDIUM'])
+        if i % 2 == 0:
+            days = rng.randint(-30, 90)
+            alerts.append({
+                'alert_type': 'EXPIRY_ALERT',
+                'severity': severity,
+                'trial_alias': f"CT-{rng.randint(1000, 9999)}-BEN",
+                'location': f"Bench Logistics Center {i % 50}",
+                'batch_lot': f"LOT-{i:08d}",
+                'material_description': 'Bench Patch',
+                'expiry_date': today + timedelta(days=days),
+                'days_until_expiry': days,
+                'current_quantity': float(rng.randint(1, 100)),
+                'details': {'order_id': f"ORD-{i}", 'order_status': 'Released'},
+                'recommended_action': f"Monitor batch LOT-{i:08d} - expires in {days} days"
+            })
+        else:
+            weeks = rng.uniform(0, 8)
+            alerts.append({
+                'alert_type': 'SHORTFALL_PREDICTION',
+                'severity': severity,
+                'trial_alias': f"CT-{rng.randint(1000, 9999)}-BEN",
+                'location': f"Bench Logistics Center {i % 50}",
+                'material_description': 'Bench Solution',
+                'current_quantity': float(rng.randint(1, 100)),
+                'weekly_consumption_rate': 10.0,
+                'weeks_until_stockout': weeks,
+                'projected_shortage_date': today + timedelta(weeks=weeks),
+                'details': {'total_patients': None, 'visits_per_month': None},
+                'recommended_action': f"Plan replenishment - stockout in {weeks:.1f} weeks"
+            })
+
+    return alerts
+
+
+def save_findings_per_row(watchdog, alerts):
+    """The previous write path: one INSERT round trip per alert."""
+    run_timestamp = datetime.now()
+    insert_query = text("""
+        INSERT INTO watchdog_findings (
+            run_timestamp, alert_type, severity, trial_alias, location,
+            batch_lot, material_description, expiry_date, days_until_expiry,
+            current_quantity, projected_shortage_date, weekly_consumption_rate,
+            weeks_until_stockout, details, recommended_action
+        ) VALUES (
+            :run_timestamp, :alert_type, :severity, :trial_alias, :location,
+            :batch_lot, :material_description, :expiry_date, :days_until_expiry,
+            :current_quantity, :projected_shortage_date, :weekly_consumption_rate,
+            :weeks_until_stockout, :details, :recommended_action
+        )
+    """)
+
+    with watchdog.engine.connect() as conn:
+        for alert in alerts:
+            params = {key: alert.get(key) for key in (
+                'alert_type', 'severity', 'trial_alias', 'location', 'batch_lot',
+                'material_description', 'expiry_date', 'days_until_expiry',
+                'current_quantity', 'projected_shortage_date', 'weekly_consumption_rate',
+                'weeks_until_stockout', 'recommended_action'
+            )}
+            params['run_timestamp'] = run_timestamp
+            params['details'] = json.dumps(alert.get('details', {}))
+            conn.execute(insert_query, params)
+        conn.commit()
+
+    return len(alerts)
+
+
+def run_benchmark(sizes, include_per_row=True):
+    """
+    Time the write paths for each alert count.
+
+    Args:
+        sizes (list): Alert counts to benchmark
+        include_per_row (bool): Also time the per-row baseline
+
+    Returns:
+        list: One dict per (size, method) with seconds and statements sent
+    """
+    watchdog = SupplyWatchdog()
+    statements = {'count': 0}
+
+    @event.listens_for(watchdog.engine, 'before_cursor_execute')
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements['count'] += 1
+
+    methods = [
+        ('copy', lambda alerts: watchdog.save_findings(alerts, method='copy')),
+        ('values', lambda alerts: watchdog.save_findings(alerts, method='values')),
+    ]
+    if include_per_row:
+        methods.append(('per_row', lambda alerts: save_findings_per_row(watchdog, alerts)))
+
+    results = []
+    try:
+        with watchdog.engine.connect() as conn:
+            start_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM watchdog_findings")).scalar()
+
+        for size in sizes:
+            alerts = make_alerts(size)
+            for method, save in methods:
+                statements['count'] = 0
+                start = time.perf_counter()
+                saved = save(alerts)
+                elapsed = time.perf_counter() - start
+                results.append({
+                    'alerts': size,
+                    'method': method,
+                    'saved': saved,
+                    'seconds': elapsed,
+                    # COPY goes through the raw cursor, outside the event hook
+                    'statements': statements['count'] if method != 'copy' else 1
+                })
+    finally:
+        with watchdog.engine.begin() as conn:
+            conn.execute(text("DELETE FROM watchdog_findings WHERE id > :start_id"), {'start_id': start_id})
+        watchdog.close()
+
+    return results
+
+
+def print_report(results):
+    """Print the benchmark results as a table."""
+    print("\n" + "=" * 60)
+    print("save_findings benchmark")
+    print("=" * 60)
+    print(f"{'alerts':>10}{'method':>10}{'seconds':>12}{'statements':>12}{'alerts/s':>14}")
+    for row in results:
+        rate = row['saved'] / row['seconds'] if row['seconds'] else 0
+        print(
+            f"{row['alerts']:>10}{row['method']:>10}{row['seconds']:>12.3f}"
+            f"{row['statements']:>12}{rate:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SupplyWatchdog.save_findings")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Alert counts")
+    parser.add_argument('--skip-per-row', action='store_true', help="Do not time the per-row baseline")
+    args = parser.parse_args()
+
+    print_report(run_benchmark(args.sizes, include_per_row=not args.skip_per_row))
@@ -0,0 +1,238 @@
+"""
+End-to-end benchmark of the loader and the Supply Watchdog at scaled data sizes.
+
+For each scale factor the synthetic CSVs are scaled with referential links
+preserved (scale_synthetic_data.py), loaded with DatabaseLoader, and one
+watchdog cycle is timed stage by stage: every dataset fetch and detector,
+save_findings and the JSON payload. Everything runs in a separate benchmark
+database on the configured PostgreSQL server (created if missing), so the
+real tables are never touched. Results are written as JSON, and can be
+compared with an earlier result file to flag regressions.
+
+Usage:
+    python benchmark_suite.py --scales 1 10 100 --output benchmark_results.json
+    python benchmark_suite.py --scales 10 --compare benchmark_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from config import Config
+from create_watchdog_table import create_watchdog_table
+from db_loader import DatabaseLoader
+from scale_synthetic_data import scale_dataset
+from watchdog_core import SupplyWatchdog
+
+
+DEFAULT_DATABASE = 'clinical_supply_chain_bench'
+
+
+def ensure_database(name):
+    """
+    Create the benchmark database if it does not exist.
+
+    Args:
+        name (str): Database name
+    """
+    url = Config.get_sqlalchemy_url().set(database='postgres')
+    engine = create_engine(url, isolation_level='AUTOCOMMIT')
+    try:
+        with engine.connect() as conn:
+            exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {'name': name}).scalar()
+            if not exists:
+                conn.execute(text(f'CREATE DATABASE "{name}"'))
+                print(f"✓ Created benchmark database {name}")
+    finally:
+        engine.dispose()
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(stages, name, func, *args, **kwargs):
+    """Call func, record its wall seconds under stages[name] and return its result."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    stages[name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def benchmark_scale(scale, data_dir, method, workers):
+    """
+    Scale the data, load it and time one watchdog cycle.
+
+    Args:
+        scale (int): Replication factor
+        data_dir (str): Directory with the source CSV files
+        method (str): Loader method, 'copy' or 'insert'
+        workers (int): Loader and detector workers
+
+    Returns:
+        dict: Row and alert counts and per-stage wall seconds
+    """
+    work_dir = tempfile.mkdtemp(prefix=f'watchdog_bench_x{scale}_')
+    stages = {}
+    loader = None
+    try:
+        rows = timed(stages, 'generate', scale_dataset, data_dir, os.path.join(work_dir, 'data'), scale)
+
+        loader = DatabaseLoader(workers=workers)
+        if not loader.connect():
+            raise RuntimeError("could not connect to the benchmark database")
+        results = timed(
+            stages, 'load', loader.load_all_csvs, os.path.join(work_dir, 'data'), method=method, workers=workers
+        )
+        if results is None or results['failed']:
+            raise RuntimeError(f"loading failed: {results and results['failed_tables']}")
+
+        create_watchdog_table()
+        watchdog = SupplyWatchdog(findings_mode='append')
+
+        start = time.perf_counter()
+        alerts, timings = watchdog.run_detectors(workers=workers)
+        stages['detect'] = round(time.perf_counter() - start, 3)
+        for name, seconds in timings['datasets'].items():
+            stages[f'dataset.{name}'] = seconds
+        for name, seconds in timings['detectors'].items():
+            stages[f'detector.{name}'] = seconds
+
+        # Findings written by the benchmark are deleted again
+        with watchdog.engine.connect() as conn:
+            start_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM watchdog_findings")).scalar()
+        try:
+            timed(stages, 'save_findings', watchdog.save_findings, alerts)
+        finally:
+            with watchdog.engine.begin() as conn:
+                conn.execute(text("DELETE FROM watchdog_findings WHERE id > :start_id"), {'start_id': start_id})
+
+        payload = timed(stages, 'build_payload', watchdog.build_payload, alerts, serialize=False)
+        output_file = timed(
+            stages, 'write_payload', watchdog.write_json_payload, payload, os.path.join(work_dir, 'payload.json')
+        )
+
+        return {
+            'scale': scale,
+            'csv_rows': sum(rows.values()),
+            'loaded_rows': results['total_rows'],
+            'alerts': len(alerts),
+            'payload_bytes': os.path.getsize(output_file),
+            'stages': stages,
+        }
+    finally:
+        if loader is not None:
+            loader.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Find stages slower than in a baseline result file.
+
+    Args:
+        results (list): Per-scale results of this run
+        baseline (dict): Contents of an earlier result file
+        threshold (float): Allowed slowdown ratio (0.2 = 20% slower)
+
+    Returns:
+        list: (scale, stage, baseline seconds, seconds) of regressed stages
+    """
+    previous = {entry['scale']: entry['stages'] for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        for stage, seconds in entry['stages'].items():
+            before = previous.get(entry['scale'], {}).get(stage)
+            # Sub-10ms stages are dominated by noise
+            if before is not None and seconds > 0.01 and seconds > before * (1 + threshold):
+                regressions.append((entry['scale'], stage, before, seconds))
+    return regressions
+
+
+def print_report(results):
+    """Print the stage timings of every scale side by side."""
+    print("\n" + "=" * 78)
+    print("Watchdog benchmark suite")
+    print("=" * 78)
+
+    stages = []
+    for entry in results:
+        stages.extend(stage for stage in entry['stages'] if stage not in stages)
+
+    print(f"{'stage':<46}" + ''.join(f"{'x' + str(entry['scale']):>10}" for entry in results))
+    for stage in stages:
+        print(f"{stage:<46}" + ''.join(
+            f"{entry['stages'][stage]:>10.3f}" if stage in entry['stages'] else f"{'-':>10}" for entry in results
+        ))
+    print("-" * 78)
+    for label, key in (('csv rows', 'csv_rows'), ('alerts', 'alerts')):
+        print(f"{label:<46}" + ''.join(f"{entry[key]:>10}" for entry in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the loader and the Supply Watchdog at scaled data sizes")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help="Replication factors")
+    parser.add_argument('--data-dir', default=Config.DATA_DIR, help="Directory containing the source CSV files")
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help="Scratch database for the benchmark")
+    parser.add_argument('--method', choices=['insert', 'copy'], default='copy', help="Loader method")
+    parser.add_argument('--workers', type=int, default=Config.LOAD_WORKERS, help="Loader and detector workers")
+    parser.add_argument('--output', default=f"benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        help="Result file")
+    parser.add_argument('--compare', default=None, help="Earlier result file to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown ratio for --compare")
+    args = parser.parse_args()
+
+    if args.database == Config.DB_NAME:
+        print(f"✗ Refusing to benchmark in the working database {Config.DB_NAME}")
+        sys.exit(1)
+
+    ensure_database(args.database)
+    # Engines are cached per process, so switch databases before any is created
+    Config.dispose_engines()
+    Config.DB_NAME = args.database
+
+    results = []
+    try:
+        for scale in args.scales:
+            print(f"\n### Scale x{scale}")
+            results.append(benchmark_scale(scale, args.data_dir, args.method, args.workers))
+    finally:
+        Config.dispose_engines()
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': args.database,
+        'method': args.method,
+        'workers': args.workers,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_report(results)
+    print(f"\n✓ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(results, json.load(f), args.threshold)
+        for scale, stage, before, seconds in regressions:
+            print(f"✗ x{scale} {stage}: {before:.3f}s -> {seconds:.3f}s")
+        if regressions:
+            sys.exit(1)
+        print("✓ No regressions")
@@ -1,12 +1,20 @@
 """
 Configuration module for database and environment settings.
 """
+import json
 import os
+import threading
 from dotenv import load_dotenv
+from sqlalchemy import create_engine, URL, text
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Shared engines, keyed by pool size (see Config.get_engine)
+_engines = {}
+_engine_lock = threading.Lock()
+
+
 class Config:
     """Database and application configuration."""
 
@@ -17,14 +25,199 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 
+    # Connection pool of the shared engine
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
     # Data directory
     DATA_DIR = os.getenv('DATA_DIR', './synthetic_clinical_data')
 
+    # Loader settings: 'insert' (pandas to_sql) or 'copy' (COPY FROM STDIN)
+    LOAD_METHOD = os.getenv('LOAD_METHOD', 'insert')
+    # Number of tables loaded concurrently
+    LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', '1'))
+
+    # Incremental loads: table holding one fingerprint per source file, and
+    # the natural key of each append-style report (only new keys are loaded)
+    LOAD_METADATA_TABLE = os.getenv('LOAD_METADATA_TABLE', 'load_fingerprints')
+    INCREMENTAL_KEYS = json.loads(os.getenv('INCREMENTAL_KEYS', 'null')) or {
+        'patient_status_and_treatment_report': ['Trial Alias', 'patient', 'Visit'],
+        'shipment_status_report': ['Shipment', 'LPN#'],
+    }
+
+    # How watchdog findings are written: 'copy' (COPY FROM STDIN) or
+    # 'values' (multi-row INSERT of FINDINGS_INSERT_PAGE_SIZE rows each)
+    FINDINGS_WRITE_METHOD = os.getenv('FINDINGS_WRITE_METHOD', 'copy')
+    FINDINGS_INSERT_PAGE_SIZE = int(os.getenv('FINDINGS_INSERT_PAGE_SIZE', '1000'))
+    # 'append' inserts every alert each run; 'stateful' keeps one OPEN finding
+    # per alert key and only inserts, updates or resolves what changed
+    FINDINGS_MODE = os.getenv('FINDINGS_MODE', 'append')
+
+    # Partitioned watchdog_findings: future monthly partitions kept ready, and
+    # retention of old partitions ('export' to FINDINGS_ARCHIVE_DIR then drop,
+    # 'drop', or 'detach' only)
+    FINDINGS_PARTITION_MONTHS_AHEAD = int(os.getenv('FINDINGS_PARTITION_MONTHS_AHEAD', '3'))
+    FINDINGS_RETENTION_MONTHS = int(os.getenv('FINDINGS_RETENTION_MONTHS', '12'))
+    FINDINGS_RETENTION_ACTION = os.getenv('FINDINGS_RETENTION_ACTION', 'export')
+    FINDINGS_ARCHIVE_DIR = os.getenv('FINDINGS_ARCHIVE_DIR', './findings_archive')
+
+    # JSON payload file: compact (no indentation) and/or gzip-compressed
+    PAYLOAD_COMPACT = os.getenv('PAYLOAD_COMPACT', 'false').lower() == 'true'
+    PAYLOAD_GZIP = os.getenv('PAYLOAD_GZIP', 'false').lower() == 'true'
+
+    # Run metrics: recorded in the watchdog_runs table, and written to
+    # METRICS_DIR/<run type>_metrics.prom ('prometheus'), .json ('json') or not at all ('none')
+    RECORD_RUN_METRICS = os.getenv('RECORD_RUN_METRICS', 'true').lower() == 'true'
+    METRICS_FORMAT = os.getenv('METRICS_FORMAT', 'prometheus')
+    METRICS_DIR = os.getenv('METRICS_DIR', '.')
+
+    # Query diagnostics: EXPLAIN ANALYZE every dataset query on each watchdog
+    # run (they execute twice), flagging queries over the latency budget and
+    # sequential scans reading at least SEQ_SCAN_ROW_THRESHOLD rows
+    QUERY_DIAGNOSTICS = os.getenv('QUERY_DIAGNOSTICS', 'false').lower() == 'true'
+    QUERY_LATENCY_BUDGET_MS = float(os.getenv('QUERY_LATENCY_BUDGET_MS', '500'))
+    SEQ_SCAN_ROW_THRESHOLD = int(os.getenv('SEQ_SCAN_ROW_THRESHOLD', '100000'))
+
+    # Shelf-life extension verdicts on expiry alerts, with the days added to
+    # the shipping time for relabelling and release
+    SHELF_LIFE_EVALUATION = os.getenv('SHELF_LIFE_EVALUATION', 'true').lower() == 'true'
+    SHELF_LIFE_HANDLING_DAYS = float(os.getenv('SHELF_LIFE_HANDLING_DAYS', '7'))
+
+    # Genealogy impact on expiry alerts (opt-in): counts of the lots each
+    # expiring lot was made from and of the lots made from it, with the first
+    # GENEALOGY_DETAIL_LOTS lots (and locations) of each list; genealogy.py
+    # lists them all
+    GENEALOGY_IMPACT = os.getenv('GENEALOGY_IMPACT', 'false').lower() == 'true'
+    GENEALOGY_DETAIL_LOTS = int(os.getenv('GENEALOGY_DETAIL_LOTS', '5'))
+
+    # Temperature excursions: range (deg C) of each storage class in
+    # complete_warehouse_inventory.class and the cumulative hours outside it
+    # the stock tolerates
+    EXCURSION_STORAGE_CLASSES = json.loads(os.getenv('EXCURSION_STORAGE_CLASSES', 'null')) or {
+        'Frozen': {'min_c': -25, 'max_c': -15, 'allowable_hours': 0},
+        'Cold Chain': {'min_c': 2, 'max_c': 8, 'allowable_hours': 24},
+        'Ambient': {'min_c': 15, 'max_c': 25, 'allowable_hours': 72},
+    }
+
+    # Reference datasets (trial submissions, material registrations, shipping
+    # timelines) cached in process until their tables are reloaded, for at
+    # most REFERENCE_CACHE_TTL seconds, keeping up to REFERENCE_CACHE_SIZE entries
+    REFERENCE_CACHE = os.getenv('REFERENCE_CACHE', 'true').lower() == 'true'
+    REFERENCE_CACHE_SIZE = int(os.getenv('REFERENCE_CACHE_SIZE', '32'))
+    REFERENCE_CACHE_TTL = float(os.getenv('REFERENCE_CACHE_TTL', '3600'))
+
+    # Watchdog shortfall computation: 'sql' (one server-side query) or 'pandas'
+    SHORTFALL_ENGINE = os.getenv('SHORTFALL_ENGINE', 'sql')
+
+    # Shortfall demand: 'visits' (recent patient visits per trial) or
+    # 'enrollment' (forecast from the monthly site enrollment series)
+    SHORTFALL_DEMAND_MODEL = os.getenv('SHORTFALL_DEMAND_MODEL', 'visits')
+    DEMAND_PACKAGES_PER_PATIENT = float(os.getenv('DEMAND_PACKAGES_PER_PATIENT', '2'))
+    DEMAND_WINDOW_MONTHS = int(os.getenv('DEMAND_WINDOW_MONTHS', '3'))
+    DEMAND_TREND_MONTHS = int(os.getenv('DEMAND_TREND_MONTHS', '6'))
+
+    # Stockout projection: 'linear' (stock / weekly demand) or 'simulation'
+    # (week-by-week FEFO projection with lot expiry and scheduled shipments)
+    SHORTFALL_PROJECTION = os.getenv('SHORTFALL_PROJECTION', 'linear')
+
+    # How SupplyWatchdog.run executes the detectors: 'parallel' (thread pool
+    # of up to DETECTOR_WORKERS threads) or 'sequential'
+    DETECTOR_EXECUTION = os.getenv('DETECTOR_EXECUTION', 'parallel')
+    DETECTOR_WORKERS = int(os.getenv('DETECTOR_WORKERS', '4'))
+
+    # Sharded runs: 'none' (one run over every trial), 'trial' (trials
+    # balanced into WATCHDOG_SHARDS shards) or 'region' (one shard per plant
+    # region), run on WATCHDOG_SHARD_WORKERS processes; a failed shard is
+    # rerun up to WATCHDOG_SHARD_RETRIES times
+    WATCHDOG_SHARDING = os.getenv('WATCHDOG_SHARDING', 'none')
+    WATCHDOG_SHARDS = int(os.getenv('WATCHDOG_SHARDS', '8'))
+    WATCHDOG_SHARD_WORKERS = int(os.getenv('WATCHDOG_SHARD_WORKERS', '4'))
+    WATCHDOG_SHARD_RETRIES = int(os.getenv('WATCHDOG_SHARD_RETRIES', '1'))
+
     @classmethod
     def get_connection_string(cls):
         """Get SQLAlchemy connection string."""
         return f"postgresql://{cls.DB_USER}:{cls.DB_PASSWORD}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}"
 
+    @classmethod
+    def get_sqlalchemy_url(cls):
+        """Get SQLAlchemy URL; URL.create() handles special characters in the password."""
+        return URL.create(
+            drivername="postgresql+psycopg2",
+            username=cls.DB_USER,
+            password=cls.DB_PASSWORD,
+            host=cls.DB_HOST,
+            port=int(cls.DB_PORT),
+            database=cls.DB_NAME,
+        )
+
+    @classmethod
+    def get_engine(cls, pool_size=None):
+        """
+        Get the process-wide SQLAlchemy engine.
+
+        Engines are created once per pool size and reused, so repeated watchdog
+        runs in one process share warm pooled connections. Pre-ping replaces
+        connections the server dropped while idle, and recycle retires old ones.
+
+        Args:
+            pool_size (int): Pooled connections to keep. Uses DB_POOL_SIZE if None.
+
+        Returns:
+            Engine: Shared SQLAlchemy engine
+        """
+        pool_size = pool_size or cls.DB_POOL_SIZE
+        with _engine_lock:
+            engine = _engines.get(pool_size)
+            if engine is None:
+                engine = create_engine(
+                    cls.get_sqlalchemy_url(),
+                    pool_size=pool_size,
+                    max_overflow=cls.DB_MAX_OVERFLOW,
+                    pool_pre_ping=cls.DB_POOL_PRE_PING,
+                    pool_recycle=cls.DB_POOL_RECYCLE,
+                )
+                _engines[pool_size] = engine
+        return engine
+
+    @classmethod
+    def check_connection(cls, engine=None):
+        """
+        Health check: run a trivial query on the shared engine.
+
+        Returns:
+            tuple: (ok, error message or None)
+        """
+        try:
+            with (engine or cls.get_engine()).connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True, None
+        except Exception as e:
+            return False, str(e)
+
+    @classmethod
+    def dispose_engines(cls):
+        """Close the pooled connections of every shared engine, e.g. at process exit."""
+        with _engine_lock:
+            for engine in _engines.values():
+                engine.dispose()
+            _engines.clear()
+
+    @classmethod
+    def reset_engines_after_fork(cls):
+        """
+        Forget the engines inherited from a parent process.
+
+        A forked worker must not use or close the parent's pooled connections;
+        the pools are dropped without closing them and the worker opens its own.
+        """
+        with _engine_lock:
+            for engine in _engines.values():
+                engine.dispose(close=False)
+            _engines.clear()
+
     @classmethod
     def get_psycopg2_params(cls):
         """Get psycopg2 connection parameters."""
@@ -1,27 +1,21 @@
 """
 Create the watchdog_findings table for storing Supply Watchdog alerts.
+
+Usage:
+    python create_watchdog_table.py                 # plain table
+    python create_watchdog_table.py --partitioned   # monthly partitions by run_timestamp
+    python create_watchdog_table.py --migrate       # convert an existing plain table
 """
-from sqlalchemy import create_engine, URL, text
+import argparse
+from datetime import date
+from sqlalchemy import text
 from config import Config
+from findings_partitions import add_months, create_partition, ensure_partitions, is_partitioned, month_start
 
-def create_watchdog_table():
-    """Create the watchdog_findings table in the database."""
-
-    # Connect to database
-    url = URL.create(
-        drivername="postgresql+psycopg2",
-        username=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        host=Config.DB_HOST,
-        port=int(Config.DB_PORT),
-        database=Config.DB_NAME,
-    )
-    engine = create_engine(url)
-
-    create_table_sql = """
-    CREATE TABLE IF NOT EXISTS watchdog_findings (
-        id SERIAL PRIMARY KEY,
-        run_timestamp TIMESTAMP DEFAULT NOW(),
+# Columns of watchdog_findings; the primary key is added per table layout
+FINDINGS_COLUMNS_SQL = """
+        id SERIAL,
+        run_timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
         alert_type VARCHAR(50) NOT NULL,
         severity VARCHAR(20),
         trial_alias VARCHAR(100),
@@ -40,19 +34,75 @@ def create_watchdog_table():
         acknowledged BOOLEAN DEFAULT FALSE,
         acknowledged_by VARCHAR(100),
         acknowledged_at TIMESTAMP,
-        created_at TIMESTAMP DEFAULT NOW()
+        created_at TIMESTAMP DEFAULT NOW(),
+        alert_key VARCHAR(1000),
+        status VARCHAR(20),
+        last_seen_at TIMESTAMP,
+        resolved_at TIMESTAMP"""
+
+# Partitioned tables need the partition key in the primary key
+CREATE_PLAIN_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS watchdog_findings ({FINDINGS_COLUMNS_SQL},
+        PRIMARY KEY (id)
     );
+"""
+CREATE_PARTITIONED_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS watchdog_findings ({FINDINGS_COLUMNS_SQL},
+        PRIMARY KEY (id, run_timestamp)
+    ) PARTITION BY RANGE (run_timestamp);
+"""
 
+# Lifecycle columns of stateful findings, for tables created before them
+ADD_STATE_COLUMNS_SQL = """
+    ALTER TABLE watchdog_findings ADD COLUMN IF NOT EXISTS alert_key VARCHAR(1000);
+    ALTER TABLE watchdog_findings ADD COLUMN IF NOT EXISTS status VARCHAR(20);
+    ALTER TABLE watchdog_findings ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP;
+    ALTER TABLE watchdog_findings ADD COLUMN IF NOT EXISTS resolved_at TIMESTAMP;
+"""
+
+# Created on the parent of a partitioned table, they cascade to every partition
+CREATE_INDEXES_SQL = """
     CREATE INDEX IF NOT EXISTS idx_run_timestamp ON watchdog_findings(run_timestamp);
     CREATE INDEX IF NOT EXISTS idx_alert_type ON watchdog_findings(alert_type);
     CREATE INDEX IF NOT EXISTS idx_severity ON watchdog_findings(severity);
     CREATE INDEX IF NOT EXISTS idx_trial ON watchdog_findings(trial_alias);
     CREATE INDEX IF NOT EXISTS idx_acknowledged ON watchdog_findings(acknowledged);
+    CREATE INDEX IF NOT EXISTS idx_open_alert_key ON watchdog_findings(alert_key) WHERE status = 'OPEN';
+"""
+
+# Columns copied when migrating to the partitioned layout
+MIGRATED_COLUMNS = [
+    'id', 'run_timestamp', 'alert_type', 'severity', 'trial_alias', 'location', 'batch_lot',
+    'material_description', 'expiry_date', 'days_until_expiry', 'current_quantity',
+    'projected_shortage_date', 'weekly_consumption_rate', 'weeks_until_stockout', 'details',
+    'recommended_action', 'email_sent', 'acknowledged', 'acknowledged_by', 'acknowledged_at',
+    'created_at', 'alert_key', 'status', 'last_seen_at', 'resolved_at'
+]
+
+LEGACY_TABLE = 'watchdog_findings_legacy'
+
+
+def create_watchdog_table(partitioned=False, months_ahead=None):
     """
+    Create the watchdog_findings table in the database.
+
+    Args:
+        partitioned (bool): Create the table range-partitioned by
+            run_timestamp, with one partition per month
+        months_ahead (int): Future monthly partitions to create. Uses
+            Config.FINDINGS_PARTITION_MONTHS_AHEAD if None.
+    """
+
+    # Connect to database
+    engine = Config.get_engine()
+    if months_ahead is None:
+        months_ahead = Config.FINDINGS_PARTITION_MONTHS_AHEAD
+
+    create_table_sql = CREATE_PARTITIONED_TABLE_SQL if partitioned else CREATE_PLAIN_TABLE_SQL
 
     try:
         with engine.connect() as conn:
-            conn.execute(text(create_table_sql))
+            conn.execute(text(create_table_sql + ADD_STATE_COLUMNS_SQL + CREATE_INDEXES_SQL))
             conn.commit()
             print("✓ watchdog_findings table created successfully")
 
@@ -69,12 +119,120 @@ def create_watchdog_table():
             else:
                 print("✗ Table creation may have failed")
 
+            if partitioned and not is_partitioned(conn):
+                print("✗ watchdog_findings already exists unpartitioned; run with --migrate to convert it")
+
+        created = ensure_partitions(engine, months_ahead)
+        if created:
+            print(f"✓ Created {len(created)} monthly partitions ({created[0]} .. {created[-1]})")
+
     except Exception as e:
         print(f"✗ Error creating table: {e}")
-    finally:
-        engine.dispose()
+
+
+def migrate_to_partitioned(months_ahead=None, drop_legacy=False):
+    """
+    Convert an existing unpartitioned watchdog_findings table.
+
+    The old table is renamed to watchdog_findings_legacy (with its indexes
+    and id sequence), a partitioned table is created with partitions covering
+    every stored month, all rows are copied with their ids, and the new id
+    sequence continues after the highest one. Everything runs in one
+    transaction, so a failure leaves the original table in place.
+
+    Args:
+        months_ahead (int): Future monthly partitions to create. Uses
+            Config.FINDINGS_PARTITION_MONTHS_AHEAD if None.
+        drop_legacy (bool): Drop the old table after copying
+
+    Returns:
+        int: Number of rows migrated, or None if nothing was migrated
+    """
+    engine = Config.get_engine()
+    if months_ahead is None:
+        months_ahead = Config.FINDINGS_PARTITION_MONTHS_AHEAD
+
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text("SELECT to_regclass('watchdog_findings')")).scalar()
+            if exists is None:
+                print("✗ watchdog_findings does not exist; create it with --partitioned instead")
+                return None
+            if is_partitioned(conn):
+                print("✓ watchdog_findings is already partitioned")
+                return None
+
+            conn.execute(text("LOCK TABLE watchdog_findings IN ACCESS EXCLUSIVE MODE"))
+            conn.execute(text(ADD_STATE_COLUMNS_SQL))
+
+            # Move the old table, its indexes and its sequence out of the way
+            sequence = conn.execute(text("SELECT pg_get_serial_sequence('watchdog_findings', 'id')")).scalar()
+            conn.execute(text(f"ALTER TABLE watchdog_findings RENAME TO {LEGACY_TABLE}"))
+            indexes = conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+            ), {'table': LEGACY_TABLE}).scalars().all()
+            for index in indexes:
+                conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"'))
+            if sequence:
+                conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {LEGACY_TABLE}_id_seq"))
+
+            conn.execute(text(CREATE_PARTITIONED_TABLE_SQL + CREATE_INDEXES_SQL))
+
+            # Partitions for every month with data through the months ahead
+            first = conn.execute(text(f"SELECT MIN(run_timestamp) FROM {LEGACY_TABLE}")).scalar()
+            current = month_start(first or date.today())
+            last = add_months(month_start(date.today()), months_ahead)
+            while current <= last:
+                create_partition(conn, current)
+                current = add_months(current, 1)
+
+            # run_timestamp is part of the new primary key, so it cannot be NULL
+            values = ', '.join(
+                'COALESCE(run_timestamp, created_at, NOW())' if c == 'run_timestamp' else c
+                for c in MIGRATED_COLUMNS
+            )
+            migrated = conn.execute(text(f"""
+                INSERT INTO watchdog_findings ({', '.join(MIGRATED_COLUMNS)})
+                SELECT {values} FROM {LEGACY_TABLE}
+            """)).rowcount
+            conn.execute(text("""
+                SELECT setval(
+                    pg_get_serial_sequence('watchdog_findings', 'id'),
+                    GREATEST((SELECT MAX(id) FROM watchdog_findings), 1)
+                )
+            """))
+
+            if drop_legacy:
+                conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+
+        print(f"✓ Migrated {migrated} findings to the partitioned watchdog_findings table")
+        if not drop_legacy:
+            print(f"  Previous table kept as {LEGACY_TABLE}; drop it once verified")
+        return migrated
+
+    except Exception as e:
+        print(f"✗ Error migrating table: {e}")
+        return None
+
 
 if __name__ == "__main__":
-    print("Creating watchdog_findings table...")
-    print("=" * 60)
-    create_watchdog_table()
+    parser = argparse.ArgumentParser(description="Create the watchdog_findings table")
+    parser.add_argument('--partitioned', action='store_true',
+                        help="Range-partition the table by run_timestamp, one partition per month")
+    parser.add_argument('--migrate', action='store_true',
+                        help="Convert an existing unpartitioned table to the partitioned layout")
+    parser.add_argument('--drop-legacy', action='store_true',
+                        help="With --migrate, drop the old table after copying its rows")
+    parser.add_argument('--months-ahead', type=int, default=None,
+                        help="Future monthly partitions to create")
+    args = parser.parse_args()
+
+    if args.migrate:
+        print("Migrating watchdog_findings to monthly partitions...")
+        print("=" * 60)
+        migrate_to_partitioned(args.months_ahead, drop_legacy=args.drop_legacy)
+    else:
+        print("Creating watchdog_findings table...")
+        print("=" * 60)
+        create_watchdog_table(partitioned=args.partitioned, months_ahead=args.months_ahead)
+    Config.dispose_engines()
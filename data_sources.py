@@ -0,0 +1,496 @@
+"""
+Data sources the watchdog detectors read their datasets from.
+
+DatabaseSource runs each dataset's SQL on PostgreSQL, as a normal watchdog
+run does. FileSource evaluates the same datasets with pandas straight from
+the CSV files (or Parquet exports) in a data directory, so backtests and
+what-if runs need no load into PostgreSQL first. CSV files are typed like
+the loader types them, and the parsed tables can be cached as Parquet files
+that are reused until the CSV changes (this needs pyarrow).
+
+Usage:
+    python data_sources.py --data-dir ./synthetic_clinical_data --cache-dir ./snapshot_cache
+    python data_sources.py --compare-db    # check the alerts match a database run
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from config import Config
+from db_loader import DatabaseLoader
+from reference_cache import reference_cache
+from watchdog_detectors import in_shard
+from watchdog_views import usable_watchdog_views
+
+try:
+    import pyarrow  # noqa: F401  (pandas Parquet engine)
+except ImportError:
+    pyarrow = None
+
+
+# Order statuses of open orders, as in the watchdog SQL
+OPEN_ORDER_STATUSES = ['Released', 'In Progress', 'Created']
+
+
+class DatabaseSource:
+    """Datasets read with their SQL from PostgreSQL."""
+
+    read_only = False
+
+    def __init__(self, engine, shard=None):
+        """
+        Args:
+            engine: SQLAlchemy engine
+            shard (dict): Read only the rows of this shard's trials from
+                datasets with a trial column (see watchdog_shards)
+        """
+        self.engine = engine
+        self.shard = shard
+        self._usable_views = None
+        self._lock = threading.Lock()
+
+    @property
+    def usable_views(self):
+        """Watchdog views that may replace the raw queries, looked up once."""
+        with self._lock:
+            if self._usable_views is None:
+                self._usable_views = usable_watchdog_views(self.engine)
+            return self._usable_views
+
+    def fetch(self, dataset):
+        """Read a dataset into a DataFrame; reference datasets go through the reference cache."""
+        if self.shard is not None and dataset.trial_column:
+            return dataset.fetch(self.engine, self.usable_views, self.shard)
+        if dataset.tables and Config.REFERENCE_CACHE:
+            return reference_cache.get(
+                self.engine, dataset, self.usable_views,
+                lambda: dataset.fetch(self.engine, self.usable_views)
+            )
+        return dataset.fetch(self.engine, self.usable_views)
+
+
+class FileSource:
+    """
+    Datasets evaluated with pandas from files in a data directory.
+
+    A table is read from <table>.parquet when the directory has one, else
+    from the CSV file the loader would load into it. Tables are parsed once
+    per source and shared by the datasets that read them.
+    """
+
+    read_only = True
+
+    def __init__(self, data_dir=None, cache_dir=None, shard=None):
+        """
+        Args:
+            data_dir (str): Directory with CSV and/or Parquet files. Uses
+                Config.DATA_DIR if None.
+            cache_dir (str): Directory for Parquet copies of parsed CSV
+                files, or None to parse the CSV files on every run
+            shard (dict): Keep only the rows of this shard's trials in
+                datasets with a trial column
+        """
+        self.data_dir = data_dir or Config.DATA_DIR
+        self.cache_dir = cache_dir
+        self.shard = shard
+        if cache_dir and pyarrow is None:
+            print("✗ pyarrow is not installed; Parquet cache disabled")
+            self.cache_dir = None
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, dataset):
+        """Evaluate a dataset from the files."""
+        if dataset.frame is None:
+            raise ValueError(f"Dataset {dataset.name} has no file-backed implementation")
+        frame = dataset.frame(self)
+        if self.shard is not None and dataset.trial_column:
+            frame = frame[in_shard(frame[dataset.trial_column], self.shard)].reset_index(drop=True)
+        return frame
+
+    def table(self, name):
+        """
+        Parsed contents of a table.
+
+        Args:
+            name (str): Table name, as created by the loader
+
+        Returns:
+            DataFrame: Rows with loader-equivalent column types; shared, so
+                callers must not modify it in place
+        """
+        with self._lock:
+            if name not in self.tables:
+                self.tables[name] = self._read_table(name)
+            return self.tables[name]
+
+    def _read_table(self, name):
+        """Read a table from Parquet, the Parquet cache, or its CSV file."""
+        parquet_path = os.path.join(self.data_dir, f"{name}.parquet")
+        if os.path.exists(parquet_path):
+            return pd.read_parquet(parquet_path)
+
+        csv_path = self._csv_path(name)
+        if self.cache_dir:
+            cached = self._read_cache(name, csv_path)
+            if cached is not None:
+                return cached
+
+        df = read_typed_csv(name, csv_path)
+        if self.cache_dir:
+            self._write_cache(name, csv_path, df)
+        return df
+
+    def _csv_path(self, name):
+        """CSV file the loader loads into the named table."""
+        for filename in os.listdir(self.data_dir):
+            if filename.endswith('.csv') and filename[:-4].replace('-', '_') == name:
+                return os.path.join(self.data_dir, filename)
+        raise FileNotFoundError(f"No CSV or Parquet file for table {name} in {self.data_dir}")
+
+    def _cache_paths(self, name):
+        return (
+            os.path.join(self.cache_dir, f"{name}.parquet"),
+            os.path.join(self.cache_dir, f"{name}.json"),
+        )
+
+    def _read_cache(self, name, csv_path):
+        """Cached table, if it was written from the current version of the CSV."""
+        parquet_path, fingerprint_path = self._cache_paths(name)
+        try:
+            with open(fingerprint_path) as f:
+                fingerprint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if fingerprint != csv_fingerprint(csv_path) or not os.path.exists(parquet_path):
+            return None
+        return pd.read_parquet(parquet_path)
+
+    def _write_cache(self, name, csv_path, df):
+        """Store a parsed table with the fingerprint of its CSV."""
+        parquet_path, fingerprint_path = self._cache_paths(name)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(parquet_path, index=False)
+            with open(fingerprint_path, 'w') as f:
+                json.dump(csv_fingerprint(csv_path), f)
+        except Exception as e:
+            print(f"✗ Error caching {name} as Parquet: {e}")
+
+
+def csv_fingerprint(csv_path):
+    """Size and modification time identifying a version of a CSV file."""
+    stat = os.stat(csv_path)
+    return {'file_size': stat.st_size, 'file_mtime_ns': stat.st_mtime_ns}
+
+
+def read_typed_csv(table_name, csv_path):
+    """
+    Read a CSV file with the column types the loader gives its table.
+
+    Args:
+        table_name (str): Table the loader creates from the file
+        csv_path (str): Path to the CSV file
+
+    Returns:
+        DataFrame: Integer columns as Int64, decimals as float, dates and
+            timestamps as datetime64, empty fields as missing values
+    """
+    column_types = DatabaseLoader().table_column_types(table_name, csv_path)
+    df = pd.read_csv(csv_path, dtype=str)
+
+    for column, pg_type in column_types.items():
+        if pg_type == 'BIGINT':
+            df[column] = pd.to_numeric(df[column]).astype('Int64')
+        elif pg_type in ('DOUBLE PRECISION', 'NUMERIC'):
+            df[column] = pd.to_numeric(df[column]).astype(float)
+        elif pg_type in ('DATE', 'TIMESTAMP'):
+            df[column] = pd.to_datetime(df[column])
+        elif pg_type == 'BOOLEAN':
+            df[column] = df[column].map({'True': True, 'False': False})
+
+    return df
+
+
+def group_sum_positive(df, keys, value, name):
+    """SUM(value) ... GROUP BY keys HAVING SUM(value) > 0, NULL keys grouped together."""
+    totals = df.groupby(keys, dropna=False, sort=False)[value].sum().reset_index(name=name)
+    return totals[totals[name] > 0].reset_index(drop=True)
+
+
+# pandas equivalents of the dataset queries, called with a FileSource
+
+def expiry_candidates_frame(source):
+    """EXPIRY_CANDIDATES_QUERY: allocated batches on open orders joined to their lots."""
+    allocated = source.table('allocated_materials_to_orders')
+    inventory = source.table('complete_warehouse_inventory')
+
+    allocated = allocated[
+        allocated['order_status'].isin(OPEN_ORDER_STATUSES) & allocated['material_component_batch'].notna()
+    ]
+    joined = allocated[
+        ['material_component_batch', 'trial_alias', 'material_description', 'order_id', 'order_status']
+    ].merge(
+        inventory[['lot_number', 'expiration_date', 'warehouse_name', 'actual_qty']],
+        left_on='material_component_batch', right_on='lot_number', how='inner'
+    )
+
+    return pd.DataFrame({
+        'batch_lot': joined['material_component_batch'],
+        'trial_alias': joined['trial_alias'],
+        'material_description': joined['material_description'],
+        'expiry_date': joined['expiration_date'],
+        'location': joined['warehouse_name'],
+        'quantity': joined['actual_qty'],
+        'order_id': joined['order_id'],
+        'order_status': joined['order_status'],
+    })
+
+
+def trial_consumption_frame(source):
+    """CONSUMPTION_QUERY: visits per month over the last 3 months, per trial."""
+    visits = source.table('patient_status_and_treatment_report')
+    cutoff = pd.Timestamp.now().normalize() - pd.DateOffset(months=3)
+    visits = visits[visits['visit_date'] >= cutoff]
+
+    grouped = visits.assign(month=visits['visit_date'].dt.to_period('M')).groupby(
+        'Trial Alias', dropna=False, sort=False
+    )
+    consumption = pd.DataFrame({
+        'total_patients': grouped['patient'].nunique(),
+        'total_visits': grouped.size(),
+        'months': grouped['month'].nunique(),
+    }).rename_axis('trial_alias').reset_index()
+    consumption['visits_per_month'] = consumption['total_visits'] / consumption['months'].replace(0, np.nan)
+    return consumption.drop(columns='months')
+
+
+def inventory_frame(source):
+    """INVENTORY_QUERY: stock on hand per trial, location and material."""
+    inventory = source.table('complete_warehouse_inventory').rename(
+        columns={'warehouse_name': 'location', 'description': 'material'}
+    )
+    return group_sum_positive(inventory, ['trial_alias', 'location', 'material'], 'actual_qty', 'total_stock')
+
+
+def shortfall_projection_frame(source):
+    """build_shortfall_query: inventory rows stocking out within 8 weeks at the recent visit rate."""
+    projected = inventory_frame(source).merge(
+        trial_consumption_frame(source)[['trial_alias', 'total_patients', 'visits_per_month']],
+        on='trial_alias', how='left'
+    )
+    projected['total_stock'] = projected['total_stock'].astype(float)
+    projected['packages_per_week'] = (projected['visits_per_month'] * 2 / 4.33).fillna(10)
+    projected['weeks_until_stockout'] = projected['total_stock'] / projected['packages_per_week']
+
+    shortfalls = projected[projected['weeks_until_stockout'] < 8].copy()
+    weeks = shortfalls['weeks_until_stockout']
+    shortfalls['severity'] = np.select([weeks < 2, weeks < 4], ['CRITICAL', 'HIGH'], 'MEDIUM')
+    return shortfalls.reset_index(drop=True)
+
+
+def enrollment_rates_frame(source):
+    """ENROLLMENT_RATES_QUERY: monthly enrollment per site, one row per year."""
+    return source.table('enrollment_rate_report').rename(columns={
+        'Trial Alias': 'trial_alias',
+        'Country': 'country',
+        'Site': 'site',
+        'Year': 'year',
+        'Months (Jan, Feb.. Dec)': 'months',
+    })[['trial_alias', 'country', 'site', 'year', 'months']]
+
+
+def country_enrollment_frame(source):
+    """COUNTRY_ENROLLMENT_QUERY: actual monthly enrollment rate per trial and country."""
+    return source.table('country_level_enrollment_report').rename(
+        columns={'country_name': 'country'}
+    )[['trial_alias', 'country', 'enrollment_rate_monthly_actual']]
+
+
+def site_inventory_frame(source):
+    """SITE_INVENTORY_QUERY: stock per trial, location and material, with the warehouse country."""
+    inventory = source.table('complete_warehouse_inventory').rename(
+        columns={'warehouse_name': 'location', 'warehouse_country': 'country', 'description': 'material'}
+    )
+    return group_sum_positive(
+        inventory, ['trial_alias', 'location', 'country', 'material'], 'actual_qty', 'total_stock'
+    )
+
+
+def inventory_lots_frame(source):
+    """INVENTORY_LOTS_QUERY: stock on hand per lot expiry date."""
+    inventory = source.table('complete_warehouse_inventory').rename(columns={
+        'warehouse_name': 'location', 'description': 'material', 'expiration_date': 'expiry_date'
+    })
+    return group_sum_positive(
+        inventory, ['trial_alias', 'location', 'material', 'expiry_date'], 'actual_qty', 'quantity'
+    )
+
+
+def scheduled_shipments_frame(source):
+    """SCHEDULED_SHIPMENTS_QUERY: open depot shipments that have not left yet."""
+    shipments = source.table('warehouse_and_site_shipment_tracking_report')
+    today = pd.Timestamp.now().normalize()
+    ship_date = pd.to_datetime(shipments['actual_ship_date'])
+    shipments = shipments[
+        shipments['order_status'].isin(OPEN_ORDER_STATUSES) & (ship_date.isna() | (ship_date >= today))
+    ]
+    return pd.DataFrame({
+        'trial_alias': shipments['trial_alias'],
+        'location': shipments['shipping_location'],
+        'due_date': pd.to_datetime(shipments['requested_delivery_date']).fillna(
+            pd.to_datetime(shipments['order_date'])
+        ),
+        'quantity': shipments['actual_qty'],
+    }).reset_index(drop=True)
+
+
+def lot_locations_frame(source):
+    """LOT_LOCATIONS_QUERY: material and country of each lot at each warehouse."""
+    inventory = source.table('complete_warehouse_inventory').sort_values(
+        ['lot_number', 'warehouse_name', 'item_number'], na_position='last'
+    ).drop_duplicates(['lot_number', 'warehouse_name'])
+    return inventory.rename(columns={
+        'lot_number': 'batch_lot', 'warehouse_name': 'location',
+        'warehouse_country': 'country', 'item_number': 'material_number',
+    })[['batch_lot', 'location', 'country', 'material_number']].reset_index(drop=True)
+
+
+def reevaluations_frame(source):
+    """REEVALUATIONS_QUERY: re-evaluation requests."""
+    return source.table('re_evaluation').rename(columns={
+        'ID': 'reevaluation_id',
+        'Request Type (Molecule Planner to Complete)': 'request_type',
+        'Sample Status (NDP Material Coordinator to Complete)': 'sample_status',
+        'Item Code (Molecule Planner to Complete)': 'material_number',
+        'Lot Number (Molecule Planner to Complete)': 'batch_lot',
+        'Target Date for Results (Molecule Planner to Complete)': 'target_date',
+    })[['reevaluation_id', 'request_type', 'sample_status', 'material_number', 'batch_lot', 'target_date']]
+
+
+def rim_submissions_frame(source):
+    """RIM_SUBMISSIONS_QUERY: regulatory submissions per trial."""
+    return source.table('rim').rename(columns={
+        'clinical_study_v': 'trial_alias', 'name_v': 'submission', 'type_v': 'submission_type',
+        'health_authority_division_c': 'authority', 'status_v': 'status', 'approved_date_c': 'approved_date',
+    })[['trial_alias', 'submission', 'submission_type', 'authority', 'status', 'approved_date']]
+
+
+def material_countries_frame(source):
+    """MATERIAL_COUNTRIES_QUERY: countries each trial material is registered for."""
+    return source.table('material_country_requirements').rename(columns={
+        'Trial Alias': 'trial_alias', 'Material Number': 'material_number', 'Countries': 'country',
+    })[['trial_alias', 'material_number', 'country']].drop_duplicates().reset_index(drop=True)
+
+
+def shipping_timelines_frame(source):
+    """SHIPPING_TIMELINES_QUERY: free-text shipping timelines per shipping location."""
+    return source.table('ip_shipping_timelines_report').rename(
+        columns={'country_name': 'country'}
+    )[['ip_helper', 'ip_timeline', 'country']]
+
+
+def genealogy_edges_frame(source):
+    """GENEALOGY_EDGES_QUERY: parent -> child lot edges."""
+    genealogy = source.table('batch_geneology')
+    master = source.table('batch_master')
+    orders = source.table('manufacturing_orders')
+
+    used = genealogy[['Batch number', 'Order Number']].merge(
+        orders[['order_id', 'fing_batch']], left_on='Order Number', right_on='order_id'
+    ).rename(columns={'Batch number': 'parent_lot', 'fing_batch': 'child_lot'})
+    packaged = master[['Batch number', 'Parent Batch of Package Order']].merge(
+        orders[['package_form', 'fing_batch']], left_on='Parent Batch of Package Order',
+        right_on='package_form', how='left'
+    )
+    packaged = pd.DataFrame({
+        'parent_lot': packaged['fing_batch'].fillna(packaged['Parent Batch of Package Order']),
+        'child_lot': packaged['Batch number'],
+    })
+
+    edges = pd.concat([used[['parent_lot', 'child_lot']], packaged], ignore_index=True).dropna().drop_duplicates()
+    known = edges['parent_lot'].isin(master['Batch number']) | edges['parent_lot'].isin(genealogy['Batch number'])
+    edges = edges[known & (edges['parent_lot'] != edges['child_lot'])]
+    return edges.sort_values(['parent_lot', 'child_lot']).reset_index(drop=True)
+
+
+def excursions_frame(source):
+    """EXCURSIONS_QUERY: reported excursions per lot and LPN."""
+    return source.table('excursion_detail_report').rename(columns={
+        'Excursion ID / Allowable Hours Change Event ID': 'excursion_id',
+        'Excursion Type': 'excursion_type',
+        'Lot Number': 'batch_lot',
+        'LPN': 'lpn',
+        'Excursion Details': 'excursion_details',
+        'Date/Time when Excursion was Reported': 'reported_at',
+        'FFU State -- After Final Disposition': 'ffu_status',
+    })[['excursion_id', 'excursion_type', 'batch_lot', 'lpn', 'excursion_details', 'reported_at', 'ffu_status']]
+
+
+def lpn_inventory_frame(source):
+    """LPN_INVENTORY_QUERY: stock per LPN and lot with its storage class."""
+    inventory = source.table('complete_warehouse_inventory').rename(columns={
+        'lot_number': 'batch_lot', 'warehouse_name': 'location', 'class': 'storage_class',
+    })
+    return inventory.groupby(
+        ['lpn', 'batch_lot', 'trial_alias', 'location', 'storage_class'], as_index=False, dropna=False
+    ).agg(
+        material_description=('description', 'min'),
+        expiry_date=('expiration_date', 'min'),
+        quantity=('actual_qty', 'sum'),
+    )
+
+
+def compare_alerts(alerts, reference):
+    """
+    Compare two alert lists regardless of order.
+
+    Returns:
+        tuple: (alerts only in alerts, alerts only in reference), as JSON strings
+    """
+    def keys(items):
+        return {json.dumps(alert, sort_keys=True, default=str) for alert in items}
+
+    left, right = keys(alerts), keys(reference)
+    return sorted(left - right), sorted(right - left)
+
+
+if __name__ == "__main__":
+    from watchdog_core import SupplyWatchdog
+
+    parser = argparse.ArgumentParser(description="Run the watchdog detectors over CSV/Parquet files")
+    parser.add_argument('--data-dir', default=Config.DATA_DIR, help="Directory with the CSV or Parquet files")
+    parser.add_argument('--cache-dir', default=None, help="Cache parsed CSV files as Parquet here")
+    parser.add_argument('--detectors', nargs='+', default=None, help="Detectors to run")
+    parser.add_argument('--output', default=None,
+                        help="Payload file (default: snapshot_output_<time>.json in the temp directory)")
+    parser.add_argument('--compare-db', action='store_true',
+                        help="Also run the detectors on the database and report differing alerts")
+    args = parser.parse_args()
+
+    watchdog = SupplyWatchdog(detectors=args.detectors, source=FileSource(args.data_dir, args.cache_dir))
+    alerts, timings = watchdog.run_detectors()
+    print(f"\n✓ {len(alerts)} alerts from files in {args.data_dir}")
+
+    payload = watchdog.build_payload(alerts, serialize=False)
+    payload['detector_timings'] = timings['detectors']
+    payload['dataset_timings'] = timings['datasets']
+    output_file = args.output or os.path.join(
+        tempfile.gettempdir(), f"snapshot_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"✓ JSON payload saved to: {watchdog.write_json_payload(payload, output_file)}")
+
+    if args.compare_db:
+        db_alerts, _ = SupplyWatchdog(detectors=args.detectors).run_detectors()
+        only_files, only_db = compare_alerts(alerts, db_alerts)
+        if only_files or only_db:
+            print(f"✗ {len(only_files)} alerts only from files, {len(only_db)} only from the database")
+            for alert in (only_files + only_db)[:5]:
+                print(f"  {alert}")
+        else:
+            print(f"✓ Alerts identical to the database run ({len(db_alerts)})")
+        Config.dispose_engines()
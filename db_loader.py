@@ -1,34 +1,88 @@
 """
 Database loader module for loading CSV files into PostgreSQL.
 """
+import hashlib
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from sqlalchemy import create_engine, URL
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from config import Config
+from metrics import RunMetrics, submit_in_context
+from watchdog_views import refresh_watchdog_views
+
+
+# Declared column types for the tables the watchdog queries. Columns that are
+# not listed here get a type inferred from the data (see infer_column_types).
+TABLE_SCHEMAS = {
+    'allocated_materials_to_orders': {
+        'order_quantity': 'NUMERIC',
+        'modified_date': 'TIMESTAMP',
+    },
+    'complete_warehouse_inventory': {
+        'expiration_date': 'DATE',
+        'sap_destroy_after_dt': 'DATE',
+        'actual_qty': 'NUMERIC',
+    },
+    'patient_status_and_treatment_report': {
+        'visit_date': 'DATE',
+    },
+}
+
+# Indexes created after each load, on the join and filter keys of the watchdog
+TABLE_INDEXES = {
+    'allocated_materials_to_orders': [['material_component_batch'], ['order_status']],
+    'complete_warehouse_inventory': [['lot_number'], ['trial_alias']],
+    'patient_status_and_treatment_report': [['Trial Alias'], ['visit_date']],
+}
+
+# Inference patterns, tried in order; a column takes the first type that all
+# of its non-null sample values match, and TEXT otherwise
+INFERRED_TYPES = [
+    ('BIGINT', re.compile(r'[+-]?(0|[1-9]\d{0,17})')),
+    ('DOUBLE PRECISION', re.compile(r'[+-]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][+-]?\d+)?')),
+    ('DATE', re.compile(r'\d{4}-\d{2}-\d{2}')),
+    ('TIMESTAMP', re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?')),
+    ('BOOLEAN', re.compile(r'True|False')),
+]
+
+
+def quote_ident(name):
+    """Quote a table or column name for use in raw SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def index_name(table_name, columns):
+    """Build the name of a loader-managed index."""
+    name = '_'.join([table_name] + [re.sub(r'\W+', '_', column.lower()) for column in columns])
+    return f"idx_{name}"[:63]
 
 
 class DatabaseLoader:
     """Handle loading CSV files into PostgreSQL database."""
 
-    def __init__(self):
-        """Initialize database connection."""
+    def __init__(self, workers=None):
+        """
+        Initialize database connection.
+
+        Args:
+            workers (int): Number of tables loaded concurrently by
+                load_all_csvs. Uses Config.LOAD_WORKERS if None.
+        """
         self.config = Config()
         self.engine = None
+        self.connection = None
         self.connection_string = Config.get_connection_string()
+        self.workers = max(1, workers or Config.LOAD_WORKERS)
+        # RunMetrics of the load in progress, set by load_all_csvs
+        self.metrics = None
 
     def connect(self):
         try:
-            # Use SQLAlchemy URL.create() to properly handle special characters in password
-            url = URL.create(
-                drivername="postgresql+psycopg2",
-                username=self.config.DB_USER,
-                password=self.config.DB_PASSWORD,
-                host=self.config.DB_HOST,
-                port=int(self.config.DB_PORT),
-                database=self.config.DB_NAME,
-            )
-            self.engine = create_engine(url)
+            # Shared engine with one pooled connection per worker, plus the one held below
+            self.engine = Config.get_engine(pool_size=self.workers + 1)
             self.connection = self.engine.connect()
             print("✓ Database connection successful")
             return True
@@ -40,6 +94,10 @@ class DatabaseLoader:
         """
         Load a single CSV file into a PostgreSQL table.
 
+        The table is created with the declared/inferred column types first;
+        values are read as strings and converted by PostgreSQL on insert, so
+        both load methods produce identical tables.
+
         Args:
             csv_file_path (str): Path to CSV file
             table_name (str): Name of the table to create
@@ -51,17 +109,21 @@ class DatabaseLoader:
         """
         try:
             # Read CSV file
-            df = pd.read_csv(csv_file_path)
+            df = pd.read_csv(csv_file_path, dtype=str)
+            column_types = self.table_column_types(table_name, csv_file_path)
 
             # Load into database
-            df.to_sql(
-                table_name,
-                self.engine,
-                if_exists=if_exists,
-                index=False,
-                method='multi',
-                chunksize=chunksize
-            )
+            with self.engine.begin() as conn:
+                self.prepare_table(conn, table_name, column_types, if_exists)
+                df.to_sql(
+                    table_name,
+                    conn,
+                    if_exists='append',
+                    index=False,
+                    method='multi',
+                    chunksize=chunksize
+                )
+                self.create_indexes(conn, table_name)
 
             row_count = len(df)
             print(f"  ✓ Loaded {table_name}: {row_count} rows")
@@ -71,12 +133,394 @@ class DatabaseLoader:
             print(f"  ✗ Failed to load {table_name}: {e}")
             return -1
 
-    def load_all_csvs(self, data_dir=None):
+    def infer_column_types(self, csv_file_path, sample_rows=None, chunk_rows=100000):
+        """
+        Infer PostgreSQL column types for a CSV file from its values.
+
+        The whole file is checked by default, in chunks, so a single value
+        late in the file that does not fit a type cannot fail the COPY.
+
+        Args:
+            csv_file_path (str): Path to CSV file
+            sample_rows (int): Only read this many rows, or None for all
+            chunk_rows (int): Rows read at a time
+
+        Returns:
+            dict: Column name -> PostgreSQL type, in header order
+        """
+        chunks = pd.read_csv(csv_file_path, nrows=sample_rows, dtype=str, chunksize=chunk_rows)
+        candidates = None
+        seen = set()
+
+        for chunk in chunks:
+            if candidates is None:
+                candidates = {column: [pg_type for pg_type, _ in INFERRED_TYPES] for column in chunk.columns}
+            for column in chunk.columns:
+                values = pd.Series(chunk[column].dropna().unique(), dtype=object)
+                if values.empty:
+                    continue
+                seen.add(column)
+                candidates[column] = [
+                    pg_type for pg_type in candidates[column] if self._values_fit(values, pg_type)
+                ]
+
+        if candidates is None:
+            candidates = {column: [] for column in pd.read_csv(csv_file_path, nrows=0).columns}
+        return {
+            column: types[0] if column in seen and types else 'TEXT'
+            for column, types in candidates.items()
+        }
+
+    @staticmethod
+    def _values_fit(values, pg_type):
+        """Whether every value (non-null strings) parses as pg_type."""
+        pattern = dict(INFERRED_TYPES)[pg_type]
+        if not values.str.fullmatch(pattern).all():
+            return False
+        if pg_type == 'DATE' and pd.to_datetime(values, format='%Y-%m-%d', errors='coerce').isna().any():
+            return False
+        return True
+
+    def table_column_types(self, table_name, csv_file_path, sample_rows=None):
+        """
+        Resolve the column types of a table: declared in TABLE_SCHEMAS, else inferred.
+
+        Args:
+            table_name (str): Name of the table
+            csv_file_path (str): Path to CSV file
+            sample_rows (int): Rows read to infer undeclared types, or None for all
+
+        Returns:
+            dict: Column name -> PostgreSQL type, in header order
+        """
+        column_types = self.infer_column_types(csv_file_path, sample_rows)
+        declared = TABLE_SCHEMAS.get(table_name, {})
+        return {column: declared.get(column, pg_type) for column, pg_type in column_types.items()}
+
+    def prepare_table(self, conn, table_name, column_types, if_exists='replace'):
+        """
+        Create a table with explicit column types, honouring if_exists.
+
+        Args:
+            conn: SQLAlchemy connection, inside the load transaction
+            table_name (str): Name of the table to create
+            column_types (dict): Column name -> PostgreSQL type
+            if_exists (str): How to behave if table exists ('replace', 'append', 'fail')
+        """
+        table_exists = conn.execute(
+            text("SELECT to_regclass(:name)"), {'name': quote_ident(table_name)}
+        ).scalar() is not None
+
+        if table_exists and if_exists == 'fail':
+            raise ValueError(f"Table '{table_name}' already exists.")
+        if table_exists and if_exists == 'replace':
+            # Dependent watchdog views are recreated by refresh_views()
+            conn.execute(text(f"DROP TABLE {quote_ident(table_name)} CASCADE"))
+
+        columns_sql = ", ".join(
+            f"{quote_ident(column)} {pg_type}" for column, pg_type in column_types.items()
+        )
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {quote_ident(table_name)} ({columns_sql})"))
+
+    def create_indexes(self, conn, table_name):
+        """Create the TABLE_INDEXES entries of a table, after its rows are loaded."""
+        for columns in TABLE_INDEXES.get(table_name, []):
+            conn.execute(text("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                quote_ident(index_name(table_name, columns)),
+                quote_ident(table_name),
+                ", ".join(quote_ident(column) for column in columns)
+            )))
+
+    def load_csv_to_table_copy(self, csv_file_path, table_name, if_exists='replace', sample_rows=None):
+        """
+        Stream a single CSV file into a PostgreSQL table with COPY FROM STDIN.
+
+        The table is created from the CSV header with the declared/inferred
+        column types (undeclared types are inferred from every value, or
+        from the first ``sample_rows`` rows). The file itself is never loaded into a DataFrame: psycopg2
+        streams it to the server in a single COPY.
+
+        Args:
+            csv_file_path (str): Path to CSV file
+            table_name (str): Name of the table to create
+            if_exists (str): How to behave if table exists ('replace', 'append', 'fail')
+            sample_rows (int): Rows used to infer column types, or None for all
+
+        Returns:
+            int: Number of rows loaded, or -1 on failure
+        """
+        try:
+            column_types = self.table_column_types(table_name, csv_file_path, sample_rows)
+            columns_sql = ", ".join(quote_ident(column) for column in column_types)
+            copy_sql = (
+                f"COPY {quote_ident(table_name)} ({columns_sql}) "
+                "FROM STDIN WITH (FORMAT csv, HEADER true)"
+            )
+
+            # Creating the table in the same transaction as the COPY lets
+            # PostgreSQL skip WAL for the new rows when wal_level=minimal
+            with self.engine.begin() as conn:
+                self.prepare_table(conn, table_name, column_types, if_exists)
+                cursor = conn.connection.cursor()
+                with open(csv_file_path, 'r', encoding='utf-8', newline='') as csv_file:
+                    cursor.copy_expert(copy_sql, csv_file)
+                row_count = cursor.rowcount
+                # The raw cursor bypasses the statement counter of RunMetrics
+                if self.metrics is not None:
+                    self.metrics.add_round_trips(1)
+                self.create_indexes(conn, table_name)
+
+            print(f"  ✓ Loaded {table_name}: {row_count} rows")
+            return row_count
+
+        except Exception as e:
+            print(f"  ✗ Failed to load {table_name}: {e}")
+            return -1
+
+    @staticmethod
+    def file_fingerprint(csv_file_path, with_hash=True):
+        """
+        Fingerprint a source file by size, modification time and content hash.
+
+        Args:
+            csv_file_path (str): Path to CSV file
+            with_hash (bool): Also compute the SHA-256 of the file contents
+
+        Returns:
+            dict: file_size, file_mtime and content_hash (None if not computed)
+        """
+        stat = os.stat(csv_file_path)
+        content_hash = None
+        if with_hash:
+            digest = hashlib.sha256()
+            with open(csv_file_path, 'rb') as csv_file:
+                for block in iter(lambda: csv_file.read(1024 * 1024), b''):
+                    digest.update(block)
+            content_hash = digest.hexdigest()
+
+        return {
+            'file_size': stat.st_size,
+            'file_mtime': stat.st_mtime,
+            'content_hash': content_hash
+        }
+
+    def ensure_metadata_table(self):
+        """Create the table holding the per-file load fingerprints."""
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {quote_ident(Config.LOAD_METADATA_TABLE)} (
+                    table_name TEXT PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    file_size BIGINT NOT NULL,
+                    file_mtime DOUBLE PRECISION NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    row_count BIGINT,
+                    loaded_at TIMESTAMP DEFAULT NOW()
+                )
+            """))
+
+    def get_fingerprint(self, table_name):
+        """Return the stored fingerprint of a table's source file, or None."""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text(f"""
+                    SELECT file_size, file_mtime, content_hash, row_count
+                    FROM {quote_ident(Config.LOAD_METADATA_TABLE)}
+                    WHERE table_name = :table_name
+                """),
+                {'table_name': table_name}
+            ).mappings().fetchone()
+        return dict(row) if row else None
+
+    def save_fingerprint(self, table_name, csv_file_path, fingerprint, row_count, reloaded=True):
+        """
+        Record the fingerprint of the file a table was last loaded from.
+
+        Args:
+            table_name (str): Name of the loaded table
+            csv_file_path (str): Path to the source CSV file
+            fingerprint (dict): Result of file_fingerprint()
+            row_count (int): Number of rows written by the load
+            reloaded (bool): False when the table was not touched, which keeps
+                the previous loaded_at
+        """
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(f"""
+                    INSERT INTO {quote_ident(Config.LOAD_METADATA_TABLE)} (
+                        table_name, file_name, file_size, file_mtime, content_hash, row_count, loaded_at
+                    ) VALUES (
+                        :table_name, :file_name, :file_size, :file_mtime, :content_hash, :row_count, NOW()
+                    )
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        file_name = EXCLUDED.file_name,
+                        file_size = EXCLUDED.file_size,
+                        file_mtime = EXCLUDED.file_mtime,
+                        content_hash = EXCLUDED.content_hash,
+                        row_count = EXCLUDED.row_count,
+                        loaded_at = CASE WHEN :reloaded THEN EXCLUDED.loaded_at
+                                         ELSE {quote_ident(Config.LOAD_METADATA_TABLE)}.loaded_at END
+                """),
+                {
+                    'table_name': table_name,
+                    'reloaded': reloaded,
+                    'file_name': os.path.basename(csv_file_path),
+                    'row_count': row_count,
+                    **fingerprint
+                }
+            )
+
+    def table_exists(self, table_name):
+        """Check whether a table exists in the database."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT to_regclass(:name)"), {'name': quote_ident(table_name)}
+            ).scalar() is not None
+
+    def append_new_rows(self, csv_file_path, table_name, key_columns):
+        """
+        Append the rows of a CSV file whose natural key is not yet in the table.
+
+        The file is streamed into a temporary staging table with COPY and
+        anti-joined against the target on the key columns, so only rows with
+        new keys are written. Rows with a NULL key column cannot be matched
+        and are not appended.
+
+        Args:
+            csv_file_path (str): Path to CSV file
+            table_name (str): Name of the existing target table
+            key_columns (list): Columns forming the natural key
+
+        Returns:
+            int: Number of new rows appended, or -1 on failure
+        """
+        try:
+            columns = list(pd.read_csv(csv_file_path, nrows=0).columns)
+            missing = [column for column in key_columns if column not in columns]
+            if missing:
+                raise ValueError(f"natural key columns not in file: {', '.join(missing)}")
+
+            target = quote_ident(table_name)
+            columns_sql = ", ".join(quote_ident(column) for column in columns)
+            staged_sql = ", ".join(f"s.{quote_ident(column)}" for column in columns)
+            key_match = " AND ".join(f"t.{quote_ident(k)} = s.{quote_ident(k)}" for k in key_columns)
+            key_present = " AND ".join(f"s.{quote_ident(k)} IS NOT NULL" for k in key_columns)
+
+            raw_conn = self.engine.raw_connection()
+            try:
+                cursor = raw_conn.cursor()
+                cursor.execute(
+                    f"CREATE TEMP TABLE incremental_stage (LIKE {target}) ON COMMIT DROP"
+                )
+                with open(csv_file_path, 'r', encoding='utf-8', newline='') as csv_file:
+                    cursor.copy_expert(
+                        f"COPY incremental_stage ({columns_sql}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                        csv_file
+                    )
+                cursor.execute(f"""
+                    INSERT INTO {target} ({columns_sql})
+                    SELECT {staged_sql}
+                    FROM incremental_stage s
+                    WHERE {key_present}
+                      AND NOT EXISTS (SELECT 1 FROM {target} t WHERE {key_match})
+                """)
+                row_count = cursor.rowcount
+
+                raw_conn.commit()
+            except Exception:
+                raw_conn.rollback()
+                raise
+            finally:
+                raw_conn.close()
+
+            print(f"  ✓ Appended {table_name}: {row_count} new rows")
+            return row_count
+
+        except Exception as e:
+            print(f"  ✗ Failed to append {table_name}: {e}")
+            return -1
+
+    def load_csv_file(self, csv_file_path, table_name, load_table, incremental=False):
+        """
+        Load one CSV file and record its fingerprint.
+
+        In incremental mode a file whose size and modification time, or
+        failing that content hash, match the stored fingerprint is skipped.
+        Changed append-style reports (Config.INCREMENTAL_KEYS) only get their
+        new rows appended; any other changed file is fully reloaded.
+
+        Args:
+            csv_file_path (str): Path to CSV file
+            table_name (str): Name of the target table
+            load_table (callable): Full-load method, called as load_table(path, table)
+            incremental (bool): Skip unchanged files and append new rows only
+
+        Returns:
+            int: Number of rows loaded, -1 on failure, or None if skipped
+        """
+        fingerprint = self.file_fingerprint(csv_file_path, with_hash=False)
+        stored = None
+        table_exists = False
+
+        if incremental:
+            try:
+                stored = self.get_fingerprint(table_name)
+                table_exists = self.table_exists(table_name)
+            except Exception as e:
+                print(f"  ✗ Failed to read load metadata for {table_name}: {e}")
+                return -1
+
+            unchanged = (
+                stored is not None and table_exists
+                and stored['file_size'] == fingerprint['file_size']
+                and stored['file_mtime'] == fingerprint['file_mtime']
+            )
+            if unchanged:
+                print(f"  - Skipped {table_name}: unchanged since last load")
+                return None
+
+        fingerprint = self.file_fingerprint(csv_file_path)
+
+        if incremental and stored is not None and table_exists and stored['content_hash'] == fingerprint['content_hash']:
+            # Touched but not modified: refresh the stored mtime only
+            row_count = stored['row_count']
+            print(f"  - Skipped {table_name}: content unchanged since last load")
+            skipped = True
+        else:
+            key_columns = Config.INCREMENTAL_KEYS.get(table_name)
+            if incremental and key_columns and table_exists:
+                row_count = self.append_new_rows(csv_file_path, table_name, key_columns)
+            else:
+                row_count = load_table(csv_file_path, table_name)
+            skipped = False
+
+        if row_count is not None and row_count >= 0:
+            try:
+                self.save_fingerprint(table_name, csv_file_path, fingerprint, row_count, reloaded=not skipped)
+            except Exception as e:
+                print(f"  ✗ Failed to record fingerprint for {table_name}: {e}")
+
+        return None if skipped else row_count
+
+    def load_all_csvs(self, data_dir=None, method='insert', workers=None, incremental=False):
         """
         Load all CSV files from the data directory.
 
+        Tables are independent, so with more than one worker they are loaded
+        concurrently on a thread pool. Results are still accumulated in sorted
+        file order, so the summary does not depend on completion order.
+        Seconds and rows per table, stage timings and round trips are kept in
+        results['metrics'] and published to watchdog_runs and the metrics file.
+
         Args:
             data_dir (str): Directory containing CSV files. Uses Config.DATA_DIR if None.
+            method (str): 'insert' to load through pandas to_sql, 'copy' to
+                stream each file with COPY FROM STDIN
+            workers (int): Number of tables loaded at once. Uses the value
+                given to the constructor if None; capped at that value since
+                the connection pool is sized for it.
+            incremental (bool): Skip files unchanged since the last load and
+                only append new rows to append-style reports
 
         Returns:
             dict: Summary of loading results
@@ -97,37 +541,114 @@ class DatabaseLoader:
             print(f"✗ No CSV files found in {data_dir}")
             return None
 
+        if method == 'copy':
+            load_table = self.load_csv_to_table_copy
+        elif method == 'insert':
+            load_table = self.load_csv_to_table
+        else:
+            print(f"✗ Unknown load method: {method}")
+            return None
+
+        workers = min(workers or self.workers, self.workers)
+
+        try:
+            self.ensure_metadata_table()
+        except Exception as e:
+            print(f"✗ Failed to create load metadata table: {e}")
+            return None
+
         results = {
             'total_files': len(csv_files),
             'loaded': 0,
+            'skipped': 0,
             'failed': 0,
             'total_rows': 0,
-            'tables': []
+            'tables': [],
+            'skipped_tables': [],
+            'failed_tables': []
         }
 
+        metrics = RunMetrics('load', run_id=f"LOAD-{time.strftime('%Y-%m-%d-%H%M%S')}")
+        metrics.track_engine(self.engine)
+        self.metrics = metrics
+
+        def load_job(file_path, table_name):
+            start = time.perf_counter()
+            row_count = self.load_csv_file(file_path, table_name, load_table, incremental)
+            metrics.record('table_seconds', table_name, round(time.perf_counter() - start, 3))
+            if row_count is not None and row_count >= 0:
+                metrics.record('table_rows', table_name, row_count)
+            return row_count
+
+        jobs = []
         for filename in sorted(csv_files):
             # Convert filename to table name (replace hyphens with underscores)
             table_name = filename.replace('.csv', '').replace('-', '_')
-            file_path = os.path.join(data_dir, filename)
+            jobs.append((table_name, os.path.join(data_dir, filename)))
+
+        with metrics.stage('load_tables'):
+            if workers > 1:
+                print(f"Loading with {workers} workers")
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {
+                        table_name: submit_in_context(executor, load_job, file_path, table_name)
+                        for table_name, file_path in jobs
+                    }
+                    row_counts = {table_name: future.result() for table_name, future in futures.items()}
+            else:
+                row_counts = {
+                    table_name: load_job(file_path, table_name)
+                    for table_name, file_path in jobs
+                }
 
-            row_count = self.load_csv_to_table(file_path, table_name)
+        for table_name, _ in jobs:
+            row_count = row_counts[table_name]
 
-            if row_count >= 0:
+            if row_count is None:
+                results['skipped'] += 1
+                results['skipped_tables'].append(table_name)
+            elif row_count >= 0:
                 results['loaded'] += 1
                 results['total_rows'] += row_count
                 results['tables'].append(table_name)
             else:
                 results['failed'] += 1
+                results['failed_tables'].append(table_name)
+
+        with metrics.stage('refresh_views'):
+            results['views'] = self.refresh_views()
+
+        metrics.set('rows_loaded', results['total_rows'])
+        metrics.finish('success' if not results['failed'] else 'failed')
+        self.metrics = None
+        results['metrics'] = metrics.as_dict()
 
         print("=" * 60)
         print(f"\n📊 Loading Summary:")
         print(f"  Total files: {results['total_files']}")
         print(f"  Successfully loaded: {results['loaded']}")
+        print(f"  Skipped (unchanged): {results['skipped']}")
         print(f"  Failed: {results['failed']}")
+        if results['failed_tables']:
+            print(f"  Failed tables: {', '.join(results['failed_tables'])}")
         print(f"  Total rows loaded: {results['total_rows']}")
+        metrics.publish(self.engine)
 
         return results
 
+    def refresh_views(self):
+        """
+        Create or concurrently refresh the watchdog materialized views.
+
+        Returns:
+            dict: View name -> 'created', 'refreshed', 'skipped' or an error message
+        """
+        status = refresh_watchdog_views(self.engine)
+        for view_name, outcome in status.items():
+            mark = '✗' if outcome.startswith('failed') else '✓'
+            print(f"  {mark} View {view_name}: {outcome}")
+        return status
+
     def verify_tables(self):
         """Verify loaded tables and show row counts."""
         try:
@@ -159,7 +680,13 @@ class DatabaseLoader:
             print(f"✗ Failed to verify tables: {e}")
 
     def close(self):
-        """Close database connection."""
-        if self.engine:
-            self.engine.dispose()
+        """
+        Close the loader's connection.
+
+        The shared engine is left open for the other users in the process;
+        call Config.dispose_engines() at process exit.
+        """
+        if self.engine and self.connection is not None:
+            self.connection.close()
+            self.connection = None
             print("\n✓ Database connection closed")
@@ -0,0 +1,231 @@
+"""
+Enrollment-based demand forecasting for the shortfall detector.
+
+enrollment_rate_report stores one row per trial, country, site and year, with
+the twelve monthly enrollment counts in a comma-separated string. The series
+are parsed once into a sites x months NumPy matrix and cached, then rolling
+rates and linear trends are computed for all sites in a few array operations.
+The site forecasts are rolled up to trial/country demand, which is matched to
+inventory by warehouse country.
+"""
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+
+WEEKS_PER_MONTH = 4.33
+
+# Monthly enrollment per site, one row per year
+ENROLLMENT_RATES_QUERY = """
+SELECT
+    "Trial Alias" as trial_alias,
+    "Country" as country,
+    "Site" as site,
+    "Year" as year,
+    "Months (Jan, Feb.. Dec)" as months
+FROM enrollment_rate_report
+"""
+
+# Actual monthly enrollment rate per trial and country
+COUNTRY_ENROLLMENT_QUERY = """
+SELECT
+    trial_alias,
+    country_name as country,
+    enrollment_rate_monthly_actual
+FROM country_level_enrollment_report
+"""
+
+# Stock on hand per trial, location and material, with the warehouse country
+SITE_INVENTORY_QUERY = """
+SELECT
+    trial_alias,
+    warehouse_name as location,
+    warehouse_country as country,
+    description as material,
+    SUM(actual_qty) as total_stock
+FROM complete_warehouse_inventory
+GROUP BY trial_alias, warehouse_name, warehouse_country, description
+HAVING SUM(actual_qty) > 0
+"""
+
+SITE_KEY = ['trial_alias', 'country', 'site']
+
+# Parsed series, keyed by a hash of the raw enrollment rows
+_series_cache = {}
+_cache_lock = threading.Lock()
+
+
+class EnrollmentSeries:
+    """Monthly enrollment per site as a sites x months matrix."""
+
+    def __init__(self, sites, first_year, matrix):
+        """
+        Args:
+            sites (DataFrame): trial_alias, country and site of each matrix row
+            first_year (int): Year of the first matrix column (January)
+            matrix (ndarray): Enrollment counts, NaN where no data was reported
+        """
+        self.sites = sites
+        self.first_year = first_year
+        self.matrix = matrix
+
+    def month_index(self, timestamp):
+        """Column of the month containing timestamp (may be out of range)."""
+        return (timestamp.year - self.first_year) * 12 + timestamp.month - 1
+
+    def last_reported_month(self):
+        """Last column with data for any site, or -1 if there is none."""
+        reported = np.flatnonzero(~np.isnan(self.matrix).all(axis=0))
+        return int(reported[-1]) if len(reported) else -1
+
+
+def parse_enrollment_series(df):
+    """
+    Parse enrollment_rate_report rows into an EnrollmentSeries.
+
+    Results are cached on the content of the rows, so repeated watchdog runs
+    over unchanged data skip the string parsing.
+
+    Args:
+        df (DataFrame): Rows of ENROLLMENT_RATES_QUERY
+
+    Returns:
+        EnrollmentSeries: Parsed series
+    """
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+    with _cache_lock:
+        if digest in _series_cache:
+            return _series_cache[digest]
+
+    months = (
+        df['months'].fillna('').str.split(',', expand=True)
+        .reindex(columns=range(12))
+        .apply(lambda values: pd.to_numeric(values.str.strip(), errors='coerce'))
+        .to_numpy(dtype=float)
+    )
+    site_codes = df.groupby(SITE_KEY, sort=False, dropna=False).ngroup().to_numpy()
+    sites = df[SITE_KEY].drop_duplicates().reset_index(drop=True)
+    years = pd.to_numeric(df['year'], errors='coerce').fillna(0).astype(int).to_numpy()
+
+    first_year = int(years.min()) if len(years) else 0
+    n_months = (int(years.max()) - first_year + 1) * 12 if len(years) else 0
+    matrix = np.full((len(sites), n_months), np.nan)
+    columns = (years - first_year)[:, None] * 12 + np.arange(12)
+    matrix[site_codes[:, None], columns] = months
+
+    series = EnrollmentSeries(sites, first_year, matrix)
+    with _cache_lock:
+        _series_cache.clear()
+        _series_cache[digest] = series
+    return series
+
+
+def forecast_site_rates(series, as_of, horizon_weeks=8, window=3, trend_months=6):
+    """
+    Project monthly enrollment per site over the forecast horizon.
+
+    The rolling rate is the mean of the last `window` reported months up to
+    as_of; the trend is the least-squares slope over the last `trend_months`.
+    The projection extrapolates the trend from the middle of the rolling
+    window to the middle of the horizon and is floored at zero.
+
+    Args:
+        series (EnrollmentSeries): Parsed enrollment series
+        as_of (Timestamp): Forecast date; later months are ignored
+        horizon_weeks (float): Forecast horizon
+        window (int): Months in the rolling rate
+        trend_months (int): Months used to fit the trend
+
+    Returns:
+        DataFrame: SITE_KEY columns plus rolling_rate, trend and projected_rate
+    """
+    end = min(series.month_index(as_of), series.last_reported_month())
+    result = series.sites.copy()
+
+    if end < 0:
+        result['rolling_rate'] = np.nan
+        result['trend'] = np.nan
+        result['projected_rate'] = np.nan
+        return result
+
+    matrix = series.matrix[:, :end + 1]
+    recent = matrix[:, max(0, end + 1 - window):]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rolling = np.nanmean(recent, axis=1) if recent.size else np.full(len(matrix), np.nan)
+
+        # Vectorized least-squares slope per row, ignoring missing months
+        fit = matrix[:, max(0, end + 1 - trend_months):]
+        x = np.broadcast_to(np.arange(fit.shape[1], dtype=float), fit.shape)
+        valid = ~np.isnan(fit)
+        count = valid.sum(axis=1)
+        x_mean = np.where(valid, x, 0).sum(axis=1) / count
+        y_mean = np.where(valid, fit, 0).sum(axis=1) / count
+        dx = np.where(valid, x - x_mean[:, None], 0)
+        dy = np.where(valid, fit - y_mean[:, None], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    slope = np.where(count >= 2, np.nan_to_num(slope), 0.0)
+
+    offset = (min(window, end + 1) - 1) / 2 + horizon_weeks / WEEKS_PER_MONTH / 2
+    result['rolling_rate'] = rolling
+    result['trend'] = slope
+    result['projected_rate'] = np.clip(rolling + slope * offset, 0, None)
+    return result
+
+
+def apply_enrollment_demand(inventory, site_rates, country_rates, packages_per_patient=2):
+    """
+    Attach projected weekly package demand to inventory rows.
+
+    Each row takes the demand of the most specific level with a forecast:
+    the sites of its trial in the warehouse country, the country-level
+    actual rate, then all sites of the trial. Rows with no match keep a
+    NaN demand so the caller can apply its default.
+
+    Args:
+        inventory (DataFrame): Rows of SITE_INVENTORY_QUERY
+        site_rates (DataFrame): Result of forecast_site_rates
+        country_rates (DataFrame): Rows of COUNTRY_ENROLLMENT_QUERY
+        packages_per_patient (float): Packages per enrolled patient per month
+
+    Returns:
+        DataFrame: inventory plus projected_enrollment, enrollment_trend,
+            demand_source and packages_per_week
+    """
+    site_rates = site_rates.dropna(subset=['projected_rate'])
+    by_country = site_rates.groupby(['trial_alias', 'country'], as_index=False).agg(
+        site_rate=('projected_rate', 'sum'), site_trend=('trend', 'sum')
+    )
+    by_trial = site_rates.groupby('trial_alias', as_index=False).agg(
+        trial_rate=('projected_rate', 'sum'), trial_trend=('trend', 'sum')
+    )
+    country_level = (
+        country_rates.dropna(subset=['enrollment_rate_monthly_actual'])
+        .groupby(['trial_alias', 'country'], as_index=False)['enrollment_rate_monthly_actual'].sum()
+        .rename(columns={'enrollment_rate_monthly_actual': 'country_rate'})
+    )
+
+    merged = (
+        inventory
+        .merge(by_country, on=['trial_alias', 'country'], how='left')
+        .merge(country_level, on=['trial_alias', 'country'], how='left')
+        .merge(by_trial, on='trial_alias', how='left')
+    )
+
+    levels = [
+        (merged['site_rate'].notna(), 'site', 'site_rate', 'site_trend'),
+        (merged['country_rate'].notna(), 'country', 'country_rate', None),
+        (merged['trial_rate'].notna(), 'trial', 'trial_rate', 'trial_trend'),
+    ]
+    merged['demand_source'] = np.select([c for c, _, _, _ in levels], [s for _, s, _, _ in levels], None)
+    merged['projected_enrollment'] = np.select(
+        [c for c, _, _, _ in levels], [merged[r] for _, _, r, _ in levels], np.nan
+    )
+    merged['enrollment_trend'] = np.select(
+        [c for c, _, _, _ in levels],
+        [merged[t] if t else np.nan for _, _, _, t in levels],
+        np.nan
+    )
+    merged['packages_per_week'] = merged['projected_enrollment'] * packages_per_patient / WEEKS_PER_MONTH
+
+    return merged.drop(columns=['site_rate', 'site_trend', 'country_rate', 'trial_rate', 'trial_trend'])
@@ -0,0 +1,120 @@
+"""
+Temperature exposure of stock from the excursion detail report.
+
+excursion_detail_report records each excursion as free text ("Temperature
+recorded 10.7°C for 7 hours") per lot and LPN. The text is parsed in one
+vectorized pass: the report repeats a small set of distinct strings, so each
+distinct string is parsed once and the results are spread back by code.
+Hours outside the range of the stock's storage class
+(complete_warehouse_inventory.class) are summed per LPN and lot and compared
+with the hours that class allows.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+
+# Excursion events, one row per reported excursion
+EXCURSIONS_QUERY = """
+SELECT
+    "Excursion ID / Allowable Hours Change Event ID" as excursion_id,
+    "Excursion Type" as excursion_type,
+    "Lot Number" as batch_lot,
+    "LPN" as lpn,
+    "Excursion Details" as excursion_details,
+    "Date/Time when Excursion was Reported" as reported_at,
+    "FFU State -- After Final Disposition" as ffu_status
+FROM excursion_detail_report
+"""
+
+# Stock per LPN and lot with its storage class
+LPN_INVENTORY_QUERY = """
+SELECT
+    lpn,
+    lot_number as batch_lot,
+    trial_alias,
+    warehouse_name as location,
+    class as storage_class,
+    MIN(description) as material_description,
+    MIN(expiration_date) as expiry_date,
+    SUM(actual_qty) as quantity
+FROM complete_warehouse_inventory
+GROUP BY lpn, lot_number, trial_alias, warehouse_name, class
+"""
+
+EXCURSION_PATTERN = (
+    r'(?P<temperature>[-+]?\d+(?:\.\d+)?)\s*°?\s*(?P<scale>[CF])\b'
+    r'.*?(?P<duration>\d+(?:\.\d+)?)\s*(?P<unit>minute|min|hour|hr|day)'
+)
+UNIT_HOURS = {'minute': 1 / 60, 'min': 1 / 60, 'hour': 1, 'hr': 1, 'day': 24}
+
+
+def parse_excursion_details(details):
+    """
+    Parse free-text excursion details into temperature and duration.
+
+    Args:
+        details (Series): Text such as "Temperature recorded 10.7°C for 7 hours"
+
+    Returns:
+        DataFrame: temperature_c and hours (float) per row, NaN where the
+            text has no reading
+    """
+    codes, texts = pd.factorize(details)
+    parts = pd.Series(texts, dtype=object).astype(str).str.extract(
+        EXCURSION_PATTERN, flags=re.IGNORECASE
+    )
+    temperature = parts['temperature'].astype(float)
+    fahrenheit = parts['scale'].str.upper().eq('F')
+    parsed = pd.DataFrame({
+        'temperature_c': np.where(fahrenheit, (temperature - 32) * 5 / 9, temperature),
+        'hours': parts['duration'].astype(float) * parts['unit'].str.lower().map(UNIT_HOURS),
+    })
+    # Rows with null details have code -1; the appended NaN row covers them
+    parsed = pd.concat([parsed, pd.DataFrame({'temperature_c': [np.nan], 'hours': [np.nan]})], ignore_index=True)
+    return parsed.iloc[codes].set_index(details.index)
+
+
+def exposure_by_lpn(excursions, inventory, storage_classes):
+    """
+    Hours outside the storage class range per LPN and lot.
+
+    Args:
+        excursions (DataFrame): Rows of EXCURSIONS_QUERY
+        inventory (DataFrame): Rows of LPN_INVENTORY_QUERY
+        storage_classes (dict): Storage class -> {'min_c', 'max_c',
+            'allowable_hours'}
+
+    Returns:
+        DataFrame: One row per LPN and lot in inventory with out-of-range
+            exposure: the inventory columns plus exposure_hours, excursions,
+            min/max_temperature_c, excursion_ids, the ffu_status of the
+            latest excursion and the class limits
+    """
+    limits = pd.DataFrame.from_dict(storage_classes, orient='index')
+    parsed = parse_excursion_details(excursions['excursion_details'])
+    events = excursions[['excursion_id', 'excursion_type', 'batch_lot', 'lpn', 'reported_at', 'ffu_status']].assign(
+        temperature_c=parsed['temperature_c'], hours=parsed['hours']
+    ).merge(inventory[['lpn', 'batch_lot', 'storage_class']].drop_duplicates(), on=['lpn', 'batch_lot'])
+
+    # Classes without limits compare as NaN and drop out
+    low = events['storage_class'].map(limits['min_c'])
+    high = events['storage_class'].map(limits['max_c'])
+    outside = (events['temperature_c'] < low) | (events['temperature_c'] > high)
+    keys = ['lpn', 'batch_lot', 'storage_class']
+    events = events[outside & events['hours'].notna()].sort_values(keys + ['reported_at'], na_position='first')
+
+    # dropna=False keeps stock without an LPN; merges match null keys too
+    grouped = events.groupby(keys, sort=False, dropna=False)
+    exposure = grouped.agg(
+        exposure_hours=('hours', 'sum'),
+        excursions=('excursion_id', 'size'),
+        min_temperature_c=('temperature_c', 'min'),
+        max_temperature_c=('temperature_c', 'max'),
+        excursion_ids=('excursion_id', list),
+    ).reset_index()
+    # Status after the latest excursion, even when it is null
+    latest = grouped.tail(1)[keys + ['ffu_status']]
+    exposure = exposure.merge(latest, on=keys)
+
+    return inventory.merge(exposure, on=keys).merge(limits, left_on='storage_class', right_index=True)
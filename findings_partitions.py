@@ -0,0 +1,167 @@
+"""
+Monthly partitions and retention for a partitioned watchdog_findings table.
+
+When watchdog_findings is range-partitioned by run_timestamp (see
+create_watchdog_table.py --partitioned), ensure_partitions keeps partitions
+created ahead of time and apply_retention detaches partitions older than the
+retention window, then exports and/or drops them. Both functions do nothing
+on an unpartitioned table.
+"""
+import gzip
+import os
+from datetime import date
+from sqlalchemy import text
+
+
+FINDINGS_TABLE_NAME = 'watchdog_findings'
+
+
+def month_start(day):
+    """First day of the month containing day."""
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    """First day of the month count months after month (may be negative)."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Name of the partition holding the given month."""
+    return f"{FINDINGS_TABLE_NAME}_{month:%Y_%m}"
+
+
+def is_partitioned(conn):
+    """Check whether watchdog_findings exists as a partitioned table."""
+    return bool(conn.execute(text("""
+        SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)
+    """), {'table': FINDINGS_TABLE_NAME}).scalar())
+
+
+def list_partitions(conn):
+    """
+    List the partitions of watchdog_findings.
+
+    Returns:
+        list: (partition name, first month) tuples, oldest first
+    """
+    rows = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+        ORDER BY c.relname
+    """), {'table': FINDINGS_TABLE_NAME}).scalars().all()
+
+    partitions = []
+    prefix = FINDINGS_TABLE_NAME + '_'
+    for name in rows:
+        try:
+            year, month = name[len(prefix):].split('_')
+            partitions.append((name, date(int(year), int(month), 1)))
+        except ValueError:
+            continue
+    return partitions
+
+
+def create_partition(conn, month):
+    """Create the partition for one month if it does not exist."""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(month)}
+        PARTITION OF {FINDINGS_TABLE_NAME}
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')
+    """))
+
+
+def ensure_partitions(engine, months_ahead=3, start=None):
+    """
+    Create monthly partitions from start through months_ahead months ahead.
+
+    Args:
+        engine: SQLAlchemy engine
+        months_ahead (int): Future months to create beyond the current one
+        start (date): First month to create; defaults to the current month
+
+    Returns:
+        list: Names of the partitions created
+    """
+    current = month_start(date.today())
+    first = month_start(start) if start else current
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+
+        existing = {name for name, _ in list_partitions(conn)}
+        created = []
+        month = first
+        while month <= add_months(current, months_ahead):
+            if partition_name(month) not in existing:
+                create_partition(conn, month)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+
+    return created
+
+
+def export_partition(conn, name, archive_dir):
+    """
+    Write a partition to a gzipped CSV file with COPY TO STDOUT.
+
+    Returns:
+        str: Path of the archive file
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    with gzip.open(path, 'wt', newline='') as archive:
+        conn.connection.cursor().copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+    return path
+
+
+def apply_retention(engine, keep_months=12, action='export', archive_dir=None):
+    """
+    Detach partitions entirely older than the retention window.
+
+    A partition still holding OPEN stateful findings is kept, so the open
+    state is never lost; it is retried on the next run.
+
+    Args:
+        engine: SQLAlchemy engine
+        keep_months (int): Months kept, including the current one
+        action (str): 'export' (archive to archive_dir, then drop), 'drop',
+            or 'detach' (keep the detached table for manual archival)
+        archive_dir (str): Directory for exported partitions
+
+    Returns:
+        dict: Partition name -> 'exported', 'dropped', 'detached' or
+            'kept (open findings)'
+    """
+    cutoff = add_months(month_start(date.today()), -(keep_months - 1))
+    status = {}
+
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return status
+        expired = [name for name, month in list_partitions(conn) if month < cutoff]
+
+    for name in expired:
+        with engine.begin() as conn:
+            has_open = conn.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM {name} WHERE status = 'OPEN')"
+            )).scalar()
+            if has_open:
+                status[name] = 'kept (open findings)'
+                continue
+
+            conn.execute(text(f"ALTER TABLE {FINDINGS_TABLE_NAME} DETACH PARTITION {name}"))
+            if action == 'detach':
+                status[name] = 'detached'
+                continue
+
+            if action == 'export':
+                export_partition(conn, name, archive_dir)
+            conn.execute(text(f"DROP TABLE {name}"))
+            status[name] = 'exported' if action == 'export' else 'dropped'
+
+    return status
@@ -0,0 +1,257 @@
+"""
+Batch genealogy index: which lots were made from which.
+
+Edges come from two sources:
+
+1. batch_geneology records the batches used by a manufacturing order; the
+   order's finished batch (manufacturing_orders.fing_batch) is their child.
+2. batch_master "Parent Batch of Package Order" names the package order a
+   lot was filled from; the finished batch of that order (or the value
+   itself, when it is a lot number) is the lot's parent.
+
+The graph is stored as array-backed adjacency lists (CSR: an offsets array
+and a flat array of lot codes) with the transitive closure precomputed in
+both directions, so every descendant or ancestor of a lot is one array slice
+instead of a recursive query per alert. The closure is built breadth-first
+for all lots at once and tolerates cycles in the data.
+
+Usage:
+    python genealogy.py LOT-45953393
+    python genealogy.py LOT-45953393 LOT-39555641 --upstream
+"""
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+
+# Parent -> child lot edges
+GENEALOGY_EDGES_QUERY = """
+WITH edges AS (
+    SELECT g."Batch number" as parent_lot, mo.fing_batch as child_lot
+    FROM batch_geneology g
+    JOIN manufacturing_orders mo ON mo.order_id = g."Order Number"
+
+    UNION
+
+    SELECT COALESCE(mo.fing_batch, bm."Parent Batch of Package Order") as parent_lot,
+           bm."Batch number" as child_lot
+    FROM batch_master bm
+    LEFT JOIN manufacturing_orders mo ON mo.package_form = bm."Parent Batch of Package Order"
+)
+SELECT parent_lot, child_lot
+FROM edges
+WHERE parent_lot <> child_lot
+  AND (parent_lot IN (SELECT "Batch number" FROM batch_master)
+       OR parent_lot IN (SELECT "Batch number" FROM batch_geneology))
+ORDER BY parent_lot, child_lot
+"""
+
+
+def build_csr(sources, targets, n):
+    """
+    Adjacency lists of a graph with nodes 0..n-1.
+
+    Args:
+        sources (ndarray): Edge start codes
+        targets (ndarray): Edge end codes
+        n (int): Number of nodes
+
+    Returns:
+        tuple: (offsets, targets) where the neighbours of node i are
+            targets[offsets[i]:offsets[i + 1]], sorted
+    """
+    order = np.lexsort((targets, sources))
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    return offsets, targets[order].astype(np.int32)
+
+
+def neighbours(offsets, targets, nodes):
+    """
+    Neighbours of many nodes at once.
+
+    Returns:
+        tuple: (position in nodes of each neighbour's node, neighbour codes)
+    """
+    degree = offsets[nodes + 1] - offsets[nodes]
+    owner = np.repeat(np.arange(len(nodes)), degree)
+    first = np.repeat(offsets[nodes] - (np.cumsum(degree) - degree), degree)
+    return owner, targets[first + np.arange(degree.sum())]
+
+
+def transitive_closure(offsets, targets, n):
+    """
+    Every node reachable from each node, as adjacency lists.
+
+    All start nodes are expanded together, one level per iteration, with
+    visited (start, node) pairs encoded as start * n + node.
+
+    Returns:
+        tuple: (offsets, targets) of the closure, without the start node itself
+    """
+    start = np.arange(n, dtype=np.int64)
+    frontier_start, frontier = start, start
+    visited = np.empty(0, dtype=np.int64)
+
+    while len(frontier):
+        owner, reached = neighbours(offsets, targets, frontier)
+        pairs = np.unique(frontier_start[owner] * n + reached)
+        pairs = pairs[~np.isin(pairs, visited, assume_unique=True)]
+        visited = np.union1d(visited, pairs)
+        frontier_start, frontier = pairs // n, pairs % n
+
+    sources, reached = visited // n, visited % n
+    keep = sources != reached
+    return build_csr(sources[keep], reached[keep], n)
+
+
+class GenealogyIndex:
+    """Descendants and ancestors of every lot, precomputed."""
+
+    def __init__(self, edges):
+        """
+        Args:
+            edges (DataFrame): parent_lot and child_lot per edge
+        """
+        edges = edges.dropna(subset=['parent_lot', 'child_lot'])
+        codes, self.lots = pd.factorize(
+            pd.concat([edges['parent_lot'], edges['child_lot']], ignore_index=True).astype(str)
+        )
+        self.lots = np.asarray(self.lots, dtype=object)
+        self.codes = {lot: code for code, lot in enumerate(self.lots)}
+        parents, children = codes[:len(edges)], codes[len(edges):]
+        n = len(self.lots)
+
+        self.children = build_csr(parents, children, n)
+        self.parents = build_csr(children, parents, n)
+        self.descendant_lists = transitive_closure(*self.children, n)
+        self.ancestor_lists = transitive_closure(*self.parents, n)
+        self.edge_count = len(edges)
+
+    def _lookup(self, lists, lot):
+        code = self.codes.get(lot)
+        if code is None:
+            return self.lots[:0]
+        offsets, targets = lists
+        return self.lots[targets[offsets[code]:offsets[code + 1]]]
+
+    def descendants(self, lot):
+        """Every lot made, directly or indirectly, from the lot (array of lot numbers)."""
+        return self._lookup(self.descendant_lists, lot)
+
+    def ancestors(self, lot):
+        """Every lot the lot was made from, directly or indirectly."""
+        return self._lookup(self.ancestor_lists, lot)
+
+    def impact(self, lots, lot_locations, limit=None):
+        """
+        Upstream lots and downstream lots with their locations, per lot.
+
+        Lots that are both upstream and downstream of a lot (a cycle in the
+        genealogy data) are listed under 'cycle_lots'.
+
+        Args:
+            lots (iterable): Lot numbers
+            lot_locations (DataFrame): batch_lot and location rows (the
+                lot_locations dataset)
+            limit (int): Lots and locations kept per list, downstream lots
+                with stock first; None keeps them all. The counts are always
+                complete.
+
+        Returns:
+            list: {'upstream_count', 'affected_count', 'upstream_lots': [...],
+                'affected_lots': [{'batch_lot', 'location_count',
+                'locations'}], 'cycle_lots': [...]} per lot, in order
+        """
+        locations = {}
+        if len(lot_locations):
+            located = lot_locations[lot_locations['batch_lot'].isin(self.lots)]
+            locations = located.groupby('batch_lot', observed=True)['location'].agg(
+                lambda values: sorted(values.dropna().unique().tolist())
+            ).to_dict()
+
+        impacts = []
+        for lot in lots:
+            upstream, downstream = self.ancestors(lot), self.descendants(lot)
+            affected = [
+                {'batch_lot': child, 'location_count': len(locations.get(child, [])),
+                 'locations': locations.get(child, [])[:limit]}
+                for child in downstream
+            ]
+            if limit is not None:
+                # Stable sort: lots with stock first, otherwise in lot order
+                affected = sorted(affected, key=lambda child: not child['location_count'])[:limit]
+            impacts.append({
+                'upstream_count': len(upstream),
+                'affected_count': len(downstream),
+                'upstream_lots': upstream[:limit].tolist(),
+                'affected_lots': affected,
+                'cycle_lots': np.intersect1d(upstream, downstream).tolist()[:limit],
+            })
+        return impacts
+
+    def summary(self):
+        """Lot, edge and closure sizes."""
+        return {
+            'lots': len(self.lots),
+            'edges': self.edge_count,
+            'descendant_pairs': len(self.descendant_lists[1]),
+            'max_descendants': int(np.diff(self.descendant_lists[0]).max()) if len(self.lots) else 0,
+        }
+
+
+# The last index built, keyed by a hash of its edges
+_index = None
+_index_key = None
+_index_lock = threading.Lock()
+
+
+def genealogy_index(edges):
+    """
+    The genealogy index of an edge list, rebuilt only when the edges change.
+
+    Repeated watchdog runs in one process share the index until the genealogy
+    tables are reloaded with different links.
+
+    Args:
+        edges (DataFrame): Rows of GENEALOGY_EDGES_QUERY
+
+    Returns:
+        GenealogyIndex: Index of the edges
+    """
+    global _index, _index_key
+    key = (len(edges), int(pd.util.hash_pandas_object(edges, index=False).sum()))
+    with _index_lock:
+        if _index is None or _index_key != key:
+            _index, _index_key = GenealogyIndex(edges), key
+        return _index
+
+
+if __name__ == "__main__":
+    import time
+    from config import Config
+    from watchdog_core import SupplyWatchdog
+    from watchdog_detectors import DATASETS
+    from data_sources import DatabaseSource
+
+    parser = argparse.ArgumentParser(description="Show the genealogy of lots")
+    parser.add_argument('lots', nargs='+', help="Lot numbers")
+    parser.add_argument('--upstream', action='store_true', help="Also list the lots each lot was made from")
+    args = parser.parse_args()
+
+    source = DatabaseSource(SupplyWatchdog().engine)
+    start = time.perf_counter()
+    index = genealogy_index(source.fetch(DATASETS['genealogy_edges']))
+    print(f"✓ Indexed {index.summary()} in {time.perf_counter() - start:.3f}s")
+
+    for lot, impact in zip(args.lots, index.impact(args.lots, source.fetch(DATASETS['lot_locations']))):
+        print(f"\n{lot}: {impact['affected_count']} downstream lots")
+        for child in impact['affected_lots']:
+            print(f"  -> {child['batch_lot']}  {', '.join(child['locations']) or '(no inventory)'}")
+        if impact['cycle_lots']:
+            print(f"  ✗ both upstream and downstream (cycle): {', '.join(impact['cycle_lots'])}")
+        if args.upstream:
+            print(f"  made from: {', '.join(impact['upstream_lots']) or '(none)'}")
+
+    Config.dispose_engines()
@@ -1,18 +1,46 @@
 """
 Main script to load clinical supply chain data into PostgreSQL.
 """
+import argparse
 import sys
+from config import Config
 from db_loader import DatabaseLoader
 
 
-def main():
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Load clinical supply chain CSVs into PostgreSQL")
+    parser.add_argument(
+        '--method',
+        choices=['insert', 'copy'],
+        default=Config.LOAD_METHOD,
+        help="'insert' loads through pandas to_sql, 'copy' streams each file with COPY FROM STDIN"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=Config.LOAD_WORKERS,
+        help="Number of tables loaded concurrently"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="Skip files unchanged since the last load and append only new rows to append-style reports"
+    )
+    parser.add_argument('--data-dir', default=None, help="Directory containing CSV files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main function to execute data loading."""
+    args = parse_args(argv)
+
     print("=" * 60)
     print("Clinical Supply Chain Data Loader")
     print("=" * 60)
 
     # Initialize loader
-    loader = DatabaseLoader()
+    loader = DatabaseLoader(workers=args.workers)
 
     # Connect to database
     if not loader.connect():
@@ -20,11 +48,17 @@ def main():
         sys.exit(1)
 
     # Load all CSV files
-    results = loader.load_all_csvs()
+    results = loader.load_all_csvs(
+        data_dir=args.data_dir,
+        method=args.method,
+        workers=args.workers,
+        incremental=args.incremental
+    )
 
     if results is None:
         print("\n✗ Data loading failed")
         loader.close()
+        Config.dispose_engines()
         sys.exit(1)
 
     # Verify loaded tables
@@ -32,6 +66,7 @@ def main():
 
     # Close connection
     loader.close()
+    Config.dispose_engines()
 
     print("\n✓ Data loading complete!")
 
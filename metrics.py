@@ -0,0 +1,289 @@
+"""
+Run metrics for the watchdog and the loader.
+
+A RunMetrics object collects, for one run, the wall time of each stage,
+labelled values such as rows fetched per dataset or alerts per detector, the
+number of database round trips and the peak memory of the process. At the end
+of the run publish() records it as a row of the watchdog_runs table and
+writes it to a metrics file in Prometheus text format (for a node exporter
+textfile collector) or as JSON.
+
+Round trips are counted per run: the statement listener on the (shared)
+engine only counts statements issued from the context of the run that is
+tracking it, so concurrent loads, scheduler jobs or other runs in the same
+process are not counted. Work handed to a thread pool keeps the run's
+context when it is submitted with submit_in_context().
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+import json
+import os
+import sys
+import threading
+import time
+from sqlalchemy import event, text
+from config import Config
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+CREATE_RUNS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS watchdog_runs (
+        id SERIAL PRIMARY KEY,
+        run_id VARCHAR(100),
+        run_type VARCHAR(20) NOT NULL,
+        status VARCHAR(20),
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        duration_seconds DOUBLE PRECISION,
+        round_trips INT,
+        peak_memory_mb DOUBLE PRECISION,
+        alerts INT,
+        rows_fetched BIGINT,
+        metrics JSONB
+    );
+    CREATE INDEX IF NOT EXISTS idx_watchdog_runs_started ON watchdog_runs(run_type, started_at);
+"""
+
+INSERT_RUN_SQL = text("""
+    INSERT INTO watchdog_runs (
+        run_id, run_type, status, started_at, finished_at, duration_seconds,
+        round_trips, peak_memory_mb, alerts, rows_fetched, metrics
+    ) VALUES (
+        :run_id, :run_type, :status, :started_at, :finished_at, :duration_seconds,
+        :round_trips, :peak_memory_mb, :alerts, :rows_fetched, :metrics
+    )
+""")
+
+# Run values exported as metrics, with their help text
+RUN_VALUES = {
+    'duration_seconds': "Wall time of the run",
+    'round_trips': "SQL statements and COPY streams sent to the database",
+    'peak_memory_mb': "Peak resident memory of the process",
+    'alerts': "Alerts produced by the run",
+    'rows_fetched': "Rows read by the detector queries",
+    'rows_loaded': "Rows loaded from CSV files",
+    'failed_shards': "Shards of a sharded run that failed after their retries",
+    'failed_detectors': "Detectors that failed, counted per shard in sharded runs",
+}
+
+
+# RunMetrics counting the statements issued from the current context
+_current_run = ContextVar('current_run', default=None)
+
+
+def submit_in_context(executor, fn, *args):
+    """
+    Submit fn to an executor in a copy of the caller's context.
+
+    Statements it executes count towards the caller's run, as they would
+    when called directly.
+
+    Returns:
+        Future: The submitted task
+    """
+    return executor.submit(copy_context().run, fn, *args)
+
+
+def peak_memory_mb():
+    """
+    Peak resident set size of this process so far, in MB.
+
+    Returns:
+        float: Peak memory, or None where the platform does not report it
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunMetrics:
+    """Timings and counters of one watchdog or loader run."""
+
+    def __init__(self, run_type, run_id=None):
+        """
+        Args:
+            run_type (str): Kind of run, e.g. 'watchdog' or 'load'
+            run_id (str): Identifier of the run, if known
+        """
+        self.run_type = run_type
+        self.run_id = run_id
+        self.status = 'running'
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.values = {'round_trips': 0}
+        # Labelled values by group, e.g. groups['dataset_rows']['inventory']
+        self.groups = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._context_token = None
+
+    def track_engine(self, engine):
+        """
+        Count the statements this run executes on engine until finish().
+
+        The run becomes the current run of the calling context; statements
+        from other threads count only when their work was submitted with
+        submit_in_context().
+        """
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            if _current_run.get() is self:
+                self.add_round_trips(1)
+
+        if self._context_token is None:
+            self._context_token = _current_run.set(self)
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        self._listeners.append((engine, count_statement))
+
+    def add_round_trips(self, count):
+        """Count round trips made outside SQLAlchemy, e.g. COPY on the raw cursor."""
+        with self._lock:
+            self.values['round_trips'] += count
+
+    def record(self, group, name, value):
+        """
+        Record a labelled value.
+
+        The group is named '<label>_<unit>' (e.g. 'dataset_rows'); its
+        prefix becomes the label name in the Prometheus export.
+        """
+        with self._lock:
+            self.groups.setdefault(group, {})[name] = value
+
+    def set(self, name, value):
+        """Record a run-level value such as 'alerts'."""
+        with self._lock:
+            self.values[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        """Record the wall seconds of the enclosed block under stage_seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record('stage_seconds', name, round(time.perf_counter() - start, 3))
+
+    def finish(self, status='success'):
+        """Stop counting round trips and fill in the duration and peak memory."""
+        for engine, listener in self._listeners:
+            event.remove(engine, 'before_cursor_execute', listener)
+        self._listeners = []
+        if self._context_token is not None:
+            try:
+                _current_run.reset(self._context_token)
+            except ValueError:  # Finished from another context
+                pass
+            self._context_token = None
+        self.status = status
+        self.finished_at = datetime.now()
+        self.set('duration_seconds', round(time.perf_counter() - self._start, 3))
+        self.set('peak_memory_mb', peak_memory_mb())
+
+    def as_dict(self):
+        """Metrics as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                'run_id': self.run_id,
+                'run_type': self.run_type,
+                'status': self.status,
+                'started_at': self.started_at.isoformat(),
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                **self.values,
+                **{group: dict(values) for group, values in self.groups.items()},
+            }
+
+    def prometheus_text(self):
+        """
+        Metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: One gauge per run value and per labelled group
+        """
+        base = {'run_type': self.run_type}
+        lines = []
+
+        def gauge(metric, help_text, samples):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in samples:
+                rendered = ','.join(f'{key}="{str(val)}"' for key, val in {**base, **labels}.items())
+                lines.append(f"{metric}{{{rendered}}} {value}")
+
+        for name, help_text in RUN_VALUES.items():
+            if self.values.get(name) is not None:
+                gauge(f"watchdog_run_{name}", help_text, [({}, self.values[name])])
+        gauge("watchdog_run_success", "1 if the last run succeeded", [({}, int(self.status == 'success'))])
+        gauge("watchdog_run_finished_timestamp_seconds", "Unix time the last run finished",
+              [({}, round((self.finished_at or datetime.now()).timestamp(), 3))])
+
+        for group, values in self.groups.items():
+            label = group.split('_', 1)[0]
+            gauge(f"watchdog_{group}", f"{group.replace('_', ' ')} of the last run",
+                  [({label: name}, value) for name, value in values.items()])
+
+        return '\n'.join(lines) + '\n'
+
+    def save(self, engine):
+        """Insert the run into the watchdog_runs table, creating it if needed."""
+        with engine.begin() as conn:
+            conn.execute(text(CREATE_RUNS_TABLE_SQL))
+            conn.execute(INSERT_RUN_SQL, {
+                'run_id': self.run_id,
+                'run_type': self.run_type,
+                'status': self.status,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'duration_seconds': self.values.get('duration_seconds'),
+                'round_trips': self.values.get('round_trips'),
+                'peak_memory_mb': self.values.get('peak_memory_mb'),
+                'alerts': self.values.get('alerts'),
+                'rows_fetched': self.values.get('rows_fetched'),
+                'metrics': json.dumps(self.as_dict()),
+            })
+
+    def write(self, path, metrics_format='prometheus'):
+        """
+        Write the metrics file, replacing it atomically.
+
+        Args:
+            path (str): File to write
+            metrics_format (str): 'prometheus' or 'json'
+        """
+        content = self.prometheus_text() if metrics_format == 'prometheus' else json.dumps(self.as_dict(), indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def publish(self, engine):
+        """
+        Record the finished run as configured, without failing the run.
+
+        Saves to watchdog_runs when Config.RECORD_RUN_METRICS is set and
+        writes <run_type>_metrics.prom (or .json) to Config.METRICS_DIR
+        unless Config.METRICS_FORMAT is 'none'.
+        """
+        if Config.RECORD_RUN_METRICS:
+            try:
+                self.save(engine)
+                print("✓ Run metrics saved to watchdog_runs")
+            except Exception as e:
+                print(f"✗ Error saving run metrics: {e}")
+
+        if Config.METRICS_FORMAT != 'none':
+            extension = 'prom' if Config.METRICS_FORMAT == 'prometheus' else 'json'
+            path = os.path.join(Config.METRICS_DIR, f"{self.run_type}_metrics.{extension}")
+            try:
+                os.makedirs(Config.METRICS_DIR, exist_ok=True)
+                self.write(path, Config.METRICS_FORMAT)
+                print(f"✓ Run metrics written to: {path}")
+            except Exception as e:
+                print(f"✗ Error writing run metrics: {e}")
@@ -0,0 +1,277 @@
+"""
+Query plan capture and slow-query reporting for the watchdog datasets.
+
+Runs EXPLAIN (ANALYZE, BUFFERS) on the query of every dataset the selected
+detectors read, flags sequential scans over large tables, queries over the
+latency budget and join methods that changed since the previously stored
+plan (e.g. the lot_number join turning into a nested loop after a reload),
+and stores the plans per run in watchdog_query_plans.
+
+EXPLAIN ANALYZE executes each query once more, so this is opt-in: run it from
+the command line, or set QUERY_DIAGNOSTICS=true to capture plans on every
+watchdog run.
+
+Usage:
+    python query_diagnostics.py
+    python query_diagnostics.py --budget-ms 200 --show-plans
+"""
+import argparse
+from datetime import datetime
+import json
+import sys
+from sqlalchemy import text
+from config import Config
+from watchdog_detectors import DATASETS
+
+
+CREATE_PLANS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS watchdog_query_plans (
+        id SERIAL PRIMARY KEY,
+        run_id VARCHAR(100),
+        captured_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        dataset VARCHAR(100) NOT NULL,
+        query TEXT,
+        execution_ms DOUBLE PRECISION,
+        planning_ms DOUBLE PRECISION,
+        shared_hit_blocks BIGINT,
+        shared_read_blocks BIGINT,
+        join_methods TEXT,
+        flags JSONB,
+        plan JSONB
+    );
+    CREATE INDEX IF NOT EXISTS idx_query_plans_dataset ON watchdog_query_plans(dataset, captured_at);
+"""
+
+INSERT_PLAN_SQL = text("""
+    INSERT INTO watchdog_query_plans (
+        run_id, captured_at, dataset, query, execution_ms, planning_ms,
+        shared_hit_blocks, shared_read_blocks, join_methods, flags, plan
+    ) VALUES (
+        :run_id, :captured_at, :dataset, :query, :execution_ms, :planning_ms,
+        :shared_hit_blocks, :shared_read_blocks, :join_methods, :flags, :plan
+    )
+""")
+
+PREVIOUS_JOIN_METHODS_SQL = text("""
+    SELECT DISTINCT ON (dataset) dataset, join_methods
+    FROM watchdog_query_plans
+    WHERE dataset = ANY(:datasets)
+    ORDER BY dataset, captured_at DESC, id DESC
+""")
+
+JOIN_NODES = ('Nested Loop', 'Hash Join', 'Merge Join')
+
+
+def plan_nodes(node):
+    """Yield a plan node and all nodes below it, depth first."""
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def rows_scanned(node):
+    """Rows a scan node read: returned plus filtered out, over all loops."""
+    loops = node.get('Actual Loops', 1) or 1
+    return int((node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * loops)
+
+
+def join_methods(plan):
+    """
+    Describe the joins of a plan in depth-first order.
+
+    Returns:
+        str: e.g. 'Hash Join(complete_warehouse_inventory)', comma separated
+    """
+    methods = []
+    for node in plan_nodes(plan):
+        if node['Node Type'] in JOIN_NODES:
+            relations = sorted({
+                child['Relation Name'] for child in plan_nodes(node)
+                if 'Relation Name' in child and child is not node
+            })
+            methods.append(f"{node['Node Type']}({'+'.join(relations)})")
+    return ', '.join(methods)
+
+
+def analyze_plan(explained, budget_ms, seq_scan_rows, previous_join_methods=None):
+    """
+    Summarize one EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) result.
+
+    Args:
+        explained (dict): First element of the EXPLAIN JSON output
+        budget_ms (float): Latency budget of the query
+        seq_scan_rows (int): Sequential scans reading at least this many
+            rows are flagged
+        previous_join_methods (str): join_methods of the last stored plan
+
+    Returns:
+        dict: execution_ms, planning_ms, buffer counts, join_methods and
+            flags (list of messages)
+    """
+    plan = explained['Plan']
+    execution_ms = explained.get('Execution Time', 0.0)
+    flags = []
+
+    for node in plan_nodes(plan):
+        if node['Node Type'] == 'Seq Scan' and rows_scanned(node) >= seq_scan_rows:
+            flags.append(f"seq scan on {node['Relation Name']} ({rows_scanned(node):,} rows)")
+
+    if execution_ms > budget_ms:
+        flags.append(f"over budget: {execution_ms:.1f} ms > {budget_ms:g} ms")
+
+    methods = join_methods(plan)
+    if previous_join_methods is not None and methods != previous_join_methods:
+        flags.append(f"join methods changed: {previous_join_methods or 'none'} -> {methods or 'none'}")
+
+    return {
+        'execution_ms': round(execution_ms, 3),
+        'planning_ms': round(explained.get('Planning Time', 0.0), 3),
+        'shared_hit_blocks': plan.get('Shared Hit Blocks', 0),
+        'shared_read_blocks': plan.get('Shared Read Blocks', 0),
+        'join_methods': methods,
+        'flags': flags,
+    }
+
+
+def capture_plans(engine, names, usable_views, run_id=None, budget_ms=None, seq_scan_rows=None, store=True):
+    """
+    EXPLAIN ANALYZE the queries of the named datasets.
+
+    Each query runs in a transaction that is rolled back. Join methods are
+    compared with the last plan stored for the same dataset.
+
+    Args:
+        engine: SQLAlchemy engine
+        names (list): Dataset names
+        usable_views (set): Watchdog views that replace the raw queries,
+            as in a watchdog run
+        run_id (str): Run the plans belong to
+        budget_ms (float): Latency budget. Uses Config.QUERY_LATENCY_BUDGET_MS if None.
+        seq_scan_rows (int): Seq scan flag threshold. Uses
+            Config.SEQ_SCAN_ROW_THRESHOLD if None.
+        store (bool): Save the plans to watchdog_query_plans
+
+    Returns:
+        dict: Dataset name -> analyze_plan() summary plus 'plan' (or
+            'error' when the query could not be explained)
+    """
+    budget_ms = Config.QUERY_LATENCY_BUDGET_MS if budget_ms is None else budget_ms
+    seq_scan_rows = Config.SEQ_SCAN_ROW_THRESHOLD if seq_scan_rows is None else seq_scan_rows
+    captured_at = datetime.now()
+
+    previous = {}
+    if store:
+        with engine.begin() as conn:
+            conn.execute(text(CREATE_PLANS_TABLE_SQL))
+            previous = dict(conn.execute(PREVIOUS_JOIN_METHODS_SQL, {'datasets': list(names)}).all())
+
+    results = {}
+    for name in names:
+        query = DATASETS[name].build_query(usable_views)
+        try:
+            with engine.connect() as conn:
+                explained = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}").scalar()
+                conn.rollback()
+            if isinstance(explained, str):
+                explained = json.loads(explained)
+            explained = explained[0]
+        except Exception as e:
+            results[name] = {'error': str(e), 'flags': [f"explain failed: {e}"]}
+            continue
+
+        results[name] = analyze_plan(explained, budget_ms, seq_scan_rows, previous.get(name))
+        results[name]['plan'] = explained
+        results[name]['query'] = query
+
+    if store:
+        rows = [
+            {
+                'run_id': run_id,
+                'captured_at': captured_at,
+                'dataset': name,
+                'query': result['query'],
+                'execution_ms': result['execution_ms'],
+                'planning_ms': result['planning_ms'],
+                'shared_hit_blocks': result['shared_hit_blocks'],
+                'shared_read_blocks': result['shared_read_blocks'],
+                'join_methods': result['join_methods'],
+                'flags': json.dumps(result['flags']),
+                'plan': json.dumps(result['plan']),
+            }
+            for name, result in results.items() if 'error' not in result
+        ]
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(INSERT_PLAN_SQL, rows)
+
+    return results
+
+
+def format_plan(node, depth=0):
+    """Render a plan tree as indented text lines with actual times and rows."""
+    label = node['Node Type']
+    if 'Relation Name' in node:
+        label += f" on {node['Relation Name']}"
+    lines = [
+        f"{'  ' * depth}-> {label} "
+        f"(time {node.get('Actual Total Time', 0):.2f} ms, rows {node.get('Actual Rows', 0)}, "
+        f"loops {node.get('Actual Loops', 1)})"
+    ]
+    for child in node.get('Plans', []):
+        lines.extend(format_plan(child, depth + 1))
+    return lines
+
+
+def print_report(results, show_plans=False):
+    """Print timings and flags per dataset."""
+    print("\n" + "=" * 78)
+    print("Query diagnostics")
+    print("=" * 78)
+    print(f"{'dataset':<28}{'exec ms':>10}{'plan ms':>10}{'hit':>10}{'read':>10}")
+
+    flagged = 0
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<28}{'-':>10}{'-':>10}{'-':>10}{'-':>10}")
+        else:
+            print(
+                f"{name:<28}{result['execution_ms']:>10.1f}{result['planning_ms']:>10.1f}"
+                f"{result['shared_hit_blocks']:>10}{result['shared_read_blocks']:>10}"
+            )
+        for flag in result['flags']:
+            print(f"  ✗ {flag}")
+        flagged += bool(result['flags'])
+        if show_plans and 'plan' in result:
+            print('\n'.join('    ' + line for line in format_plan(result['plan']['Plan'])))
+
+    print("-" * 78)
+    if flagged:
+        print(f"✗ {flagged} of {len(results)} queries flagged")
+    else:
+        print(f"✓ No issues in {len(results)} queries")
+
+
+if __name__ == "__main__":
+    from watchdog_core import SupplyWatchdog
+    from watchdog_detectors import get_detectors
+    from watchdog_views import usable_watchdog_views
+
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE the watchdog dataset queries")
+    parser.add_argument('--detectors', nargs='+', default=None, help="Detectors whose datasets are checked")
+    parser.add_argument('--budget-ms', type=float, default=None, help="Latency budget per query")
+    parser.add_argument('--seq-scan-rows', type=int, default=None,
+                        help="Flag sequential scans reading at least this many rows")
+    parser.add_argument('--show-plans', action='store_true', help="Print each plan tree")
+    parser.add_argument('--no-store', action='store_true', help="Do not save the plans")
+    args = parser.parse_args()
+
+    watchdog = SupplyWatchdog(detectors=args.detectors)
+    names = watchdog.required_datasets(get_detectors(watchdog.detectors))
+    results = capture_plans(
+        watchdog.engine, names, usable_watchdog_views(watchdog.engine),
+        run_id=f"QD-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}",
+        budget_ms=args.budget_ms, seq_scan_rows=args.seq_scan_rows, store=not args.no_store
+    )
+    print_report(results, show_plans=args.show_plans)
+    Config.dispose_engines()
+    sys.exit(1 if any(result['flags'] for result in results.values()) else 0)
@@ -0,0 +1,122 @@
+"""
+In-process cache of slowly changing reference datasets.
+
+Datasets registered with source tables (register_dataset(tables=...)) are
+read through this cache by DatabaseSource. An entry is reused while the load
+version of each source table is unchanged: the loaded_at and content_hash
+the loader records in its fingerprint table, which change on every reload or
+append. Entries also expire after a TTL, so tables changed outside the loader
+are picked up, and the least recently used entries are evicted beyond the
+size limit. Cached frames store repetitive text columns as categoricals.
+
+A long-running scheduler therefore reads each reference dataset once per
+load instead of once per run; the check costs one small query.
+"""
+from collections import OrderedDict
+import threading
+import time
+from sqlalchemy import text
+from config import Config
+
+
+def compact_frame(df, max_ratio=0.5):
+    """
+    Store text columns with few distinct values as categoricals.
+
+    Args:
+        df (DataFrame): Frame to compact
+        max_ratio (float): Columns with at most this share of distinct
+            values are converted
+
+    Returns:
+        DataFrame: Compacted copy
+    """
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object and len(values) and values.nunique() <= max_ratio * len(values):
+            df[column] = values.astype('category')
+    return df
+
+
+class ReferenceCache:
+    """LRU/TTL cache of dataset frames keyed by database, query and load versions."""
+
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        """
+        Args:
+            max_entries (int): Entries kept. Uses Config.REFERENCE_CACHE_SIZE if None.
+            ttl_seconds (float): Entry lifetime. Uses Config.REFERENCE_CACHE_TTL if None.
+        """
+        self.max_entries = Config.REFERENCE_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl_seconds = Config.REFERENCE_CACHE_TTL if ttl_seconds is None else ttl_seconds
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    def load_versions(self, engine, tables):
+        """
+        Current load version of each table.
+
+        Returns:
+            tuple: (table, loaded_at, content_hash) per table, or None when
+                the loader's fingerprint table cannot be read
+        """
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(text(f"""
+                    SELECT table_name, loaded_at, content_hash
+                    FROM "{Config.LOAD_METADATA_TABLE}"
+                    WHERE table_name = ANY(:tables)
+                """), {'tables': list(tables)}).all()
+        except Exception:
+            return None
+        found = {row[0]: (row[1], row[2]) for row in rows}
+        return tuple((table, *found.get(table, (None, None))) for table in sorted(tables))
+
+    def get(self, engine, dataset, usable_views, fetch):
+        """
+        Return a dataset frame, from the cache when its load versions match.
+
+        Args:
+            engine: SQLAlchemy engine the dataset is read from
+            dataset: Registered Dataset with source tables
+            usable_views (set): Watchdog views usable for the query
+            fetch (callable): Reads the dataset when it is not cached
+
+        Returns:
+            DataFrame: Dataset rows; shared, so callers must not modify it
+        """
+        key = (engine.url.render_as_string(hide_password=True), dataset.name, dataset.build_query(usable_views))
+        versions = self.load_versions(engine, dataset.tables)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                frame, cached_versions, cached_at = entry
+                if versions is not None and versions == cached_versions and now - cached_at < self.ttl_seconds:
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return frame
+                del self.entries[key]
+            self.stats['misses'] += 1
+
+        frame = compact_frame(fetch())
+
+        with self._lock:
+            self.entries[key] = (frame, versions, now)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return frame
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self.entries.clear()
+
+
+# Process-wide cache used by DatabaseSource
+reference_cache = ReferenceCache()
@@ -0,0 +1,119 @@
+"""
+Scale the synthetic clinical CSVs while preserving their referential links.
+
+Every file is written with its rows repeated `factor` times. Replica 0 is the
+original data; in replica r every identifier (trial aliases, lot numbers,
+material, warehouse, site, order and shipment IDs, warehouse names, ...)
+gets the suffix "-R<r>" in every file, so lots still join to their
+allocations, trials to their sites and warehouses to their inventory within
+each replica, and replicas never collide.
+
+Usage:
+    python scale_synthetic_data.py --factor 100 --output-dir /tmp/scaled_data
+"""
+import argparse
+import os
+import re
+import numpy as np
+import pandas as pd
+from config import Config
+
+
+# Identifier tokens remapped per replica
+ID_PATTERN = re.compile(
+    r"\b(?:"
+    r"CT-\d{4}-[A-Z]{3}"
+    r"|(?:LOT|MAT|WH|SITE|SHP|PKG|BATCH|LOC|PAT|IVRS|EXC)-\d+"
+    r"|(?:LPN|LY|TRK|HUL)\d+"
+    r"|[0-9A-F]{8}-[0-9A-F]{3}"
+    r"|(?:[A-Z][a-z]+ )+Logistics Center"
+    r")\b"
+)
+
+# Placeholder substituted with the replica suffix
+SUFFIX_MARK = '\x00'
+
+
+def id_templates(values):
+    """
+    Mark where the replica suffix goes in each value.
+
+    Args:
+        values (ndarray): Unique string values of a column
+
+    Returns:
+        ndarray: Values with SUFFIX_MARK after each identifier, or None if
+            the column holds no identifiers
+    """
+    templates = np.array([ID_PATTERN.sub(lambda m: m.group(0) + SUFFIX_MARK, v) for v in values], dtype=object)
+    if not any(SUFFIX_MARK in t for t in templates):
+        return None
+    return templates
+
+
+def scale_csv(source_path, target_path, factor):
+    """
+    Write one CSV with its rows replicated and identifiers remapped.
+
+    Identifiers are found once per distinct column value; each replica then
+    only substitutes the suffix into those templates and gathers them by
+    the factorized codes.
+
+    Args:
+        source_path (str): CSV to scale
+        target_path (str): Path of the scaled CSV
+        factor (int): Number of replicas
+
+    Returns:
+        int: Data rows written
+    """
+    df = pd.read_csv(source_path, dtype=str, keep_default_na=False)
+
+    remapped = {}
+    for name in df.columns:
+        codes, uniques = pd.factorize(df[name])
+        templates = id_templates(np.asarray(uniques, dtype=object))
+        if templates is not None:
+            remapped[name] = (codes, pd.Series(templates))
+
+    with open(target_path, 'w', newline='') as target:
+        df.to_csv(target, index=False)
+        for replica in range(1, factor):
+            suffix = f"-R{replica}"
+            copy = df.copy()
+            for name, (codes, templates) in remapped.items():
+                values = templates.str.replace(SUFFIX_MARK, suffix, regex=False).to_numpy()
+                copy[name] = values[codes]
+            copy.to_csv(target, index=False, header=False)
+
+    return len(df) * factor
+
+
+def scale_dataset(data_dir, output_dir, factor):
+    """
+    Scale every CSV in data_dir into output_dir.
+
+    Args:
+        data_dir (str): Directory with the source CSV files
+        output_dir (str): Directory for the scaled files (created if needed)
+        factor (int): Number of replicas
+
+    Returns:
+        dict: File name -> data rows written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rows = {}
+    for filename in sorted(f for f in os.listdir(data_dir) if f.endswith('.csv')):
+        rows[filename] = scale_csv(os.path.join(data_dir, filename), os.path.join(output_dir, filename), factor)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scale the synthetic clinical CSVs")
+    parser.add_argument('--factor', type=int, required=True, help="Replication factor (e.g. 10, 100, 1000)")
+    parser.add_argument('--output-dir', required=True, help="Directory for the scaled CSV files")
+    parser.add_argument('--data-dir', default=Config.DATA_DIR, help="Directory containing the source CSV files")
+    args = parser.parse_args()
+
+    written = scale_dataset(args.data_dir, args.output_dir, args.factor)
+    print(f"✓ Wrote {len(written)} files, {sum(written.values())} rows (x{args.factor}) to {args.output_dir}")
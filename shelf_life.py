@@ -0,0 +1,224 @@
+"""
+Shelf-life extension feasibility for expiring lots.
+
+For every lot the expiry detector flags, three constraints are checked in one
+vectorized pass over all lots:
+
+1. Technical: has the lot been re-evaluated (re-evaluation)?
+2. Regulatory: is there an approved submission for the trial (rim), or is
+   the material registered for the lot's country
+   (material_country_requirements)?
+3. Logistical: is there time to ship before expiry? Shipping times come from
+   the free-text ip_shipping_timelines_report ("6 days door-to-door"), parsed
+   and indexed by warehouse and country once per run.
+
+Each check gives a yes/no with a reason citing the records found, and the
+lot is feasible when all three pass.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Re-evaluation requests, one row per request
+REEVALUATIONS_QUERY = """
+SELECT
+    "ID" as reevaluation_id,
+    "Request Type (Molecule Planner to Complete)" as request_type,
+    "Sample Status (NDP Material Coordinator to Complete)" as sample_status,
+    "Item Code (Molecule Planner to Complete)" as material_number,
+    "Lot Number (Molecule Planner to Complete)" as batch_lot,
+    "Target Date for Results (Molecule Planner to Complete)" as target_date
+FROM re_evaluation
+"""
+
+# Regulatory submissions per trial
+RIM_SUBMISSIONS_QUERY = """
+SELECT
+    clinical_study_v as trial_alias,
+    name_v as submission,
+    type_v as submission_type,
+    health_authority_division_c as authority,
+    status_v as status,
+    approved_date_c as approved_date
+FROM rim
+"""
+
+# Countries each trial material is registered for
+MATERIAL_COUNTRIES_QUERY = """
+SELECT DISTINCT
+    "Trial Alias" as trial_alias,
+    "Material Number" as material_number,
+    "Countries" as country
+FROM material_country_requirements
+"""
+
+# Free-text shipping timelines per shipping location
+SHIPPING_TIMELINES_QUERY = """
+SELECT ip_helper, ip_timeline, country_name as country
+FROM ip_shipping_timelines_report
+"""
+
+# Material and country of each lot at each warehouse
+LOT_LOCATIONS_QUERY = """
+SELECT DISTINCT ON (lot_number, warehouse_name)
+    lot_number as batch_lot,
+    warehouse_name as location,
+    warehouse_country as country,
+    item_number as material_number
+FROM complete_warehouse_inventory
+ORDER BY lot_number, warehouse_name, item_number
+"""
+
+TIMELINE_PATTERN = r'(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>day|week|month)'
+UNIT_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+
+def parse_timeline_days(timelines):
+    """
+    Parse free-text shipping timelines into days.
+
+    Args:
+        timelines (Series): Text such as "6 days door-to-door" or "2 weeks"
+
+    Returns:
+        Series: Days (float), NaN where no duration is found
+    """
+    parts = timelines.astype(str).str.lower().str.extract(TIMELINE_PATTERN)
+    return parts['amount'].astype(float) * parts['unit'].map(UNIT_DAYS)
+
+
+def index_shipping_days(timelines):
+    """
+    Index the longest shipping time by shipping location and by country.
+
+    Args:
+        timelines (DataFrame): Rows of SHIPPING_TIMELINES_QUERY
+
+    Returns:
+        tuple: (Series of days by ip_helper, Series of days by country)
+    """
+    timelines = timelines.assign(days=parse_timeline_days(timelines['ip_timeline'])).dropna(subset=['days'])
+    return (
+        timelines.groupby('ip_helper', observed=True)['days'].max(),
+        timelines.groupby('country', observed=True)['days'].max(),
+    )
+
+
+def technical_check(lots, reevaluations):
+    """Re-evaluation of each lot: the completed (else latest) request is cited."""
+    reevaluations = reevaluations.assign(
+        complete=reevaluations['sample_status'].eq('Complete'),
+        target_date=pd.to_datetime(reevaluations['target_date'], errors='coerce')
+    ).sort_values(['complete', 'target_date'], ascending=False).drop_duplicates('batch_lot')
+    found = lots[['batch_lot']].merge(reevaluations, on='batch_lot', how='left').set_index(lots.index)
+
+    target = found['target_date'].dt.strftime('%Y-%m-%d').fillna('unknown')
+    reason = np.where(
+        found['reevaluation_id'].isna(),
+        "No re-evaluation on record for " + lots['batch_lot'].astype(str),
+        "Re-evaluation " + found['reevaluation_id'].astype(str)
+        + " (" + found['request_type'].astype(str) + ") "
+        + np.where(found['complete'].fillna(False).astype(bool), "complete",
+                   "pending, results due " + target)
+    )
+    return found['complete'].fillna(False).astype(bool), pd.Series(reason, index=lots.index)
+
+
+def regulatory_check(lots, submissions, material_countries):
+    """Approved RIM submission for the trial, or the material registered for the country."""
+    approved = submissions[submissions['status'].eq('Approved')].assign(
+        approved_date=pd.to_datetime(submissions['approved_date'], errors='coerce')
+    ).sort_values('approved_date', ascending=False).drop_duplicates('trial_alias')
+    found = lots[['trial_alias']].merge(approved, on='trial_alias', how='left').set_index(lots.index)
+    has_submission = found['submission'].notna()
+
+    registered = lots[['trial_alias', 'material_number', 'country']].merge(
+        material_countries.drop_duplicates().assign(registered=True),
+        on=['trial_alias', 'material_number', 'country'], how='left'
+    ).set_index(lots.index)['registered'].fillna(False).astype(bool)
+
+    approval = (
+        "RIM " + found['submission_type'].astype(str) + " '" + found['submission'].astype(str)
+        + "' approved by " + found['authority'].astype(str)
+        + " on " + found['approved_date'].dt.strftime('%Y-%m-%d').fillna('unknown date')
+    )
+    registration = (
+        lots['material_number'].astype(str) + " registered for " + lots['country'].astype(str)
+        + " in material_country_requirements"
+    )
+    reason = np.select(
+        [has_submission & registered, has_submission, registered],
+        [approval + "; " + registration, approval, registration],
+        "No approved RIM submission for " + lots['trial_alias'].astype(str) + " and "
+        + lots['material_number'].fillna('material').astype(str) + " not registered for "
+        + lots['country'].fillna('unknown country').astype(str)
+    )
+    return has_submission | registered, pd.Series(reason, index=lots.index)
+
+
+def logistical_check(lots, timelines, handling_days):
+    """Longest shipping time from the lot's location (else country) plus handling, against days left."""
+    by_helper, by_country = index_shipping_days(timelines)
+    helper = lots['location'].astype(str) + " (" + lots['country'].astype(str) + ")"
+    from_helper = helper.map(by_helper)
+    days = from_helper.fillna(lots['country'].map(by_country))
+    needed = days + handling_days
+    ok = (days.notna() & (lots['days_until_expiry'] > needed)).astype(bool)
+
+    source = np.where(from_helper.notna(), "from " + helper, "to " + lots['country'].astype(str))
+    reason = np.where(
+        days.isna(),
+        "No shipping timeline for " + helper,
+        "Shipping " + pd.Series(source, index=lots.index) + " takes up to "
+        + days.fillna(0).map('{:g}'.format) + f" days (+{handling_days:g} handling) vs "
+        + lots['days_until_expiry'].astype(str) + " days to expiry"
+    )
+    return ok, pd.Series(reason, index=lots.index)
+
+
+def evaluate_extensions(lots, reevaluations, submissions, material_countries, timelines, handling_days=7):
+    """
+    Evaluate shelf-life extension feasibility for all lots at once.
+
+    Args:
+        lots (DataFrame): batch_lot, trial_alias, location, country,
+            material_number and days_until_expiry per expiring lot
+        reevaluations (DataFrame): Rows of REEVALUATIONS_QUERY
+        submissions (DataFrame): Rows of RIM_SUBMISSIONS_QUERY
+        material_countries (DataFrame): Rows of MATERIAL_COUNTRIES_QUERY
+        timelines (DataFrame): Rows of SHIPPING_TIMELINES_QUERY
+        handling_days (float): Days added to shipping for relabelling and release
+
+    Returns:
+        DataFrame: Indexed like lots, with <check>_ok and <check>_reason for
+            technical, regulatory and logistical, and feasible
+    """
+    result = pd.DataFrame(index=lots.index)
+    result['technical_ok'], result['technical_reason'] = technical_check(lots, reevaluations)
+    result['regulatory_ok'], result['regulatory_reason'] = regulatory_check(lots, submissions, material_countries)
+    result['logistical_ok'], result['logistical_reason'] = logistical_check(lots, timelines, handling_days)
+    result['feasible'] = result['technical_ok'] & result['regulatory_ok'] & result['logistical_ok']
+    return result
+
+
+def verdict_records(evaluation):
+    """
+    Per-lot verdicts for alert details.
+
+    Returns:
+        list: {'verdict': 'YES'/'NO', 'technical': {'ok', 'reason'}, ...} per row
+    """
+    checks = ('technical', 'regulatory', 'logistical')
+    columns = [evaluation['feasible']] + [
+        evaluation[f"{check}_{field}"] for check in checks for field in ('ok', 'reason')
+    ]
+    return [
+        {
+            'verdict': 'YES' if feasible else 'NO',
+            **{
+                check: {'ok': bool(values[2 * i]), 'reason': values[2 * i + 1]}
+                for i, check in enumerate(checks)
+            },
+        }
+        for feasible, *values in zip(*columns)
+    ]
@@ -0,0 +1,193 @@
+"""
+Time-phased stock projection for the shortfall detector.
+
+Instead of dividing stock by a weekly burn rate, the projection steps week by
+week over a (trial, location, material) x expiry-week matrix for the whole
+grid at once. Each week it consumes demand and committed shipments from the
+earliest-expiring stock first (FEFO), and writes off stock whose lots expire.
+Inbound receipts are not modelled: the shipment reports only describe stock
+leaving the depots (see SCHEDULED_SHIPMENTS_QUERY). The loop runs over the weeks of the horizon; all
+grid rows are handled by the same array operations.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Stock on hand per lot expiry date
+INVENTORY_LOTS_QUERY = """
+SELECT
+    trial_alias,
+    warehouse_name as location,
+    description as material,
+    expiration_date as expiry_date,
+    SUM(actual_qty) as quantity
+FROM complete_warehouse_inventory
+GROUP BY trial_alias, warehouse_name, description, expiration_date
+HAVING SUM(actual_qty) > 0
+"""
+
+# Open depot shipments that have not left yet: stock committed to sites that
+# will leave the shipping location. There is no source of inbound receipts
+# into the depots: distribution_order_report holds the same depot-to-site
+# orders as the tracking report, and shipment_status_report has no trial or
+# material and only site returns, which are not usable stock, flow back.
+SCHEDULED_SHIPMENTS_QUERY = """
+SELECT
+    trial_alias,
+    shipping_location as location,
+    COALESCE(requested_delivery_date, order_date) as due_date,
+    actual_qty as quantity
+FROM warehouse_and_site_shipment_tracking_report
+WHERE order_status IN ('Released', 'In Progress', 'Created')
+  AND (actual_ship_date IS NULL OR actual_ship_date >= CURRENT_DATE)
+"""
+
+GRID_KEY = ['trial_alias', 'location', 'material']
+
+
+def week_offsets(dates, as_of):
+    """Whole weeks from as_of to each date (negative for past dates)."""
+    days = (pd.to_datetime(dates, errors='coerce') - as_of.normalize()).dt.days
+    return np.floor_divide(days, 7)
+
+
+def build_expiry_buckets(grid, lots, as_of, horizon_weeks):
+    """
+    Place each lot's quantity in the bucket of the week it expires.
+
+    Buckets 0..horizon_weeks-1 hold stock expiring during that week; the
+    last bucket holds stock usable for the whole horizon. Lots already
+    expired, or matching no grid row, are left out.
+
+    Args:
+        grid (DataFrame): Grid rows with GRID_KEY columns
+        lots (DataFrame): Rows of INVENTORY_LOTS_QUERY
+        as_of (Timestamp): Start of week 0
+        horizon_weeks (int): Number of weeks projected
+
+    Returns:
+        ndarray: rows x (horizon_weeks + 1) stock matrix
+    """
+    buckets = np.zeros((len(grid), horizon_weeks + 1))
+    if lots.empty or grid.empty:
+        return buckets
+
+    rows = grid[GRID_KEY].reset_index(drop=True).reset_index().rename(columns={'index': 'row'})
+    lots = lots.merge(rows, on=GRID_KEY, how='inner')
+
+    weeks = week_offsets(lots['expiry_date'], as_of)
+    # Lots without an expiry date are treated as usable for the whole horizon
+    weeks = weeks.fillna(horizon_weeks).clip(upper=horizon_weeks)
+    usable = (weeks >= 0).to_numpy()
+
+    np.add.at(
+        buckets,
+        (lots['row'].to_numpy()[usable], weeks.to_numpy()[usable].astype(int)),
+        lots['quantity'].to_numpy(dtype=float)[usable]
+    )
+    return buckets
+
+
+def build_shipment_schedule(grid, shipments, as_of, horizon_weeks):
+    """
+    Spread committed shipments over the grid rows and weeks.
+
+    Shipments are recorded per trial and location, so each one is split
+    across the materials of that trial and location in proportion to their
+    stock. Overdue shipments fall in week 0; later ones beyond the horizon
+    are ignored.
+
+    Args:
+        grid (DataFrame): Grid rows with GRID_KEY columns and total_stock
+        shipments (DataFrame): Rows of SCHEDULED_SHIPMENTS_QUERY
+        as_of (Timestamp): Start of week 0
+        horizon_weeks (int): Number of weeks projected
+
+    Returns:
+        ndarray: rows x horizon_weeks matrix of committed quantities
+    """
+    schedule = np.zeros((len(grid), horizon_weeks))
+    if shipments.empty or grid.empty:
+        return schedule
+
+    rows = grid[GRID_KEY + ['total_stock']].reset_index(drop=True)
+    rows['row'] = np.arange(len(rows))
+    rows['share'] = rows['total_stock'] / rows.groupby(['trial_alias', 'location'])['total_stock'].transform('sum')
+
+    shipments = shipments.assign(week=week_offsets(shipments['due_date'], as_of).fillna(0).clip(lower=0))
+    shipments = shipments[shipments['week'] < horizon_weeks]
+    shipments = shipments.merge(rows, on=['trial_alias', 'location'], how='inner')
+
+    np.add.at(
+        schedule,
+        (shipments['row'].to_numpy(), shipments['week'].to_numpy().astype(int)),
+        (shipments['quantity'] * shipments['share']).to_numpy(dtype=float)
+    )
+    return schedule
+
+
+def project_stock(buckets, weekly_demand, schedule):
+    """
+    Step the FEFO projection through the horizon for all rows at once.
+
+    Args:
+        buckets (ndarray): rows x (weeks + 1) stock by expiry week
+        weekly_demand (ndarray): Packages consumed per week, per row
+        schedule (ndarray): rows x weeks committed shipments
+
+    Returns:
+        dict: weeks_until_stockout (inf when stock lasts the horizon),
+            expired_unused (stock written off before use), on_hand
+            (rows x weeks stock at the end of each week)
+    """
+    stock = buckets.astype(float).copy()
+    n_rows, n_weeks = schedule.shape
+    stockout = np.full(n_rows, np.inf)
+    expired = np.zeros(n_rows)
+    on_hand = np.zeros((n_rows, n_weeks))
+
+    for week in range(n_weeks):
+        # Consume demand and committed shipments from the earliest expiry on
+        need = weekly_demand + schedule[:, week]
+        available = stock.sum(axis=1)
+        before = np.cumsum(stock, axis=1) - stock
+        stock -= np.clip(need[:, None] - before, 0, stock)
+
+        # First week where need exceeds the stock: interpolate within it
+        short = (available < need) & np.isinf(stockout)
+        stockout[short] = week + available[short] / need[short]
+
+        # Lots expiring this week are written off
+        expired += stock[:, week]
+        stock[:, week] = 0
+        on_hand[:, week] = stock.sum(axis=1)
+
+    return {'weeks_until_stockout': stockout, 'expired_unused': expired, 'on_hand': on_hand}
+
+
+def simulate_shortfalls(grid, lots, shipments, as_of, horizon_weeks=8):
+    """
+    Project stockouts for every grid row.
+
+    Args:
+        grid (DataFrame): GRID_KEY columns, total_stock and packages_per_week
+        lots (DataFrame): Rows of INVENTORY_LOTS_QUERY
+        shipments (DataFrame): Rows of SCHEDULED_SHIPMENTS_QUERY
+        as_of (Timestamp): Start of the projection
+        horizon_weeks (int): Number of weeks projected
+
+    Returns:
+        DataFrame: grid plus weeks_until_stockout, expiring_before_use,
+            scheduled_shipments and projected_end_stock
+    """
+    grid = grid.reset_index(drop=True)
+    buckets = build_expiry_buckets(grid, lots, as_of, horizon_weeks)
+    schedule = build_shipment_schedule(grid, shipments, as_of, horizon_weeks)
+    projection = project_stock(buckets, grid['packages_per_week'].to_numpy(dtype=float), schedule)
+
+    result = grid.copy()
+    result['weeks_until_stockout'] = projection['weeks_until_stockout']
+    result['expiring_before_use'] = projection['expired_unused']
+    result['scheduled_shipments'] = schedule.sum(axis=1)
+    result['projected_end_stock'] = projection['on_hand'][:, -1] if horizon_weeks else grid['total_stock']
+    return result
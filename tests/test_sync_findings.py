@@ -0,0 +1,118 @@
+"""
+Stateful findings must survive a failed detector.
+
+Runs against the configured PostgreSQL database, in a scratch schema so the
+real watchdog_findings table is not touched; skipped when the database is
+unreachable.
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from config import Config
+from create_watchdog_table import ADD_STATE_COLUMNS_SQL, CREATE_PLAIN_TABLE_SQL
+from watchdog_core import SupplyWatchdog
+from watchdog_detectors import DETECTORS, Detector
+
+SCHEMA = 'watchdog_sync_test'
+
+
+class StableDetector(Detector):
+    name = 'test_stable'
+    description = 'Test detector'
+    label = 'stable alerts'
+    alert_type = 'TEST_STABLE'
+    payload_key = 'test_stable'
+
+    def detect(self, data, watchdog):
+        return [alert(self.alert_type, 'CT-1', 'LOT-1')]
+
+
+class FlakyDetector(StableDetector):
+    name = 'test_flaky'
+    label = 'flaky alerts'
+    alert_type = 'TEST_FLAKY'
+    payload_key = 'test_flaky'
+    fail = False
+
+    def detect(self, data, watchdog):
+        if FlakyDetector.fail:
+            raise RuntimeError("simulated detector failure")
+        return [alert(self.alert_type, 'CT-1', 'LOT-1'), alert(self.alert_type, 'CT-2', 'LOT-2')]
+
+
+def alert(alert_type, trial, lot):
+    return {
+        'alert_type': alert_type, 'severity': 'HIGH', 'trial_alias': trial, 'location': 'Depot',
+        'batch_lot': lot, 'material_description': 'Kit', 'details': {}, 'recommended_action': 'Check',
+    }
+
+
+@pytest.fixture
+def engine():
+    admin = Config.get_engine()
+    try:
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    except Exception as e:
+        pytest.skip(f"database unavailable: {e}")
+
+    engine = create_engine(Config.get_sqlalchemy_url(), connect_args={'options': f'-csearch_path={SCHEMA}'})
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_PLAIN_TABLE_SQL + ADD_STATE_COLUMNS_SQL))
+    yield engine
+
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+@pytest.fixture
+def watchdog(engine, monkeypatch, tmp_path):
+    monkeypatch.setitem(DETECTORS, StableDetector.name, StableDetector)
+    monkeypatch.setitem(DETECTORS, FlakyDetector.name, FlakyDetector)
+    monkeypatch.setattr(FlakyDetector, 'fail', False)
+    monkeypatch.setattr(Config, 'RECORD_RUN_METRICS', False)
+    monkeypatch.setattr(Config, 'METRICS_FORMAT', 'none')
+    monkeypatch.setattr(Config, 'QUERY_DIAGNOSTICS', False)
+    monkeypatch.chdir(tmp_path)
+    return SupplyWatchdog(
+        engine=engine, detectors=['test_stable', 'test_flaky'], findings_mode='stateful', sharding='none'
+    )
+
+
+def finding_status(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT alert_type, trial_alias, status FROM watchdog_findings")).all()
+    return {(alert_type, trial): status for alert_type, trial, status in rows}
+
+
+def test_failed_detector_keeps_its_findings_open(watchdog, engine):
+    watchdog.run()
+    assert set(finding_status(engine).values()) == {'OPEN'}
+
+    FlakyDetector.fail = True
+    payload = watchdog.run()
+
+    assert payload['changes']['resolved'] == 0
+    assert payload['failed_detectors'] == [{'alert_type': 'TEST_FLAKY', 'shard': None}]
+    assert payload['run_metrics']['failed_detectors'] == 1
+    assert finding_status(engine) == {
+        ('TEST_STABLE', 'CT-1'): 'OPEN', ('TEST_FLAKY', 'CT-1'): 'OPEN', ('TEST_FLAKY', 'CT-2'): 'OPEN',
+    }
+
+    # Once the detector recovers nothing is reported as new
+    FlakyDetector.fail = False
+    payload = watchdog.run()
+    assert payload['changes']['new'] == 0
+    assert payload['failed_detectors'] == []
+
+
+def test_detector_failed_in_one_shard_keeps_only_that_shard_open(watchdog, engine):
+    watchdog.run()
+
+    shard = {'name': 'shard-1', 'trials': ['CT-1']}
+    alerts = [alert('TEST_STABLE', 'CT-1', 'LOT-1')]
+    changes = watchdog.sync_findings(alerts, failed_detectors=[{'alert_type': 'TEST_FLAKY', 'shard': shard}])
+
+    assert [(row['alert_type'], row['trial_alias']) for row in changes['resolved']] == [('TEST_FLAKY', 'CT-2')]
+    assert finding_status(engine)[('TEST_FLAKY', 'CT-1')] == 'OPEN'
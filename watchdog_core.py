@@ -1,343 +1,1355 @@
 """
 Supply Watchdog - Core detection logic for expiry alerts and shortfall predictions.
 """
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import gzip
+import io
+import time
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, URL, text
+from sqlalchemy import text, table, column, insert
 from config import Config
+from data_sources import (
+    DatabaseSource, country_enrollment_frame, enrollment_rates_frame, excursions_frame,
+    expiry_candidates_frame, genealogy_edges_frame, inventory_frame, inventory_lots_frame,
+    lot_locations_frame, lpn_inventory_frame, material_countries_frame, reevaluations_frame,
+    rim_submissions_frame, scheduled_shipments_frame, shipping_timelines_frame,
+    shortfall_projection_frame, site_inventory_frame, trial_consumption_frame
+)
+from demand_forecast import (
+    COUNTRY_ENROLLMENT_QUERY, ENROLLMENT_RATES_QUERY, SITE_INVENTORY_QUERY,
+    apply_enrollment_demand, forecast_site_rates, parse_enrollment_series
+)
+from excursions import EXCURSIONS_QUERY, LPN_INVENTORY_QUERY, exposure_by_lpn
+from findings_partitions import ensure_partitions
+from genealogy import GENEALOGY_EDGES_QUERY, genealogy_index
+from shelf_life import (
+    LOT_LOCATIONS_QUERY, MATERIAL_COUNTRIES_QUERY, REEVALUATIONS_QUERY, RIM_SUBMISSIONS_QUERY,
+    SHIPPING_TIMELINES_QUERY, evaluate_extensions, verdict_records
+)
+from metrics import RunMetrics, peak_memory_mb, submit_in_context
+from query_diagnostics import capture_plans, print_report as print_query_report
+from supply_projection import INVENTORY_LOTS_QUERY, SCHEDULED_SHIPMENTS_QUERY, simulate_shortfalls
+from watchdog_detectors import (
+    SEVERITIES, Detector, fetch_snapshot, get_detectors, in_shard_trial, register_dataset, register_detector
+)
+from watchdog_shards import plan_shards, run_shards
+from watchdog_views import (
+    CONSUMPTION_QUERY, CONSUMPTION_VIEW, EXPIRY_CANDIDATES_QUERY, EXPIRY_VIEW, usable_watchdog_views
+)
 import json
 
 
+# Columns of watchdog_findings written by save_findings
+FINDINGS_TABLE = table(
+    'watchdog_findings',
+    column('run_timestamp'),
+    column('alert_type'),
+    column('severity'),
+    column('trial_alias'),
+    column('location'),
+    column('batch_lot'),
+    column('material_description'),
+    column('expiry_date'),
+    column('days_until_expiry'),
+    column('current_quantity'),
+    column('projected_shortage_date'),
+    column('weekly_consumption_rate'),
+    column('weeks_until_stockout'),
+    column('details'),
+    column('recommended_action'),
+)
+
+# watchdog_findings with the lifecycle columns written in stateful mode
+STATEFUL_FINDINGS_TABLE = table(
+    'watchdog_findings',
+    *[column(c.name) for c in FINDINGS_TABLE.columns],
+    column('alert_key'),
+    column('status'),
+    column('last_seen_at'),
+)
+
+# Finding fields refreshed when an open finding changes severity
+UPDATE_CHANGED_FINDINGS = text("""
+    UPDATE watchdog_findings f SET
+        severity = c.severity,
+        days_until_expiry = c.days_until_expiry,
+        current_quantity = c.current_quantity,
+        projected_shortage_date = c.projected_shortage_date,
+        weekly_consumption_rate = c.weekly_consumption_rate,
+        weeks_until_stockout = c.weeks_until_stockout,
+        details = c.details,
+        recommended_action = c.recommended_action,
+        last_seen_at = :seen_at
+    FROM unnest(
+        CAST(:ids AS int[]),
+        CAST(:severity AS varchar[]),
+        CAST(:days_until_expiry AS int[]),
+        CAST(:current_quantity AS numeric[]),
+        CAST(:projected_shortage_date AS date[]),
+        CAST(:weekly_consumption_rate AS numeric[]),
+        CAST(:weeks_until_stockout AS numeric[]),
+        CAST(:details AS jsonb[]),
+        CAST(:recommended_action AS text[])
+    ) AS c(
+        id, severity, days_until_expiry, current_quantity, projected_shortage_date,
+        weekly_consumption_rate, weeks_until_stockout, details, recommended_action
+    )
+    WHERE f.id = c.id
+""")
+
+SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITIES)}
+
+
+# Stock on hand per trial, location and material
+INVENTORY_QUERY = """
+SELECT
+    trial_alias,
+    warehouse_name as location,
+    description as material,
+    SUM(actual_qty) as total_stock
+FROM complete_warehouse_inventory
+GROUP BY trial_alias, warehouse_name, description
+HAVING SUM(actual_qty) > 0
+"""
+
+def build_shortfall_query(consumption_query):
+    """
+    Build the server-side shortfall query over a consumption source.
+
+    Uses 2 packages per visit, 10 packages/week when a trial has no recent
+    visits, and keeps only stockouts within 8 weeks. Arithmetic is done in
+    double precision to match the pandas engine exactly.
+    """
+    return f"""
+    WITH consumption AS ({consumption_query}),
+    inventory AS ({INVENTORY_QUERY}),
+    projected AS (
+        SELECT
+            i.trial_alias,
+            i.location,
+            i.material,
+            i.total_stock::float8 as total_stock,
+            c.total_patients,
+            c.visits_per_month::float8 as visits_per_month,
+            COALESCE(c.visits_per_month::float8 * 2 / 4.33, 10) as packages_per_week
+        FROM inventory i
+        LEFT JOIN consumption c ON c.trial_alias = i.trial_alias
+    ),
+    stockout AS (
+        SELECT p.*, p.total_stock / p.packages_per_week as weeks_until_stockout
+        FROM projected p
+    )
+    SELECT
+        s.*,
+        CASE
+            WHEN s.weeks_until_stockout < 2 THEN 'CRITICAL'
+            WHEN s.weeks_until_stockout < 4 THEN 'HIGH'
+            ELSE 'MEDIUM'
+        END as severity
+    FROM stockout s
+    WHERE s.weeks_until_stockout < 8
+    """
+
+
+# Watchdog inputs read from the materialized views when they are usable
+EXPIRY_VIEW_QUERY = f"""
+SELECT batch_lot, trial_alias, material_description, expiry_date, location, quantity, order_id, order_status
+FROM {EXPIRY_VIEW}
+"""
+CONSUMPTION_VIEW_QUERY = f"""
+SELECT trial_alias, total_patients, total_visits, visits_per_month
+FROM {CONSUMPTION_VIEW}
+"""
+
+
+# Recommended action text, by severity
+EXPIRY_ACTION_PREFIX = {
+    'CRITICAL': "URGENT: Expedite shipment or reallocate batch ",
+    'HIGH': "Plan shipment for batch ",
+    'MEDIUM': "Monitor batch ",
+}
+EXPIRY_ACTION_TIMING = {
+    'CRITICAL': " immediately",
+    'HIGH': " within 2 weeks",
+    'MEDIUM': "",
+}
+EXCURSION_ACTION_PREFIX = {
+    'CRITICAL': "URGENT: Quarantine ",
+    'HIGH': "Hold ",
+    'MEDIUM': "Review stability data for ",
+}
+EXCURSION_ACTION_TIMING = {
+    'CRITICAL': " and remove it from usable stock",
+    'HIGH': " until QA disposition",
+    'MEDIUM': "",
+}
+SHORTFALL_ACTION_PREFIX = {
+    'CRITICAL': "URGENT: Initiate emergency order for ",
+    'HIGH': "Expedite regular order for ",
+    'MEDIUM': "Plan replenishment for ",
+}
+
+
+def python_ints(series):
+    """Convert a numeric Series to Python ints, with None for nulls."""
+    return series.astype('Int64').astype(object).where(series.notna(), None)
+
+
+def python_floats(series):
+    """Convert a numeric Series to Python floats, with None for nulls."""
+    return series.astype(float).astype(object).where(series.notna(), None)
+
+
+def python_dates(series):
+    """Convert a datetime Series to datetime.date objects, with None for nulls."""
+    return series.dt.date.astype(object).where(series.notna(), None)
+
+
+def python_values(series, integer=False):
+    """Convert a Series to JSON-friendly Python values, with None for nulls."""
+    if integer:
+        return python_ints(series)
+    if pd.api.types.is_numeric_dtype(series):
+        return python_floats(series)
+    return series.astype(object).where(series.notna(), None)
+
+
+def serialize_alert(alert):
+    """Copy an alert with its dates converted to ISO strings."""
+    serialized = alert.copy()
+    if 'expiry_date' in serialized and serialized['expiry_date']:
+        serialized['expiry_date'] = serialized['expiry_date'].isoformat()
+    if 'projected_shortage_date' in serialized and serialized['projected_shortage_date']:
+        serialized['projected_shortage_date'] = serialized['projected_shortage_date'].isoformat()
+    return serialized
+
+
+def json_default(value):
+    """Encode dates for json.dump; other unknown types are an error."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def copy_text_value(value):
+    """Render a value as a field of PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+# Datasets shared by the built-in detectors
+register_dataset(
+    'expiry_candidates', EXPIRY_CANDIDATES_QUERY, view=EXPIRY_VIEW, view_query=EXPIRY_VIEW_QUERY,
+    frame=expiry_candidates_frame, trial_column='trial_alias'
+)
+register_dataset(
+    'trial_consumption', CONSUMPTION_QUERY, view=CONSUMPTION_VIEW, view_query=CONSUMPTION_VIEW_QUERY,
+    frame=trial_consumption_frame, trial_column='trial_alias'
+)
+register_dataset('inventory', INVENTORY_QUERY, frame=inventory_frame, trial_column='trial_alias')
+register_dataset(
+    'shortfall_projection',
+    lambda usable_views: build_shortfall_query(
+        CONSUMPTION_VIEW_QUERY if CONSUMPTION_VIEW in usable_views else CONSUMPTION_QUERY
+    ),
+    frame=shortfall_projection_frame, trial_column='trial_alias'
+)
+register_dataset('enrollment_rates', ENROLLMENT_RATES_QUERY, frame=enrollment_rates_frame,
+                 trial_column='trial_alias')
+register_dataset('country_enrollment', COUNTRY_ENROLLMENT_QUERY, frame=country_enrollment_frame,
+                 trial_column='trial_alias')
+register_dataset('site_inventory', SITE_INVENTORY_QUERY, frame=site_inventory_frame,
+                 trial_column='trial_alias')
+register_dataset('inventory_lots', INVENTORY_LOTS_QUERY, frame=inventory_lots_frame,
+                 trial_column='trial_alias')
+register_dataset('scheduled_shipments', SCHEDULED_SHIPMENTS_QUERY, frame=scheduled_shipments_frame,
+                 trial_column='trial_alias')
+register_dataset('lot_locations', LOT_LOCATIONS_QUERY, frame=lot_locations_frame)
+register_dataset('reevaluations', REEVALUATIONS_QUERY, frame=reevaluations_frame)
+register_dataset('rim_submissions', RIM_SUBMISSIONS_QUERY, frame=rim_submissions_frame, tables=['rim'])
+register_dataset('material_countries', MATERIAL_COUNTRIES_QUERY, frame=material_countries_frame,
+                 tables=['material_country_requirements'])
+register_dataset('shipping_timelines', SHIPPING_TIMELINES_QUERY, frame=shipping_timelines_frame,
+                 tables=['ip_shipping_timelines_report'])
+register_dataset('genealogy_edges', GENEALOGY_EDGES_QUERY, frame=genealogy_edges_frame,
+                 tables=['batch_geneology', 'batch_master', 'manufacturing_orders'])
+register_dataset('excursions', EXCURSIONS_QUERY, frame=excursions_frame)
+register_dataset('lpn_inventory', LPN_INVENTORY_QUERY, frame=lpn_inventory_frame, trial_column='trial_alias')
+
+
+@register_detector
+class ExpiryDetector(Detector):
+    """
+    Allocated batches expiring within 90 days.
+
+    With Config.SHELF_LIFE_EVALUATION, each alert's details also carry a
+    shelf-life extension verdict for its lot (see shelf_life), and with
+    Config.GENEALOGY_IMPACT a summary of the lots it was made from and the
+    lots made from it, with their locations (see genealogy). Either is
+    skipped when one of the datasets it reads failed to load.
+    """
+
+    name = 'expiry'
+    description = 'Checking for expiring batches'
+    label = 'expiry alerts'
+    alert_type = 'EXPIRY_ALERT'
+    payload_key = 'expiry_alerts'
+    datasets = ('expiry_candidates',)
+
+    # Datasets read by the shelf-life extension evaluation
+    extension_datasets = (
+        'lot_locations', 'reevaluations', 'rim_submissions', 'material_countries', 'shipping_timelines'
+    )
+
+    # Datasets read by the genealogy impact
+    genealogy_datasets = ('genealogy_edges', 'lot_locations')
+
+    def optional_datasets(self, watchdog):
+        # Alerts are still raised, without verdicts or genealogy, when these fail to load
+        names = list(self.extension_datasets) if Config.SHELF_LIFE_EVALUATION else []
+        if Config.GENEALOGY_IMPACT:
+            names += [name for name in self.genealogy_datasets if name not in names]
+        return names
+
+    def alert_key(self, alert):
+        # A batch can be allocated to several orders; each is its own finding
+        return super().alert_key(alert) + '|' + str((alert.get('details') or {}).get('order_id') or '')
+
+    def detect(self, data, watchdog):
+        df = data['expiry_candidates'].copy()
+
+        # Convert expiry_date to datetime
+        df['expiry_date'] = pd.to_datetime(df['expiry_date'], errors='coerce')
+
+        # Calculate days until expiry
+        today = pd.Timestamp.now()
+        df['days_until_expiry'] = (df['expiry_date'] - today).dt.days
+
+        # Filter: expiring within 90 days
+        expiring = df[df['days_until_expiry'] <= 90].copy()
+
+        # Categorize by severity
+        days = expiring['days_until_expiry']
+        expiring['severity'] = np.select([days < 30, days < 60], ['CRITICAL', 'HIGH'], 'MEDIUM')
+
+        # Build the alert fields column-wise, then emit all records at once
+        days_text = days.astype('Int64').astype(str)
+        details = expiring[['order_id', 'order_status']].to_dict('records')
+        if Config.SHELF_LIFE_EVALUATION and all(name in data for name in self.extension_datasets):
+            for record, verdict in zip(details, self.extension_verdicts(expiring, data)):
+                record['shelf_life_extension'] = verdict
+        if Config.GENEALOGY_IMPACT and all(name in data for name in self.genealogy_datasets):
+            index = genealogy_index(data['genealogy_edges'])
+            impacts = index.impact(
+                expiring['batch_lot'], data['lot_locations'], limit=Config.GENEALOGY_DETAIL_LOTS
+            )
+            for record, impact in zip(details, impacts):
+                record['genealogy'] = impact
+            cycles = sum(bool(impact['cycle_lots']) for impact in impacts)
+            if cycles:
+                print(f"✗ {cycles} expiring lots are both upstream and downstream of a lot (genealogy cycle)")
+        columns = pd.DataFrame({
+            'alert_type': self.alert_type,
+            'severity': expiring['severity'],
+            'trial_alias': expiring['trial_alias'],
+            'location': expiring['location'],
+            'batch_lot': expiring['batch_lot'],
+            'material_description': expiring['material_description'],
+            'expiry_date': python_dates(expiring['expiry_date']),
+            'days_until_expiry': python_ints(days),
+            'current_quantity': python_floats(expiring['quantity']).fillna(0),
+            'details': details,
+            'recommended_action': (
+                expiring['severity'].map(EXPIRY_ACTION_PREFIX)
+                + expiring['batch_lot'].astype(str)
+                + expiring['severity'].map(EXPIRY_ACTION_TIMING)
+                + " - expires in " + days_text + " days"
+            ),
+        }, index=expiring.index)
+
+        return columns.to_dict('records')
+
+    def extension_verdicts(self, expiring, data):
+        """Shelf-life extension verdicts for the expiring rows, in row order."""
+        lots = expiring[['batch_lot', 'trial_alias', 'location', 'days_until_expiry']].merge(
+            data['lot_locations'], on=['batch_lot', 'location'], how='left'
+        ).set_index(expiring.index)
+        evaluation = evaluate_extensions(
+            lots, data['reevaluations'], data['rim_submissions'], data['material_countries'],
+            data['shipping_timelines'], handling_days=Config.SHELF_LIFE_HANDLING_DAYS
+        )
+        return verdict_records(evaluation)
+
+
+@register_detector
+class ShortfallDetector(Detector):
+    """
+    Stock shortfalls within 8 weeks, projected from recent consumption.
+
+    With the 'visits' demand model, demand is derived from each trial's
+    recent patient visits. The 'sql' shortfall engine runs that whole
+    computation in one PostgreSQL query and transfers only the alerting rows;
+    the 'pandas' engine reads consumption and inventory and computes the same
+    result client-side. The 'enrollment' demand model forecasts demand from
+    the monthly site enrollment series instead (see demand_forecast).
+
+    The 'linear' projection divides stock by weekly demand; the 'simulation'
+    projection steps through the horizon week by week with lot expiry and
+    scheduled shipments (see supply_projection).
+    """
+
+    name = 'shortfall'
+    description = 'Analyzing inventory shortfall predictions'
+    label = 'shortfall predictions'
+    alert_type = 'SHORTFALL_PREDICTION'
+    payload_key = 'shortfall_predictions'
+
+    # Forecast horizon; later stockouts are not reported
+    horizon_weeks = 8
+
+    # Fields reported under details, per demand model and projection
+    detail_columns = {
+        'visits': ['total_patients', 'visits_per_month'],
+        'enrollment': ['country', 'demand_source', 'projected_enrollment', 'enrollment_trend'],
+        'simulation': ['expiring_before_use', 'scheduled_shipments', 'projected_end_stock'],
+    }
+
+    def required_datasets(self, watchdog):
+        simulation = watchdog.projection == 'simulation'
+
+        if watchdog.demand_model == 'enrollment':
+            datasets = ['enrollment_rates', 'country_enrollment', 'site_inventory']
+        elif watchdog.shortfall_engine == 'sql' and not simulation:
+            return ['shortfall_projection']
+        else:
+            datasets = ['trial_consumption', 'inventory']
+
+        if simulation:
+            datasets += ['inventory_lots', 'scheduled_shipments']
+        return datasets
+
+    def detect(self, data, watchdog):
+        if 'shortfall_projection' in data:
+            shortfalls = data['shortfall_projection']
+        else:
+            if watchdog.demand_model == 'enrollment':
+                merged = self.enrollment_demand(
+                    data['enrollment_rates'], data['country_enrollment'], data['site_inventory']
+                )
+            else:
+                merged = self.visit_demand(data['trial_consumption'], data['inventory'])
+
+            # Fill missing consumption with conservative default (10 packages/week)
+            merged['packages_per_week'] = merged['packages_per_week'].fillna(10)
+
+            if watchdog.projection == 'simulation':
+                merged = simulate_shortfalls(
+                    merged, data['inventory_lots'], data['scheduled_shipments'],
+                    pd.Timestamp.now(), horizon_weeks=self.horizon_weeks
+                )
+            else:
+                # Calculate weeks until stockout
+                merged['weeks_until_stockout'] = merged['total_stock'] / merged['packages_per_week']
+
+            shortfalls = self.classify(merged)
+
+        detail_columns = list(self.detail_columns[watchdog.demand_model])
+        if watchdog.projection == 'simulation':
+            detail_columns += self.detail_columns['simulation']
+        return self.build_alerts(shortfalls, detail_columns)
+
+    def visit_demand(self, consumption_df, inventory_df):
+        """Attach weekly demand from recent patient visits to inventory rows."""
+        consumption_df = consumption_df.copy()
+
+        # Assume 2 packages per visit (conservative estimate)
+        consumption_df['packages_per_month'] = consumption_df['visits_per_month'] * 2
+        consumption_df['packages_per_week'] = consumption_df['packages_per_month'] / 4.33
+
+        # Merge inventory with consumption
+        return inventory_df.merge(consumption_df, on='trial_alias', how='left')
+
+    def enrollment_demand(self, enrollment_df, country_df, inventory_df):
+        """Attach weekly demand from the forecast site enrollment to inventory rows."""
+        series = parse_enrollment_series(enrollment_df)
+        site_rates = forecast_site_rates(
+            series,
+            pd.Timestamp.now(),
+            horizon_weeks=self.horizon_weeks,
+            window=Config.DEMAND_WINDOW_MONTHS,
+            trend_months=Config.DEMAND_TREND_MONTHS
+        )
+        merged = apply_enrollment_demand(
+            inventory_df, site_rates, country_df, packages_per_patient=Config.DEMAND_PACKAGES_PER_PATIENT
+        )
+        merged['demand_source'] = merged['demand_source'].fillna('default')
+        return merged
+
+    def classify(self, merged):
+        """Keep the rows stocking out within the horizon and rate their severity."""
+        # Filter: stockout within 8 weeks
+        shortfalls = merged[merged['weeks_until_stockout'] < self.horizon_weeks].copy()
+
+        # Categorize severity
+        weeks = shortfalls['weeks_until_stockout']
+        shortfalls['severity'] = np.select([weeks < 2, weeks < 4], ['CRITICAL', 'HIGH'], 'MEDIUM')
+
+        return shortfalls
+
+    def build_alerts(self, shortfalls, detail_columns):
+        """Build shortfall alert dicts column-wise from shortfall rows."""
+        weeks = shortfalls['weeks_until_stockout']
+        shortage_dates = pd.Timestamp.now() + pd.to_timedelta(weeks, unit='W')
+        details = pd.DataFrame({
+            name: python_values(shortfalls[name], integer=(name == 'total_patients'))
+            for name in detail_columns
+        }, index=shortfalls.index)
+        columns = pd.DataFrame({
+            'alert_type': self.alert_type,
+            'severity': shortfalls['severity'],
+            'trial_alias': shortfalls['trial_alias'],
+            'location': shortfalls['location'],
+            'material_description': shortfalls['material'],
+            'current_quantity': shortfalls['total_stock'].astype(float),
+            'weekly_consumption_rate': shortfalls['packages_per_week'].astype(float),
+            'weeks_until_stockout': weeks.astype(float),
+            'projected_shortage_date': python_dates(shortage_dates),
+            'details': details.to_dict('records'),
+            'recommended_action': (
+                shortfalls['severity'].map(SHORTFALL_ACTION_PREFIX)
+                + shortfalls['trial_alias'].astype(str)
+                + " at " + shortfalls['location'].astype(str)
+                + " - stockout in " + weeks.map('{:.1f}'.format) + " weeks"
+            ),
+        }, index=shortfalls.index)
+
+        return columns.to_dict('records')
+
+
+@register_detector
+class ExcursionDetector(Detector):
+    """
+    Stock still counted as usable after temperature excursions.
+
+    Hours outside the storage class range (Config.EXCURSION_STORAGE_CLASSES)
+    are summed per LPN and lot from the excursion detail report (see
+    excursions). Stock with such exposure and quantity on hand is CRITICAL
+    when the exposure exceeds the hours its class allows or its excursion was
+    dispositioned Not Fit For Use, HIGH when over half the allowance or still
+    pending disposition, else MEDIUM.
+    """
+
+    name = 'excursion'
+    description = 'Checking stock exposed to temperature excursions'
+    label = 'excursion risks'
+    alert_type = 'EXCURSION_RISK'
+    payload_key = 'excursion_risks'
+    datasets = ('excursions', 'lpn_inventory')
+
+    def alert_key(self, alert):
+        # Each LPN of a lot is exposed separately
+        return super().alert_key(alert) + '|' + str((alert.get('details') or {}).get('lpn') or '')
+
+    def detect(self, data, watchdog):
+        exposed = exposure_by_lpn(data['excursions'], data['lpn_inventory'], Config.EXCURSION_STORAGE_CLASSES)
+
+        # Only stock still counted in inventory is at risk
+        exposed = exposed[exposed['quantity'] > 0].copy()
+
+        hours = exposed['exposure_hours']
+        allowed = exposed['allowable_hours']
+        exposed['severity'] = np.select(
+            [
+                (hours > allowed) | exposed['ffu_status'].eq('Not Fit For Use'),
+                (hours > allowed / 2) | exposed['ffu_status'].eq('Pending Fit For Use'),
+            ],
+            ['CRITICAL', 'HIGH'], 'MEDIUM'
+        )
+
+        hours_text = hours.map('{:g}'.format)
+        details = pd.DataFrame({
+            'lpn': exposed['lpn'],
+            'storage_class': exposed['storage_class'],
+            'storage_range_c': [[low, high] for low, high in zip(exposed['min_c'], exposed['max_c'])],
+            'exposure_hours': hours.astype(float),
+            'allowable_hours': allowed.astype(float),
+            'excursions': python_ints(exposed['excursions']),
+            'min_temperature_c': exposed['min_temperature_c'].round(2),
+            'max_temperature_c': exposed['max_temperature_c'].round(2),
+            'excursion_ids': exposed['excursion_ids'],
+            'ffu_status': python_values(exposed['ffu_status']),
+        }, index=exposed.index)
+        columns = pd.DataFrame({
+            'alert_type': self.alert_type,
+            'severity': exposed['severity'],
+            'trial_alias': exposed['trial_alias'],
+            'location': exposed['location'],
+            'batch_lot': exposed['batch_lot'],
+            'material_description': exposed['material_description'],
+            'expiry_date': python_dates(pd.to_datetime(exposed['expiry_date'], errors='coerce')),
+            'current_quantity': python_floats(exposed['quantity']),
+            'details': details.to_dict('records'),
+            'recommended_action': (
+                exposed['severity'].map(EXCURSION_ACTION_PREFIX)
+                + exposed['lpn'].astype(str) + " (batch " + exposed['batch_lot'].astype(str) + ")"
+                + exposed['severity'].map(EXCURSION_ACTION_TIMING)
+                + " - " + hours_text + " h outside " + exposed['storage_class'].astype(str)
+                + " range, " + allowed.map('{:g}'.format) + " h allowed"
+            ),
+        }, index=exposed.index)
+
+        return columns.to_dict('records')
+
+
 class SupplyWatchdog:
     """Main class for Supply Watchdog autonomous monitoring."""
 
-    def __init__(self):
-        """Initialize database connection."""
-        url = URL.create(
-            drivername="postgresql+psycopg2",
-            username=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            host=Config.DB_HOST,
-            port=int(Config.DB_PORT),
-            database=Config.DB_NAME,
-        )
-        self.engine = create_engine(url)
+    def __init__(
+        self, shortfall_engine=None, engine=None, detectors=None, demand_model=None, projection=None,
+        findings_mode=None, source=None, sharding=None
+    ):
+        """
+        Initialize database connection.
+
+        Args:
+            shortfall_engine (str): 'sql' to compute shortfalls in one
+                server-side query, 'pandas' to compute them client-side.
+                Uses Config.SHORTFALL_ENGINE if None.
+            engine: SQLAlchemy engine. Uses the process-wide shared engine
+                from Config.get_engine() if None.
+            detectors (list): Names of the registered detectors to run, or
+                None for all of them
+            demand_model (str): Shortfall demand model, 'visits' or
+                'enrollment'. Uses Config.SHORTFALL_DEMAND_MODEL if None.
+            projection (str): Stockout projection, 'linear' or 'simulation'.
+                Uses Config.SHORTFALL_PROJECTION if None.
+            findings_mode (str): 'append' to insert every alert each run,
+                'stateful' to sync them with the open findings. Uses
+                Config.FINDINGS_MODE if None.
+            source: Where detectors read their datasets, e.g. a
+                data_sources.FileSource. Uses the database (through
+                engine) if None.
+            sharding (str): How run() splits the detectors: 'none', or
+                'trial' / 'region' shards on a process pool (see
+                watchdog_shards). Uses Config.WATCHDOG_SHARDING if None.
+        """
+        self.shortfall_engine = shortfall_engine or Config.SHORTFALL_ENGINE
+        self.engine = engine or Config.get_engine()
+        self.detectors = detectors
+        self.demand_model = demand_model or Config.SHORTFALL_DEMAND_MODEL
+        self.projection = projection or Config.SHORTFALL_PROJECTION
+        self.findings_mode = findings_mode or Config.FINDINGS_MODE
+        self.source = source
+        self.sharding = sharding or Config.WATCHDOG_SHARDING
+        # RunMetrics of the run in progress, set by run()
+        self.metrics = None
 
     def detect_expiry_alerts(self):
         """
         Detect allocated batches expiring within 90 days.
         Returns list of alerts categorized by severity.
         """
-        query = """
-        SELECT
-            a.material_component_batch as batch_lot,
-            a.trial_alias,
-            a.material_description,
-            i.expiration_date as expiry_date,
-            i.warehouse_name as location,
-            CAST(i.actual_qty AS NUMERIC) as quantity,
-            a.order_id,
-            a.order_status
-        FROM allocated_materials_to_orders a
-        JOIN complete_warehouse_inventory i
-            ON a.material_component_batch = i.lot_number
-        WHERE a.order_status IN ('Released', 'In Progress', 'Created')
+        alerts, _ = self.run_detectors(execution='sequential', detectors=['expiry'])
+        return alerts
+
+    def detect_shortfall_predictions(self):
+        """
+        Detect potential stock shortfalls within 8 weeks.
+        Compares projected demand against current inventory.
         """
+        alerts, _ = self.run_detectors(execution='sequential', detectors=['shortfall'])
+        return alerts
 
-        try:
-            df = pd.read_sql(query, self.engine)
+    def detect_excursion_risks(self):
+        """
+        Detect stock still counted as usable after temperature excursions.
+        Sums out-of-range hours per LPN and lot against the storage class.
+        """
+        alerts, _ = self.run_detectors(execution='sequential', detectors=['excursion'])
+        return alerts
 
-            # Convert expiry_date to datetime
-            df['expiry_date'] = pd.to_datetime(df['expiry_date'], errors='coerce')
+    def _run_detector(self, detector, data, errors):
+        """
+        Run one detector over the snapshot and measure its wall time.
 
-            # Calculate days until expiry
-            today = pd.Timestamp.now()
-            df['days_until_expiry'] = (df['expiry_date'] - today).dt.days
+        Returns:
+            tuple: (alerts, seconds, error message or None)
+        """
+        start = time.perf_counter()
+        error = None
+        try:
+            required = detector.required_datasets(self)
+            missing = [name for name in required if name not in data]
+            if missing:
+                raise RuntimeError("; ".join(f"{name} unavailable: {errors[name]}" for name in missing))
 
-            # Filter: expiring within 90 days
-            expiring = df[df['days_until_expiry'] <= 90].copy()
+            optional = [name for name in detector.optional_datasets(self) if name not in required]
+            for name in optional:
+                if name not in data:
+                    print(f"✗ {detector.label}: {name} unavailable, skipping what it adds: {errors[name]}")
 
-            # Categorize by severity
-            expiring.loc[:, 'severity'] = 'MEDIUM'
-            expiring.loc[expiring['days_until_expiry'] < 60, 'severity'] = 'HIGH'
-            expiring.loc[expiring['days_until_expiry'] < 30, 'severity'] = 'CRITICAL'
+            alerts = detector.detect(
+                {name: data[name] for name in required + optional if name in data}, self
+            )
+            print(f"✓ Detected {len(alerts)} {detector.label}")
 
+        except Exception as e:
+            print(f"✗ Error detecting {detector.label}: {e}")
             alerts = []
-            for _, row in expiring.iterrows():
-                alert = {
-                    'alert_type': 'EXPIRY_ALERT',
-                    'severity': row['severity'],
-                    'trial_alias': row['trial_alias'],
-                    'location': row['location'],
-                    'batch_lot': row['batch_lot'],
-                    'material_description': row['material_description'],
-                    'expiry_date': row['expiry_date'].date() if pd.notna(row['expiry_date']) else None,
-                    'days_until_expiry': int(row['days_until_expiry']) if pd.notna(row['days_until_expiry']) else None,
-                    'current_quantity': float(row['quantity']) if pd.notna(row['quantity']) else 0,
-                    'details': {
-                        'order_id': row['order_id'],
-                        'order_status': row['order_status']
-                    }
-                }
-
-                # Generate recommendation
-                if row['severity'] == 'CRITICAL':
-                    alert['recommended_action'] = f"URGENT: Expedite shipment or reallocate batch {row['batch_lot']} immediately - expires in {int(row['days_until_expiry'])} days"
-                elif row['severity'] == 'HIGH':
-                    alert['recommended_action'] = f"Plan shipment for batch {row['batch_lot']} within 2 weeks - expires in {int(row['days_until_expiry'])} days"
-                else:
-                    alert['recommended_action'] = f"Monitor batch {row['batch_lot']} - expires in {int(row['days_until_expiry'])} days"
+            error = str(e)
 
-                alerts.append(alert)
+        return alerts, time.perf_counter() - start, error
 
-            print(f"[OK] Detected {len(alerts)} expiry alerts")
-            return alerts
+    def required_datasets(self, detectors):
+        """
+        Datasets read by the given detectors, required or optional, each listed once.
 
-        except Exception as e:
-            print(f"[ERROR] Error detecting expiry alerts: {e}")
-            return []
+        Args:
+            detectors (list): Detector instances
 
-    def detect_shortfall_predictions(self):
+        Returns:
+            list: Dataset names in first-use order
         """
-        Detect potential stock shortfalls within 8 weeks.
-        Compares projected demand against current inventory.
+        required = []
+        for detector in detectors:
+            for name in detector.required_datasets(self) + detector.optional_datasets(self):
+                if name not in required:
+                    required.append(name)
+        return required
+
+    def run_detectors(self, execution=None, workers=None, detectors=None):
         """
-        # Step 1: Calculate consumption rate from patient visits
-        consumption_query = """
-        SELECT
-            "Trial Alias" as trial_alias,
-            COUNT(DISTINCT patient) as total_patients,
-            COUNT(*) as total_visits,
-            COUNT(*) * 1.0 / NULLIF(COUNT(DISTINCT
-                TO_CHAR(TO_DATE(visit_date, 'YYYY-MM-DD'), 'YYYY-MM')
-            ), 0) as visits_per_month
-        FROM patient_status_and_treatment_report
-        WHERE TO_DATE(visit_date, 'YYYY-MM-DD') >= CURRENT_DATE - INTERVAL '3 months'
-        GROUP BY "Trial Alias"
-        """
-
-        # Step 2: Get current inventory
-        inventory_query = """
-        SELECT
-            trial_alias,
-            warehouse_name as location,
-            description as material,
-            SUM(CAST(actual_qty AS NUMERIC)) as total_stock
-        FROM complete_warehouse_inventory
-        GROUP BY trial_alias, warehouse_name, description
-        HAVING SUM(CAST(actual_qty AS NUMERIC)) > 0
+        Fetch the shared snapshot once and run all detectors over it.
+
+        Every dataset required by the selected detectors is read once, even
+        when several detectors use it. In 'parallel' mode the datasets are
+        fetched concurrently (each on its own pooled connection of the shared
+        engine) and the detectors are dispatched on a thread pool.
+
+        Args:
+            execution (str): 'parallel' or 'sequential'. Uses
+                Config.DETECTOR_EXECUTION if None.
+            workers (int): Maximum concurrent fetches and detectors. Uses
+                Config.DETECTOR_WORKERS if None.
+            detectors (list): Detector names. Uses the watchdog's detectors
+                (all registered ones by default) if None.
+
+        Returns:
+            tuple: (alerts in detector order, dict with 'datasets' and
+                'detectors' wall seconds by name, 'dataset_rows' rows fetched
+                per dataset, 'detector_alerts' alerts per detector,
+                'detector_errors' the error of each failed detector and
+                'failed_detectors' their alert types, as {'alert_type',
+                'shard': None} dicts)
         """
+        execution = execution or Config.DETECTOR_EXECUTION
+        workers = max(1, workers or Config.DETECTOR_WORKERS)
+        parallel = execution == 'parallel' and workers > 1
+        detectors = get_detectors(detectors or self.detectors)
+        required = self.required_datasets(detectors)
 
-        try:
-            consumption_df = pd.read_sql(consumption_query, self.engine)
-            inventory_df = pd.read_sql(inventory_query, self.engine)
+        data, errors, dataset_timings = fetch_snapshot(
+            self.source or DatabaseSource(self.engine), required, workers=workers if parallel else 1
+        )
 
-            # Assume 2 packages per visit (conservative estimate)
-            consumption_df['packages_per_month'] = consumption_df['visits_per_month'] * 2
-            consumption_df['packages_per_week'] = consumption_df['packages_per_month'] / 4.33
+        results = {}
+        if parallel and len(detectors) > 1:
+            print(f"Running {len(detectors)} detectors concurrently ({min(workers, len(detectors))} workers)...")
+            with ThreadPoolExecutor(max_workers=min(workers, len(detectors))) as executor:
+                futures = {
+                    detector.name: submit_in_context(executor, self._run_detector, detector, data, errors)
+                    for detector in detectors
+                }
+                for name, future in futures.items():
+                    results[name] = future.result()
+        else:
+            for detector in detectors:
+                print(f"{detector.description}...")
+                results[detector.name] = self._run_detector(detector, data, errors)
 
-            # Merge inventory with consumption
-            merged = inventory_df.merge(consumption_df, on='trial_alias', how='left')
+        alerts = []
+        detector_timings = {}
+        detector_counts = {}
+        detector_errors = {}
+        failed_detectors = []
+        for detector in detectors:
+            detector_alerts, seconds, error = results[detector.name]
+            alerts.extend(detector_alerts)
+            detector_timings[detector.name] = round(seconds, 3)
+            detector_counts[detector.name] = len(detector_alerts)
+            if error is not None:
+                detector_errors[detector.name] = error
+                failed_detectors.append({'alert_type': detector.alert_type, 'shard': None})
 
-            # Fill missing consumption with conservative default (10 packages/week)
-            merged['packages_per_week'].fillna(10, inplace=True)
+        return alerts, {
+            'datasets': dataset_timings,
+            'detectors': detector_timings,
+            'dataset_rows': {name: len(frame) for name, frame in data.items()},
+            'detector_alerts': detector_counts,
+            'detector_errors': detector_errors,
+            'failed_detectors': failed_detectors,
+        }
+
+    def run_sharded_detectors(self, by=None, shard_count=None, workers=None, retries=None):
+        """
+        Run the detectors per trial shard on a process pool and merge the results.
 
-            # Calculate weeks until stockout
-            merged['weeks_until_stockout'] = merged['total_stock'] / merged['packages_per_week']
+        Args:
+            by (str): 'trial' or 'region'. Uses the watchdog's sharding if None.
+            shard_count (int): Shards for 'trial'. Uses Config.WATCHDOG_SHARDS if None.
+            workers (int): Worker processes. Uses Config.WATCHDOG_SHARD_WORKERS if None.
+            retries (int): Reruns of a failed shard. Uses Config.WATCHDOG_SHARD_RETRIES if None.
 
-            # Filter: stockout within 8 weeks
-            shortfalls = merged[merged['weeks_until_stockout'] < 8].copy()
+        Returns:
+            tuple: (alerts of the shards that ran, in detector order, and
+                timings as run_detectors returns them summed over the shards,
+                with each failed detector's shard in 'failed_detectors', plus
+                'shards' (trials, alerts, seconds, attempts and error per
+                shard), 'failed_shards' (shards that produced no result) and
+                'round_trips' made by the workers)
+        """
+        if self.source is not None:
+            raise ValueError("Sharded runs read from the database; run a file source unsharded")
 
-            # Categorize severity
-            shortfalls.loc[:, 'severity'] = 'MEDIUM'
-            shortfalls.loc[shortfalls['weeks_until_stockout'] < 4, 'severity'] = 'HIGH'
-            shortfalls.loc[shortfalls['weeks_until_stockout'] < 2, 'severity'] = 'CRITICAL'
+        shards = plan_shards(self.engine, by or self.sharding, shard_count)
+        settings = {
+            'shortfall_engine': self.shortfall_engine,
+            'detectors': self.detectors,
+            'demand_model': self.demand_model,
+            'projection': self.projection,
+        }
+        workers = workers or Config.WATCHDOG_SHARD_WORKERS
+        print(f"Running {len(shards)} shards on {min(workers, len(shards))} worker processes...")
+        results, errors, attempts = run_shards(shards, settings, workers=workers, retries=retries)
 
-            alerts = []
-            for _, row in shortfalls.iterrows():
-                shortage_date = datetime.now() + timedelta(weeks=row['weeks_until_stockout'])
-
-                alert = {
-                    'alert_type': 'SHORTFALL_PREDICTION',
-                    'severity': row['severity'],
-                    'trial_alias': row['trial_alias'],
-                    'location': row['location'],
-                    'material_description': row['material'],
-                    'current_quantity': float(row['total_stock']),
-                    'weekly_consumption_rate': float(row['packages_per_week']),
-                    'weeks_until_stockout': float(row['weeks_until_stockout']),
-                    'projected_shortage_date': shortage_date.date(),
-                    'details': {
-                        'total_patients': int(row['total_patients']) if pd.notna(row['total_patients']) else None,
-                        'visits_per_month': float(row['visits_per_month']) if pd.notna(row['visits_per_month']) else None
-                    }
-                }
+        order = {detector.alert_type: i for i, detector in enumerate(get_detectors(self.detectors))}
+        alerts = sorted(
+            (alert for shard in shards if shard['name'] in results for alert in results[shard['name']]['alerts']),
+            key=lambda alert: order.get(alert['alert_type'], len(order))
+        )
+
+        summed = ('datasets', 'detectors', 'dataset_rows', 'detector_alerts')
+        timings = {group: {} for group in summed + ('detector_errors',)}
+        timings['failed_detectors'] = []
+        for shard in shards:
+            result = results.get(shard['name'])
+            if result is None:
+                continue
+            for group in summed:
+                for name, value in result['timings'][group].items():
+                    timings[group][name] = timings[group].get(name, 0) + value
+            for name, error in result['timings']['detector_errors'].items():
+                timings['detector_errors'][name] = f"{shard['name']}: {error}"
+            for failed in result['timings']['failed_detectors']:
+                timings['failed_detectors'].append(dict(failed, shard=shard))
+        for group in ('datasets', 'detectors'):
+            timings[group] = {name: round(seconds, 3) for name, seconds in timings[group].items()}
 
-                # Generate recommendation
-                weeks = row['weeks_until_stockout']
-                if row['severity'] == 'CRITICAL':
-                    alert['recommended_action'] = f"URGENT: Initiate emergency order for {row['trial_alias']} at {row['location']} - stockout in {weeks:.1f} weeks"
-                elif row['severity'] == 'HIGH':
-                    alert['recommended_action'] = f"Expedite regular order for {row['trial_alias']} at {row['location']} - stockout in {weeks:.1f} weeks"
-                else:
-                    alert['recommended_action'] = f"Plan replenishment for {row['trial_alias']} at {row['location']} - stockout in {weeks:.1f} weeks"
+        timings['shards'] = {
+            shard['name']: {
+                'trials': 'all others' if shard.get('exclude') else len(shard['trials']),
+                'alerts': len(results[shard['name']]['alerts']) if shard['name'] in results else None,
+                'seconds': results[shard['name']]['seconds'] if shard['name'] in results else None,
+                'attempts': attempts[shard['name']],
+                'error': errors.get(shard['name']),
+            }
+            for shard in shards
+        }
+        timings['failed_shards'] = [shard for shard in shards if shard['name'] not in results]
+        timings['round_trips'] = sum(result['round_trips'] for result in results.values())
+        return alerts, timings
 
-                alerts.append(alert)
+    def save_findings(self, alerts, method=None, page_size=None):
+        """
+        Save alerts to watchdog_findings table.
 
-            print(f"✓ Detected {len(alerts)} shortfall predictions")
-            return alerts
+        All alerts of a run share one run_timestamp and are written in bulk:
+        either streamed with a single COPY ('copy'), or as an executemany that
+        SQLAlchemy sends as multi-row INSERT ... VALUES statements of
+        page_size rows each ('values').
 
-        except Exception as e:
-            print(f"✗ Error detecting shortfall predictions: {e}")
-            return []
+        Args:
+            alerts (list): Alert dicts produced by the detectors
+            method (str): 'copy' or 'values'. Uses Config.FINDINGS_WRITE_METHOD if None.
+            page_size (int): Rows per INSERT statement for 'values'. Uses
+                Config.FINDINGS_INSERT_PAGE_SIZE if None.
 
-    def save_findings(self, alerts):
-        """Save alerts to watchdog_findings table."""
+        Returns:
+            int: Number of alerts saved
+        """
         if not alerts:
             print("No alerts to save")
             return 0
 
-        run_timestamp = datetime.now()
-        saved_count = 0
+        rows = self._finding_rows(alerts, datetime.now())
 
         try:
-            with self.engine.connect() as conn:
-                for alert in alerts:
-                    insert_query = text("""
-                        INSERT INTO watchdog_findings (
-                            run_timestamp, alert_type, severity, trial_alias, location,
-                            batch_lot, material_description, expiry_date, days_until_expiry,
-                            current_quantity, projected_shortage_date, weekly_consumption_rate,
-                            weeks_until_stockout, details, recommended_action
-                        ) VALUES (
-                            :run_timestamp, :alert_type, :severity, :trial_alias, :location,
-                            :batch_lot, :material_description, :expiry_date, :days_until_expiry,
-                            :current_quantity, :projected_shortage_date, :weekly_consumption_rate,
-                            :weeks_until_stockout, :details, :recommended_action
-                        )
-                    """)
-
-                    conn.execute(insert_query, {
-                        'run_timestamp': run_timestamp,
-                        'alert_type': alert.get('alert_type'),
-                        'severity': alert.get('severity'),
-                        'trial_alias': alert.get('trial_alias'),
-                        'location': alert.get('location'),
-                        'batch_lot': alert.get('batch_lot'),
-                        'material_description': alert.get('material_description'),
-                        'expiry_date': alert.get('expiry_date'),
-                        'days_until_expiry': alert.get('days_until_expiry'),
-                        'current_quantity': alert.get('current_quantity'),
-                        'projected_shortage_date': alert.get('projected_shortage_date'),
-                        'weekly_consumption_rate': alert.get('weekly_consumption_rate'),
-                        'weeks_until_stockout': alert.get('weeks_until_stockout'),
-                        'details': json.dumps(alert.get('details', {})),
-                        'recommended_action': alert.get('recommended_action')
-                    })
-                    saved_count += 1
-
-                conn.commit()
-
-            print(f"✓ Saved {saved_count} alerts to database")
-            return saved_count
+            # engine.begin() commits on the DBAPI connection, which also covers
+            # the COPY sent through the raw cursor
+            with self.engine.begin() as conn:
+                self._write_findings(conn, FINDINGS_TABLE, rows, method, page_size)
+
+            print(f"✓ Saved {len(rows)} alerts to database")
+            return len(rows)
 
         except Exception as e:
             print(f"✗ Error saving findings: {e}")
             return 0
 
-    def generate_json_payload(self, alerts):
-        """Generate JSON payload for email system."""
-        run_id = f"WD-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}"
+    def _finding_rows(self, alerts, run_timestamp):
+        """Map alerts to watchdog_findings rows."""
+        return [
+            {
+                'run_timestamp': run_timestamp,
+                'alert_type': alert.get('alert_type'),
+                'severity': alert.get('severity'),
+                'trial_alias': alert.get('trial_alias'),
+                'location': alert.get('location'),
+                'batch_lot': alert.get('batch_lot'),
+                'material_description': alert.get('material_description'),
+                'expiry_date': alert.get('expiry_date'),
+                'days_until_expiry': alert.get('days_until_expiry'),
+                'current_quantity': alert.get('current_quantity'),
+                'projected_shortage_date': alert.get('projected_shortage_date'),
+                'weekly_consumption_rate': alert.get('weekly_consumption_rate'),
+                'weeks_until_stockout': alert.get('weeks_until_stockout'),
+                'details': json.dumps(alert.get('details', {})),
+                'recommended_action': alert.get('recommended_action')
+            }
+            for alert in alerts
+        ]
+
+    def _write_findings(self, conn, findings_table, rows, method=None, page_size=None):
+        """Bulk-insert findings rows on conn with COPY or multi-row INSERTs."""
+        method = method or Config.FINDINGS_WRITE_METHOD
+        page_size = page_size or Config.FINDINGS_INSERT_PAGE_SIZE
+        columns = [c.name for c in findings_table.columns]
+
+        if method == 'copy':
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(copy_text_value(row[c]) for c in columns))
+                buffer.write('\n')
+            buffer.seek(0)
+            conn.connection.cursor().copy_expert(
+                f"COPY watchdog_findings ({', '.join(columns)}) FROM STDIN",
+                buffer
+            )
+            # The raw cursor bypasses the statement counter of RunMetrics
+            if self.metrics is not None:
+                self.metrics.add_round_trips(1)
+        else:
+            conn.execution_options(insertmanyvalues_page_size=page_size).execute(
+                insert(findings_table), rows
+            )
+
+    def alert_key(self, alert):
+        """Stable identity of an alert across runs, from its detector."""
+        for detector in get_detectors(self.detectors):
+            if detector.alert_type == alert['alert_type']:
+                return detector.alert_key(alert)
+        return Detector().alert_key(alert)
+
+    def sync_findings(self, alerts, failed_shards=(), failed_detectors=()):
+        """
+        Diff the alerts against the open findings instead of appending them.
+
+        Each alert is matched to an open finding by its alert key. New keys
+        are inserted as OPEN findings, open findings whose severity changed
+        are updated in place (keeping their acknowledged state), unchanged
+        ones only get last_seen_at bumped, and open findings no longer
+        reported are marked RESOLVED. The table lock serializes concurrent
+        syncs so a key is never opened twice.
+
+        Args:
+            alerts (list): Alert dicts produced by the detectors
+            failed_shards (list): Shards of a sharded run that failed; open
+                findings of their trials are left as they are, not resolved
+            failed_detectors (list): {'alert_type', 'shard'} of detectors
+                that failed, in that shard or everywhere when shard is None;
+                their open findings are left as they are too
+
+        Returns:
+            dict: 'new' and 'changed' alert dicts (changed ones carry
+                previous_severity and acknowledged), 'resolved' finding dicts,
+                and the 'unchanged' and 'open' counts
+        """
+        run_timestamp = datetime.now()
+
+        # Keep the most severe alert per key
+        current = {}
+        for alert in alerts:
+            key = self.alert_key(alert)
+            kept = current.get(key)
+            if kept is None or SEVERITY_RANK.get(alert['severity'], 99) < SEVERITY_RANK.get(kept['severity'], 99):
+                current[key] = dict(alert, alert_key=key)
 
-        # Categorize alerts
-        expiry_critical = [a for a in alerts if a['alert_type'] == 'EXPIRY_ALERT' and a['severity'] == 'CRITICAL']
-        expiry_high = [a for a in alerts if a['alert_type'] == 'EXPIRY_ALERT' and a['severity'] == 'HIGH']
-        expiry_medium = [a for a in alerts if a['alert_type'] == 'EXPIRY_ALERT' and a['severity'] == 'MEDIUM']
+        changes = {'new': [], 'changed': [], 'resolved': [], 'unchanged': 0, 'open': len(current)}
 
-        shortfall_critical = [a for a in alerts if a['alert_type'] == 'SHORTFALL_PREDICTION' and a['severity'] == 'CRITICAL']
-        shortfall_high = [a for a in alerts if a['alert_type'] == 'SHORTFALL_PREDICTION' and a['severity'] == 'HIGH']
-        shortfall_medium = [a for a in alerts if a['alert_type'] == 'SHORTFALL_PREDICTION' and a['severity'] == 'MEDIUM']
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("LOCK TABLE watchdog_findings IN SHARE ROW EXCLUSIVE MODE"))
+                open_rows = conn.execute(text("""
+                    SELECT id, alert_key, alert_type, severity, trial_alias, location,
+                           batch_lot, material_description, acknowledged
+                    FROM watchdog_findings
+                    WHERE status = 'OPEN'
+                    ORDER BY id
+                """)).mappings().all()
+
+                open_findings = {}
+                for row in open_rows:
+                    if row['alert_key'] in current and row['alert_key'] not in open_findings:
+                        open_findings[row['alert_key']] = row
+                    elif not any(
+                        in_shard_trial(row['trial_alias'], shard) for shard in failed_shards
+                    ) and not any(
+                        row['alert_type'] == failed['alert_type']
+                        and (failed['shard'] is None or in_shard_trial(row['trial_alias'], failed['shard']))
+                        for failed in failed_detectors
+                    ):
+                        changes['resolved'].append(dict(row))
+
+                unchanged_ids = []
+                for key, alert in current.items():
+                    finding = open_findings.get(key)
+                    if finding is None:
+                        changes['new'].append(dict(alert, change='NEW'))
+                    elif finding['severity'] != alert['severity']:
+                        changes['changed'].append(dict(
+                            alert,
+                            change='CHANGED',
+                            finding_id=finding['id'],
+                            previous_severity=finding['severity'],
+                            acknowledged=finding['acknowledged']
+                        ))
+                    else:
+                        unchanged_ids.append(finding['id'])
+                changes['unchanged'] = len(unchanged_ids)
+
+                if changes['new']:
+                    rows = self._finding_rows(changes['new'], run_timestamp)
+                    for row, alert in zip(rows, changes['new']):
+                        row.update(alert_key=alert['alert_key'], status='OPEN', last_seen_at=run_timestamp)
+                    self._write_findings(conn, STATEFUL_FINDINGS_TABLE, rows)
+
+                if changes['changed']:
+                    rows = self._finding_rows(changes['changed'], run_timestamp)
+                    params = {'seen_at': run_timestamp, 'ids': [a['finding_id'] for a in changes['changed']]}
+                    for name in (
+                        'severity', 'days_until_expiry', 'current_quantity', 'projected_shortage_date',
+                        'weekly_consumption_rate', 'weeks_until_stockout', 'details', 'recommended_action'
+                    ):
+                        params[name] = [row[name] for row in rows]
+                    conn.execute(UPDATE_CHANGED_FINDINGS, params)
+
+                if unchanged_ids:
+                    conn.execute(
+                        text("UPDATE watchdog_findings SET last_seen_at = :seen_at WHERE id = ANY(:ids)"),
+                        {'seen_at': run_timestamp, 'ids': unchanged_ids}
+                    )
+
+                if changes['resolved']:
+                    conn.execute(
+                        text("""
+                            UPDATE watchdog_findings SET status = 'RESOLVED', resolved_at = :resolved_at
+                            WHERE id = ANY(:ids)
+                        """),
+                        {'resolved_at': run_timestamp, 'ids': [row['id'] for row in changes['resolved']]}
+                    )
 
-        total_critical = len(expiry_critical) + len(shortfall_critical)
-        total_high = len(expiry_high) + len(shortfall_high)
-        total_medium = len(expiry_medium) + len(shortfall_medium)
+            print(
+                f"✓ Findings synced: {len(changes['new'])} new, {len(changes['changed'])} changed, "
+                f"{len(changes['resolved'])} resolved, {changes['unchanged']} unchanged"
+            )
 
-        # Convert date objects to strings for JSON serialization
-        def serialize_alert(alert):
-            serialized = alert.copy()
-            if 'expiry_date' in serialized and serialized['expiry_date']:
-                serialized['expiry_date'] = serialized['expiry_date'].isoformat()
-            if 'projected_shortage_date' in serialized and serialized['projected_shortage_date']:
-                serialized['projected_shortage_date'] = serialized['projected_shortage_date'].isoformat()
-            return serialized
+        except Exception as e:
+            print(f"✗ Error syncing findings: {e}")
+
+        return changes
+
+    def bucket_alerts(self, alerts):
+        """
+        Count alerts by severity and bucket them in a single pass.
+
+        Buckets hold references to the alert dicts, not copies.
+
+        Returns:
+            tuple: (dict of severity -> count, dict of payload key ->
+                severity -> list of alerts)
+        """
+        severity_counts = {severity: 0 for severity in SEVERITIES}
+        buckets = {}
+        bucket_by_type = {}
+        for detector in get_detectors(self.detectors):
+            buckets[detector.payload_key] = {severity: [] for severity in SEVERITIES}
+            bucket_by_type[detector.alert_type] = buckets[detector.payload_key]
+
+        for alert in alerts:
+            severity = alert['severity']
+            if severity in severity_counts:
+                severity_counts[severity] += 1
+                bucket = bucket_by_type.get(alert['alert_type'])
+                if bucket is not None:
+                    bucket[severity].append(alert)
+
+        return severity_counts, buckets
+
+    def build_payload(self, alerts, serialize=True):
+        """
+        Build the payload for the email system.
+
+        Args:
+            alerts (list): Alerts to report
+            serialize (bool): Copy each alert with its dates as ISO strings.
+                Without it the payload references the alert dicts as they
+                are, for write_json_payload to encode while streaming.
+
+        Returns:
+            dict: Payload
+        """
+        run_id = f"WD-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}"
+        severity_counts, buckets = self.bucket_alerts(alerts)
 
         payload = {
             "run_id": run_id,
             "run_timestamp": datetime.now().isoformat(),
             "summary": {
                 "total_alerts": len(alerts),
-                "critical": total_critical,
-                "high": total_high,
-                "medium": total_medium
-            },
-            "expiry_alerts": {
-                "critical": [serialize_alert(a) for a in expiry_critical],
-                "high": [serialize_alert(a) for a in expiry_high],
-                "medium": [serialize_alert(a) for a in expiry_medium]
-            },
-            "shortfall_predictions": {
-                "critical": [serialize_alert(a) for a in shortfall_critical],
-                "high": [serialize_alert(a) for a in shortfall_high],
-                "medium": [serialize_alert(a) for a in shortfall_medium]
+                **{severity.lower(): count for severity, count in severity_counts.items()}
             }
         }
 
+        for payload_key, bucket in buckets.items():
+            payload[payload_key] = {
+                severity.lower(): [serialize_alert(a) for a in bucket[severity]] if serialize else bucket[severity]
+                for severity in SEVERITIES
+            }
+
         return payload
 
+    def generate_json_payload(self, alerts):
+        """Generate JSON payload for email system."""
+        return self.build_payload(alerts, serialize=True)
+
+    def write_json_payload(self, payload, output_file, compact=None, compress=None):
+        """
+        Stream the payload to a JSON file.
+
+        json.dump encodes the payload incrementally, converting dates as it
+        goes, so no serialized copy of the alerts is held in memory.
+
+        Args:
+            payload (dict): Payload from build_payload
+            output_file (str): Path to write; '.gz' is appended when compressed
+            compact (bool): No indentation or spaces. Uses
+                Config.PAYLOAD_COMPACT if None.
+            compress (bool): Write gzip. Uses Config.PAYLOAD_GZIP if None.
+
+        Returns:
+            str: Path written
+        """
+        compact = Config.PAYLOAD_COMPACT if compact is None else compact
+        compress = Config.PAYLOAD_GZIP if compress is None else compress
+        options = {'separators': (',', ':')} if compact else {'indent': 2}
+
+        if compress:
+            output_file += '.gz'
+            f = gzip.open(output_file, 'wt', encoding='utf-8')
+        else:
+            f = open(output_file, 'w', buffering=1024 * 1024)
+
+        with f:
+            json.dump(payload, f, default=json_default, **options)
+
+        return output_file
+
+    def diagnose_queries(self, run_id=None):
+        """
+        EXPLAIN ANALYZE the dataset queries of this watchdog's detectors.
+
+        Plans are stored in watchdog_query_plans and a report is printed;
+        failures are reported without failing the run.
+
+        Args:
+            run_id (str): Run the plans belong to
+
+        Returns:
+            dict: Dataset name -> execution_ms and flags
+        """
+        try:
+            names = self.required_datasets(get_detectors(self.detectors))
+            results = capture_plans(self.engine, names, usable_watchdog_views(self.engine), run_id=run_id)
+        except Exception as e:
+            print(f"✗ Error capturing query plans: {e}")
+            return {}
+
+        print_query_report(results)
+        return {
+            name: {'execution_ms': result.get('execution_ms'), 'flags': result['flags']}
+            for name, result in results.items()
+        }
+
     def run(self):
-        """Execute the watchdog monitoring cycle."""
+        """
+        Execute the watchdog monitoring cycle.
+
+        The JSON file is streamed from the alert dicts as they are; the
+        returned payload has the same shape as generate_json_payload, with
+        dates as ISO strings. Stage timings, rows fetched per dataset, alerts
+        per detector and database round trips are collected in a RunMetrics
+        and published to watchdog_runs and the metrics file, also when the
+        run fails. The payload's run_metrics is a snapshot taken before the
+        file is written, so it excludes the write_payload stage and the
+        final duration; watchdog_runs and the metrics file have both. A run
+        where a detector failed is recorded as 'partial' and the open
+        findings of that detector are kept open rather than resolved, as
+        are those of a sharded run's shards that still failed after their
+        retries.
+        """
         print("\n" + "=" * 60)
         print("Supply Watchdog - Starting Monitoring Cycle")
         print("=" * 60)
 
-        # Detect expiry alerts
-        print("\n1. Checking for expiring batches...")
-        expiry_alerts = self.detect_expiry_alerts()
+        metrics = RunMetrics('watchdog')
+        metrics.track_engine(self.engine)
+        self.metrics = metrics
+        try:
+            payload = self._run_cycle(metrics)
+            metrics.finish('partial' if payload['failed_shards'] or payload['failed_detectors'] else 'success')
+        except Exception:
+            metrics.finish('failed')
+            raise
+        finally:
+            self.metrics = None
+            metrics.publish(self.engine)
 
-        # Detect shortfall predictions
-        print("\n2. Analyzing inventory shortfall predictions...")
-        shortfall_alerts = self.detect_shortfall_predictions()
+        print("\n" + "=" * 60)
+        print("Supply Watchdog - Monitoring Cycle Complete")
+        print("=" * 60)
 
-        # Combine all alerts
-        all_alerts = expiry_alerts + shortfall_alerts
+        return payload
+
+    def _run_cycle(self, metrics):
+        """Detect, record and report the alerts of one run, timing each stage."""
+        # Run all registered detectors over one shared data fetch
+        print("\n1. Running detectors...")
+        failed_shards = []
+        with metrics.stage('detect'):
+            if self.sharding != 'none':
+                all_alerts, timings = self.run_sharded_detectors()
+                failed_shards = timings['failed_shards']
+            else:
+                all_alerts, timings = self.run_detectors()
 
-        print(f"\n3. Total alerts detected: {len(all_alerts)}")
+        for name, seconds in timings['detectors'].items():
+            print(f"  {name}: {seconds:.3f}s")
+        if 'shards' in timings:
+            for name, shard in timings['shards'].items():
+                metrics.record('shard_attempts', name, shard['attempts'])
+                if shard['error'] is None:
+                    metrics.record('shard_seconds', name, shard['seconds'])
+                    metrics.record('shard_alerts', name, shard['alerts'])
+            metrics.set('failed_shards', len(failed_shards))
+            metrics.add_round_trips(timings['round_trips'])
+            if failed_shards:
+                print(f"✗ {len(failed_shards)} shard(s) failed; their findings are left as they were")
+        failed_detectors = timings['failed_detectors']
+        metrics.set('failed_detectors', len(failed_detectors))
+        if failed_detectors:
+            print(f"✗ {len(failed_detectors)} detector run(s) failed; their findings are left as they were")
+        for group, values in (
+            ('dataset_seconds', timings['datasets']), ('dataset_rows', timings['dataset_rows']),
+            ('detector_seconds', timings['detectors']), ('detector_alerts', timings['detector_alerts']),
+        ):
+            for name, value in values.items():
+                metrics.record(group, name, value)
+        metrics.set('rows_fetched', sum(timings['dataset_rows'].values()))
+        metrics.set('alerts', len(all_alerts))
 
-        # Save to database
-        print("\n4. Saving findings to database...")
-        self.save_findings(all_alerts)
+        print(f"\n2. Total alerts detected: {len(all_alerts)}")
+
+        # Save to database; in stateful mode only changes are written and reported
+        changes = None
+        try:
+            ensure_partitions(self.engine, Config.FINDINGS_PARTITION_MONTHS_AHEAD)
+        except Exception as e:
+            print(f"✗ Error creating findings partitions: {e}")
+        if self.findings_mode == 'stateful':
+            print("\n3. Syncing findings with the open alerts...")
+            with metrics.stage('sync_findings'):
+                changes = self.sync_findings(all_alerts, failed_shards, failed_detectors)
+            reported = changes['new'] + changes['changed']
+        else:
+            print("\n3. Saving findings to database...")
+            with metrics.stage('save_findings'):
+                self.save_findings(all_alerts)
+            reported = all_alerts
 
         # Generate JSON payload
-        print("\n5. Generating JSON payload...")
-        payload = self.generate_json_payload(all_alerts)
+        print("\n4. Generating JSON payload...")
+        with metrics.stage('build_payload'):
+            payload = self.build_payload(reported, serialize=False)
+        metrics.run_id = payload['run_id']
+        if changes is not None:
+            payload['changes'] = {
+                'new': len(changes['new']),
+                'changed': len(changes['changed']),
+                'resolved': len(changes['resolved']),
+                'unchanged': changes['unchanged'],
+                'open': changes['open'],
+            }
+            payload['resolved_alerts'] = changes['resolved']
+        payload['detector_timings'] = timings['detectors']
+        payload['dataset_timings'] = timings['datasets']
+        payload['failed_shards'] = [shard['name'] for shard in failed_shards]
+        payload['failed_detectors'] = [
+            {'alert_type': failed['alert_type'], 'shard': failed['shard']['name'] if failed['shard'] else None}
+            for failed in failed_detectors
+        ]
+        if 'shards' in timings:
+            payload['shards'] = timings['shards']
+
+        if Config.QUERY_DIAGNOSTICS:
+            with metrics.stage('query_diagnostics'):
+                payload['query_diagnostics'] = self.diagnose_queries(payload['run_id'])
+
+        # Everything up to writing the file itself: the file cannot hold the
+        # time taken to write it (see run())
+        metrics.set('peak_memory_mb', peak_memory_mb())
+        payload['run_metrics'] = metrics.as_dict()
 
         # Save JSON to file
         output_file = f"watchdog_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(output_file, 'w') as f:
-            json.dump(payload, f, indent=2)
+        with metrics.stage('write_payload'):
+            output_file = self.write_json_payload(payload, output_file)
 
         print(f"✓ JSON payload saved to: {output_file}")
 
-        print("\n" + "=" * 60)
-        print("Supply Watchdog - Monitoring Cycle Complete")
-        print("=" * 60)
-
+        # Same shape as generate_json_payload for callers of run()
+        for detector in get_detectors(self.detectors):
+            payload[detector.payload_key] = {
+                severity: [serialize_alert(alert) for alert in alerts]
+                for severity, alerts in payload[detector.payload_key].items()
+            }
         return payload
 
     def close(self):
-        """Close database connection."""
-        if self.engine:
-            self.engine.dispose()
+        """
+        Release the watchdog.
+
+        The shared engine is left open so later runs reuse its warm
+        connections; call Config.dispose_engines() at process exit.
+        """
 
 
 if __name__ == "__main__":
@@ -346,3 +1358,4 @@ if __name__ == "__main__":
         watchdog.run()
     finally:
         watchdog.close()
+        Config.dispose_engines()
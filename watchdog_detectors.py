@@ -0,0 +1,250 @@
+"""
+Detector plugin interface for the Supply Watchdog.
+
+A detector declares the datasets it reads. For each run the watchdog fetches
+every dataset needed by its detectors exactly once and hands the same snapshot
+to all of them. This keeps the number of queries per run flat as checks are
+added. To add a risk check, register a Detector subclass and any new datasets;
+SupplyWatchdog.run and the JSON payload pick it up without further edits.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import time
+import pandas as pd
+from metrics import submit_in_context
+
+
+# Alert severities, in payload order
+SEVERITIES = ('CRITICAL', 'HIGH', 'MEDIUM')
+
+# Registered datasets and detector classes, by name (in registration order)
+DATASETS = {}
+DETECTORS = {}
+
+
+class Dataset:
+    """A named query result that detectors can share."""
+
+    def __init__(self, name, query, view=None, view_query=None, frame=None, tables=None, trial_column=None):
+        """
+        Args:
+            name (str): Dataset name referenced by detectors
+            query: SQL string, or a callable taking the set of usable
+                watchdog views and returning the SQL
+            view (str): Materialized view that can replace the query
+            view_query: SQL (or callable) used when the view is usable
+            frame (callable): pandas equivalent of the query, taking a
+                data_sources.FileSource and returning the same rows
+            tables (list): Loaded tables the query reads. Marks reference
+                data, which DatabaseSource caches until one of them is reloaded.
+            trial_column (str): Column holding the trial of each row. Sharded
+                runs read only the rows of their shard's trials; datasets
+                without it are read whole by every shard.
+        """
+        self.name = name
+        self.query = query
+        self.view = view
+        self.view_query = view_query
+        self.frame = frame
+        self.tables = tables
+        self.trial_column = trial_column
+
+    def build_query(self, usable_views, shard=None):
+        """
+        Return the SQL for this dataset, preferring its view when usable.
+
+        With a shard, the rows are limited to the shard's trials, bound as
+        the %(trials)s parameter.
+        """
+        query = self.view_query if self.view and self.view in usable_views else self.query
+        query = query(usable_views) if callable(query) else query
+        if shard is None or self.trial_column is None:
+            return query
+        condition = f"{self.trial_column} = ANY(%(trials)s)"
+        if shard.get('exclude'):
+            condition = f"({condition}) IS NOT TRUE"
+        return f"SELECT * FROM ({query}) shard_rows WHERE {condition}"
+
+    def fetch(self, engine, usable_views, shard=None):
+        """Read the dataset, or the rows of a shard's trials, into a DataFrame."""
+        if shard is None or self.trial_column is None:
+            return pd.read_sql(self.build_query(usable_views), engine)
+        return pd.read_sql(
+            self.build_query(usable_views, shard), engine, params={'trials': list(shard['trials'])}
+        )
+
+
+def register_dataset(name, query, view=None, view_query=None, frame=None, tables=None, trial_column=None):
+    """
+    Register a dataset detectors can declare as a requirement.
+
+    Returns:
+        Dataset: The registered dataset
+    """
+    DATASETS[name] = Dataset(
+        name, query, view=view, view_query=view_query, frame=frame, tables=tables, trial_column=trial_column
+    )
+    return DATASETS[name]
+
+
+def in_shard(trials, shard):
+    """
+    Mask of the rows belonging to a shard.
+
+    Args:
+        trials (Series): Trial of each row
+        shard (dict): 'trials' list, and 'exclude' for the shard of every
+            other trial (rows without a trial included)
+
+    Returns:
+        Series: Boolean mask
+    """
+    mask = trials.isin(shard['trials'])
+    return ~mask if shard.get('exclude') else mask
+
+
+def in_shard_trial(trial, shard):
+    """Whether one trial (possibly None) belongs to a shard; see in_shard."""
+    return (trial in shard['trials']) != bool(shard.get('exclude'))
+
+
+class Detector:
+    """
+    Base class of watchdog detectors.
+
+    Subclasses set the class attributes and implement detect(). Datasets in
+    the snapshot are shared with other detectors and must not be modified in
+    place; copy a DataFrame before adding columns to it.
+    """
+
+    # Registry name, text printed before and after the check runs
+    name = None
+    description = None
+    label = None
+    # alert_type of the alerts produced and their key in the JSON payload
+    alert_type = None
+    payload_key = None
+    # Names of the registered datasets the detector reads
+    datasets = ()
+
+    def required_datasets(self, watchdog):
+        """
+        Datasets needed for this run; override when they depend on settings.
+
+        Args:
+            watchdog: SupplyWatchdog running the detector
+
+        Returns:
+            list: Dataset names
+        """
+        return list(self.datasets)
+
+    def optional_datasets(self, watchdog):
+        """
+        Datasets that enrich the alerts when available; override when used.
+
+        They are fetched with the required ones, but the detector still runs
+        when one of them fails to load and only gets those that loaded.
+
+        Args:
+            watchdog: SupplyWatchdog running the detector
+
+        Returns:
+            list: Dataset names
+        """
+        return []
+
+    def alert_key(self, alert):
+        """
+        Stable identity of an alert across runs, used by stateful findings.
+
+        Defaults to the alert type, trial, location and batch (or material
+        when there is no batch).
+
+        Returns:
+            str: Alert key
+        """
+        parts = [
+            alert.get('alert_type'),
+            alert.get('trial_alias'),
+            alert.get('location'),
+            alert.get('batch_lot') or alert.get('material_description'),
+        ]
+        return '|'.join('' if part is None else str(part) for part in parts)
+
+    def detect(self, data, watchdog):
+        """
+        Produce alerts from the shared snapshot.
+
+        Args:
+            data (dict): Dataset name -> DataFrame, for the required datasets
+                and the optional ones that loaded
+            watchdog: SupplyWatchdog running the detector
+
+        Returns:
+            list: Alert dicts
+        """
+        raise NotImplementedError
+
+
+def register_detector(cls):
+    """Class decorator adding a Detector subclass to the registry."""
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+def get_detectors(names=None):
+    """
+    Instantiate registered detectors.
+
+    Args:
+        names (list): Detector names, or None for all in registration order
+
+    Returns:
+        list: Detector instances
+    """
+    if names is None:
+        names = list(DETECTORS)
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Unknown detector(s): {', '.join(unknown)}")
+    return [DETECTORS[name]() for name in names]
+
+
+def fetch_snapshot(source, names, workers=1):
+    """
+    Fetch each named dataset once.
+
+    Args:
+        source: Data source with a fetch(dataset) method, e.g.
+            data_sources.DatabaseSource or data_sources.FileSource
+        names (list): Dataset names to fetch
+        workers (int): Number of datasets fetched concurrently
+
+    Returns:
+        tuple: (dict of name -> DataFrame, dict of name -> error message,
+            dict of name -> wall seconds)
+    """
+    def fetch(name):
+        start = time.perf_counter()
+        try:
+            return source.fetch(DATASETS[name]), None, time.perf_counter() - start
+        except Exception as e:
+            return None, str(e), time.perf_counter() - start
+
+    if workers > 1 and len(names) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(names))) as executor:
+            futures = {name: submit_in_context(executor, fetch, name) for name in names}
+            results = {name: future.result() for name, future in futures.items()}
+    else:
+        results = {name: fetch(name) for name in names}
+
+    data, errors, timings = {}, {}, {}
+    for name in names:
+        frame, error, seconds = results[name]
+        if error is None:
+            data[name] = frame
+        else:
+            errors[name] = error
+        timings[name] = round(seconds, 3)
+
+    return data, errors, timings
@@ -4,8 +4,11 @@ Scheduler for Supply Watchdog - Runs daily monitoring automatically.
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
+from config import Config
+from findings_partitions import apply_retention, ensure_partitions
 from watchdog_core import SupplyWatchdog
 import logging
+import sys
 
 # Set up logging
 logging.basicConfig(
@@ -27,6 +30,8 @@ def run_watchdog_job():
     logger.info("=" * 60)
 
     try:
+        # SupplyWatchdog runs on the process-wide engine, so each job reuses
+        # the pooled connections warmed up by earlier runs
         watchdog = SupplyWatchdog()
         payload = watchdog.run()
         watchdog.close()
@@ -38,11 +43,54 @@ def run_watchdog_job():
         logger.info(f"  Critical: {summary['critical']}")
         logger.info(f"  High: {summary['high']}")
         logger.info(f"  Medium: {summary['medium']}")
+        run_metrics = payload['run_metrics']
+        stages = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in run_metrics['stage_seconds'].items())
+        logger.info(f"  Stages: {stages}")
+        logger.info(f"  Round trips: {run_metrics['round_trips']}, peak memory: {run_metrics['peak_memory_mb']} MB")
+        if 'shards' in payload:
+            logger.info(f"  Shards: {len(payload['shards'])}, failed: {', '.join(payload['failed_shards']) or 'none'}")
+        for failed in payload['failed_detectors']:
+            logger.warning(f"  Detector failed: {failed['alert_type']} (shard: {failed['shard'] or 'all'})")
 
     except Exception as e:
         logger.error(f"Watchdog job failed: {e}", exc_info=True)
 
 
+def run_retention_job():
+    """Create upcoming findings partitions and archive expired ones."""
+    try:
+        created = ensure_partitions(Config.get_engine(), Config.FINDINGS_PARTITION_MONTHS_AHEAD)
+        if created:
+            logger.info(f"Created findings partitions: {', '.join(created)}")
+
+        status = apply_retention(
+            Config.get_engine(),
+            keep_months=Config.FINDINGS_RETENTION_MONTHS,
+            action=Config.FINDINGS_RETENTION_ACTION,
+            archive_dir=Config.FINDINGS_ARCHIVE_DIR
+        )
+        for partition, outcome in status.items():
+            logger.info(f"Retention: {partition} {outcome}")
+
+    except Exception as e:
+        logger.error(f"Retention job failed: {e}", exc_info=True)
+
+
+def check_database():
+    """
+    Startup health check of the shared database engine.
+
+    Returns:
+        bool: True if the database is reachable
+    """
+    ok, error = Config.check_connection()
+    if ok:
+        logger.info(f"Database health check passed ({Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME})")
+    else:
+        logger.error(f"Database health check failed: {error}")
+    return ok
+
+
 def start_scheduler(hour=8, minute=0):
     """
     Start the scheduler to run watchdog daily.
@@ -63,6 +111,16 @@ def start_scheduler(hour=8, minute=0):
         replace_existing=True
     )
 
+    # Partition maintenance shortly before the daily run (a no-op when
+    # watchdog_findings is not partitioned)
+    scheduler.add_job(
+        run_retention_job,
+        trigger=CronTrigger(hour=(hour - 1) % 24, minute=minute),
+        id='findings_retention',
+        name='Watchdog Findings Partition Maintenance',
+        replace_existing=True
+    )
+
     logger.info("=" * 60)
     logger.info("Supply Watchdog Scheduler Started")
     logger.info("=" * 60)
@@ -75,10 +133,16 @@ def start_scheduler(hour=8, minute=0):
     except KeyboardInterrupt:
         logger.info("\nScheduler stopped by user")
         scheduler.shutdown()
+    finally:
+        Config.dispose_engines()
 
 
 if __name__ == "__main__":
+    if not check_database():
+        sys.exit(1)
+
     # Run immediately on start, then schedule
+    run_retention_job()
     logger.info("Running initial watchdog check...")
     run_watchdog_job()
 
@@ -0,0 +1,192 @@
+"""
+Trial-sharded watchdog runs on a process pool.
+
+The trials are partitioned into shards, either balanced by their row counts
+('trial') or grouped by the region of the plant holding most of their stock
+('region'). Each shard runs the detectors in its own worker process over the
+rows of its trials: datasets registered with a trial_column are filtered in
+SQL, the others are read whole. A final shard takes every trial not in the
+plan (and rows without a trial), so no rows are missed when new trials
+appear between planning and reading.
+
+A shard fails when its worker raises or any of its detectors fails; failed
+shards are rerun on a fresh pool, without rerunning the shards that
+succeeded. When a detector still fails on the last attempt, the alerts of
+the shard's other detectors are kept and only that detector is reported as
+failed for the shard. SupplyWatchdog merges the shard alerts into one run
+record and one payload (see SupplyWatchdog.run_sharded_detectors).
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import heapq
+import os
+import time
+import pandas as pd
+from config import Config
+
+
+# Rows per trial in the main per-trial tables, and the region (plant code
+# without its number, e.g. EU02 -> EU) of the plant holding most of its stock
+TRIAL_WEIGHTS_QUERY = """
+WITH weights AS (
+    SELECT trial_alias, COUNT(*) as row_count FROM complete_warehouse_inventory GROUP BY trial_alias
+    UNION ALL
+    SELECT trial_alias, COUNT(*) FROM allocated_materials_to_orders GROUP BY trial_alias
+    UNION ALL
+    SELECT "Trial Alias", COUNT(*) FROM patient_status_and_treatment_report GROUP BY "Trial Alias"
+),
+regions AS (
+    SELECT trial_alias, MODE() WITHIN GROUP (ORDER BY regexp_replace(sap_plant, '[0-9]+$', '')) as region
+    FROM complete_warehouse_inventory
+    GROUP BY trial_alias
+)
+SELECT w.trial_alias, SUM(w.row_count) as weight, COALESCE(r.region, 'OTHER') as region
+FROM weights w
+LEFT JOIN regions r ON r.trial_alias = w.trial_alias
+WHERE w.trial_alias IS NOT NULL
+GROUP BY w.trial_alias, r.region
+ORDER BY weight DESC, w.trial_alias
+"""
+
+
+def plan_shards(engine, by='trial', count=None):
+    """
+    Partition the trials into shards.
+
+    Args:
+        engine: SQLAlchemy engine
+        by (str): 'trial' (balance trials by row count) or 'region'
+        count (int): Shards for 'trial'. Uses Config.WATCHDOG_SHARDS if None.
+
+    Returns:
+        list: Shard dicts with 'name', 'trials' and 'weight', followed by
+            the 'other' shard that excludes every planned trial
+    """
+    count = count or Config.WATCHDOG_SHARDS
+    trials = pd.read_sql(TRIAL_WEIGHTS_QUERY, engine)
+
+    if by == 'region':
+        shards = [
+            {'name': region, 'trials': group['trial_alias'].tolist(), 'weight': int(group['weight'].sum())}
+            for region, group in trials.groupby('region', sort=True)
+        ]
+    elif by == 'trial':
+        # Heaviest trial first onto the lightest shard
+        shards = [
+            {'name': f"shard-{i + 1}", 'trials': [], 'weight': 0}
+            for i in range(max(1, min(count, len(trials))))
+        ]
+        heap = [(0, i) for i in range(len(shards))]
+        for trial, weight in zip(trials['trial_alias'], trials['weight']):
+            total, i = heapq.heappop(heap)
+            shards[i]['trials'].append(trial)
+            shards[i]['weight'] += int(weight)
+            heapq.heappush(heap, (total + int(weight), i))
+        shards = [shard for shard in shards if shard['trials']]
+    else:
+        raise ValueError(f"Unknown sharding: {by}")
+
+    shards.append({'name': 'other', 'trials': trials['trial_alias'].tolist(), 'weight': 0, 'exclude': True})
+    return shards
+
+
+def _init_worker():
+    """Process pool initializer: drop the pooled connections inherited from the parent."""
+    Config.reset_engines_after_fork()
+
+
+def run_shard(shard, settings):
+    """
+    Run the detectors over one shard, in a worker process.
+
+    Args:
+        shard (dict): Shard from plan_shards
+        settings (dict): SupplyWatchdog keyword arguments (detectors,
+            shortfall_engine, demand_model, projection)
+
+    Returns:
+        dict: 'name', 'alerts', run_detectors 'timings' (with the failed
+            detectors in 'detector_errors'), wall 'seconds', 'round_trips'
+            and worker 'pid'
+    """
+    # Imported here: watchdog_core imports this module
+    from data_sources import DatabaseSource
+    from metrics import RunMetrics
+    from watchdog_core import SupplyWatchdog
+
+    start = time.perf_counter()
+    engine = Config.get_engine()
+    metrics = RunMetrics('shard')
+    metrics.track_engine(engine)
+    try:
+        watchdog = SupplyWatchdog(engine=engine, source=DatabaseSource(engine, shard=shard), **settings)
+        alerts, timings = watchdog.run_detectors()
+    finally:
+        metrics.finish()
+
+    return {
+        'name': shard['name'],
+        'alerts': alerts,
+        'timings': timings,
+        'seconds': round(time.perf_counter() - start, 3),
+        'round_trips': metrics.values['round_trips'],
+        'pid': os.getpid(),
+    }
+
+
+def run_shards(shards, settings, workers=None, retries=None):
+    """
+    Run shards on a process pool, rerunning the failed ones.
+
+    Each retry round starts a fresh pool with only the shards that failed,
+    so a worker that crashed (breaking its pool) costs one round.
+
+    Args:
+        shards (list): Shards from plan_shards
+        settings (dict): SupplyWatchdog keyword arguments for the workers
+        workers (int): Worker processes. Uses Config.WATCHDOG_SHARD_WORKERS if None.
+        retries (int): Reruns of a failed shard. Uses Config.WATCHDOG_SHARD_RETRIES if None.
+
+    Returns:
+        tuple: (run_shard result by shard name, from its last attempt that
+            returned one, so it may hold failed detectors; error message of
+            each shard that still failed; attempts by shard name)
+    """
+    workers = max(1, workers or Config.WATCHDOG_SHARD_WORKERS)
+    retries = Config.WATCHDOG_SHARD_RETRIES if retries is None else retries
+
+    results = {}
+    errors = {}
+    attempts = {shard['name']: 0 for shard in shards}
+    pending = list(shards)
+
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"Retrying {len(pending)} failed shard(s) (attempt {attempt + 1} of {retries + 1})...")
+
+        failed = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker) as pool:
+            futures = {pool.submit(run_shard, shard, settings): shard for shard in pending}
+            for future in as_completed(futures):
+                shard = futures[future]
+                attempts[shard['name']] += 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[shard['name']] = str(e) or type(e).__name__
+                    failed.append(shard)
+                    print(f"✗ Shard {shard['name']} failed: {errors[shard['name']]}")
+                    continue
+                results[shard['name']] = result
+                detector_errors = result['timings']['detector_errors']
+                if detector_errors:
+                    errors[shard['name']] = '; '.join(f"{name}: {error}" for name, error in detector_errors.items())
+                    failed.append(shard)
+                    print(f"✗ Shard {shard['name']} detector failed: {errors[shard['name']]}")
+                    continue
+                errors.pop(shard['name'], None)
+                print(f"✓ Shard {shard['name']}: {len(result['alerts'])} alerts in {result['seconds']:.3f}s")
+        pending = failed
+
+    return results, errors, attempts
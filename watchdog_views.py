@@ -0,0 +1,135 @@
+"""
+Materialized views over the Supply Watchdog inputs.
+
+The loader creates or refreshes these right after each load, so watchdog runs
+read the precomputed expiry join and consumption aggregate instead of
+recomputing them from the raw tables.
+"""
+from sqlalchemy import text
+
+
+# Allocated batches on open orders, joined to their inventory lots
+EXPIRY_CANDIDATES_QUERY = """
+SELECT
+    a.material_component_batch as batch_lot,
+    a.trial_alias,
+    a.material_description,
+    i.expiration_date as expiry_date,
+    i.warehouse_name as location,
+    i.actual_qty as quantity,
+    a.order_id,
+    a.order_status
+FROM allocated_materials_to_orders a
+JOIN complete_warehouse_inventory i
+    ON a.material_component_batch = i.lot_number
+WHERE a.order_status IN ('Released', 'In Progress', 'Created')
+"""
+
+# Visits per month over the last 3 months, per trial
+CONSUMPTION_QUERY = """
+SELECT
+    "Trial Alias" as trial_alias,
+    COUNT(DISTINCT patient) as total_patients,
+    COUNT(*) as total_visits,
+    COUNT(*) * 1.0 / NULLIF(COUNT(DISTINCT DATE_TRUNC('month', visit_date)), 0) as visits_per_month
+FROM patient_status_and_treatment_report
+WHERE visit_date >= CURRENT_DATE - INTERVAL '3 months'
+GROUP BY "Trial Alias"
+"""
+
+EXPIRY_VIEW = 'mv_watchdog_expiry_candidates'
+CONSUMPTION_VIEW = 'mv_watchdog_trial_consumption'
+
+# REFRESH ... CONCURRENTLY needs a unique index over plain columns, so the
+# expiry view numbers rows that share an order, batch and location.
+# The consumption window is relative to the refresh date, which is recorded
+# so that a view refreshed on an earlier day is not used.
+WATCHDOG_VIEWS = {
+    EXPIRY_VIEW: {
+        'tables': ['allocated_materials_to_orders', 'complete_warehouse_inventory'],
+        'query': f"""
+            SELECT
+                c.*,
+                ROW_NUMBER() OVER (
+                    PARTITION BY c.order_id, c.batch_lot, c.location
+                    ORDER BY c.quantity, c.expiry_date
+                ) as row_seq
+            FROM ({EXPIRY_CANDIDATES_QUERY}) c
+        """,
+        'unique_key': ['order_id', 'batch_lot', 'location', 'row_seq'],
+    },
+    CONSUMPTION_VIEW: {
+        'tables': ['patient_status_and_treatment_report'],
+        'query': f"""
+            SELECT c.*, CURRENT_DATE as refreshed_on
+            FROM ({CONSUMPTION_QUERY}) c
+        """,
+        'unique_key': ['trial_alias'],
+    },
+}
+
+
+def relation_exists(conn, name):
+    """Check whether a table or view exists."""
+    return conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is not None
+
+
+def refresh_watchdog_views(engine):
+    """
+    Create missing watchdog views and refresh existing ones concurrently.
+
+    Views whose source tables are not loaded are skipped.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        dict: View name -> 'created', 'refreshed', 'skipped' or an error message
+    """
+    status = {}
+
+    for view_name, view in WATCHDOG_VIEWS.items():
+        try:
+            with engine.begin() as conn:
+                if not all(relation_exists(conn, table) for table in view['tables']):
+                    status[view_name] = 'skipped'
+                elif relation_exists(conn, view_name):
+                    conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}"))
+                    status[view_name] = 'refreshed'
+                else:
+                    conn.execute(text(f"CREATE MATERIALIZED VIEW {view_name} AS {view['query']}"))
+                    conn.execute(text(
+                        f"CREATE UNIQUE INDEX idx_{view_name}_key ON {view_name} ({', '.join(view['unique_key'])})"
+                    ))
+                    status[view_name] = 'created'
+        except Exception as e:
+            status[view_name] = f"failed: {e}"
+
+    return status
+
+
+def usable_watchdog_views(engine):
+    """
+    Return the watchdog views that exist and are current.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        set: Names of views the watchdog can read instead of the raw tables
+    """
+    usable = set()
+
+    with engine.connect() as conn:
+        for view_name in WATCHDOG_VIEWS:
+            if not relation_exists(conn, view_name):
+                continue
+            if view_name == CONSUMPTION_VIEW:
+                current = conn.execute(text(
+                    f"SELECT bool_and(refreshed_on = CURRENT_DATE) FROM {view_name}"
+                )).scalar()
+                if not current:
+                    continue
+            usable.add(view_name)
+
+    return usable